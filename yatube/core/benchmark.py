@@ -0,0 +1,88 @@
+import math
+import time
+import tracemalloc
+
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from .query_profile import QueryProfile
+
+NAMESPACES = ("posts", "users", "about")
+
+
+def percentile(values, share):
+    """
+    Перцентиль по ближайшему рангу: share от 0 до 1.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def iter_routes(namespaces=NAMESPACES):
+    """
+    Маршруты приложений: пары (имя с пространством имён, имена
+    параметров пути).
+    """
+    for resolver in get_resolver().url_patterns:
+        if not isinstance(resolver, URLResolver):
+            continue
+        if resolver.namespace not in namespaces:
+            continue
+        for pattern in resolver.url_patterns:
+            if isinstance(pattern, URLPattern) and pattern.name:
+                yield (
+                    f"{resolver.namespace}:{pattern.name}",
+                    list(pattern.pattern.converters),
+                )
+
+
+def route_url(name, params, samples):
+    """
+    Адрес маршрута с параметрами пути из samples.
+    """
+    return reverse(name, kwargs={param: samples[param] for param in params})
+
+
+def measure(client, url, runs, warmup=1, user=None):
+    """
+    Время, число SQL-запросов и пиковая память GET-запроса к url.
+
+    Первые warmup запросов прогревают кэши и в статистику не входят.
+    Память меряется отдельным запросом под tracemalloc, чтобы
+    трассировка не искажала время.
+    """
+    latencies = []
+    queries = []
+    status = None
+    for run in range(warmup + runs):
+        if user is not None:
+            client.force_login(user)
+        with QueryProfile() as profile:
+            start = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - start
+        status = response.status_code
+        if run >= warmup:
+            latencies.append(elapsed * 1000)
+            queries.append(profile.count)
+
+    if user is not None:
+        client.force_login(user)
+    tracemalloc.start()
+    try:
+        client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "url": url,
+        "status": status,
+        "runs": runs,
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(sum(latencies) / runs, 3),
+        "queries": percentile(queries, 0.5),
+        "queries_max": max(queries),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
@@ -0,0 +1,217 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from core.benchmark import iter_routes, measure, route_url
+from posts.models import Comment, Group, Post, Tag
+from posts.seed import seed
+from posts.storage import image_storage
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный прогон всех страниц на синтетических данных.
+    """
+
+    help = (
+        "Заполняет базу синтетическими данными и замеряет время, "
+        "SQL-запросы и память каждой страницы posts, users и about."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--groups", type=int, default=10)
+        parser.add_argument("--posts", type=int, default=5000)
+        parser.add_argument("--comments", type=int, default=10000)
+        parser.add_argument(
+            "--follows",
+            type=int,
+            default=20,
+            help="Среднее число подписок пользователя.",
+        )
+        parser.add_argument(
+            "--images",
+            type=int,
+            default=8,
+            help="Сколько разных картинок раздать постам.",
+        )
+        parser.add_argument("--requests", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument(
+            "--skip-seed",
+            action="store_true",
+            help="Не создавать данные, мерить на тех, что есть.",
+        )
+        parser.add_argument(
+            "--anonymous",
+            action="store_true",
+            help="Ходить по страницам без входа на сайт.",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Оставить созданные данные в базе.",
+        )
+        parser.add_argument(
+            "--output", help="Файл для JSON-отчёта вместо stdout."
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1:
+            raise CommandError("--requests должно быть не меньше 1.")
+        prefix = options["prefix"]
+        if not options["skip_seed"] and User.objects.filter(
+            username__startswith=f"{prefix}_user_"
+        ).exists():
+            raise CommandError(
+                f"Данные с префиксом {prefix} уже есть, задайте --prefix."
+            )
+
+        report = {
+            "started_at": timezone.now().isoformat(),
+            "options": {
+                key: options[key]
+                for key in (
+                    "users",
+                    "groups",
+                    "posts",
+                    "comments",
+                    "follows",
+                    "images",
+                    "requests",
+                    "warmup",
+                    "seed",
+                    "skip_seed",
+                    "anonymous",
+                )
+            },
+        }
+        images = []
+        cache.clear()
+        try:
+            with transaction.atomic():
+                if not options["skip_seed"]:
+                    seeded = seed(
+                        users=options["users"],
+                        groups=options["groups"],
+                        posts=options["posts"],
+                        comments=options["comments"],
+                        follows=options["follows"],
+                        images=options["images"],
+                        prefix=prefix,
+                        random_seed=options["seed"],
+                    )
+                    images = seeded["images"]
+                    report["seeded"] = {
+                        "users": len(seeded["users"]),
+                        "groups": len(seeded["groups"]),
+                        "follows": seeded["follows"],
+                    }
+                report["routes"] = self.run_routes(options)
+                if not options["keep"]:
+                    transaction.set_rollback(True)
+        finally:
+            cache.clear()
+            if not options["keep"]:
+                for name in images:
+                    image_storage.delete(name)
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def samples(self):
+        """
+        Параметры путей: самые нагруженные пост, ветка, группа, тег
+        и авторы.
+        """
+        reader = (
+            User.objects.annotate(subscriptions=Count("follower"))
+            .order_by("-subscriptions", "pk")
+            .first()
+        )
+        author = (
+            User.objects.annotate(followers=Count("following"))
+            .order_by("-followers", "pk")
+            .first()
+        )
+        group = (
+            Group.objects.annotate(number=Count("posts"))
+            .order_by("-number", "pk")
+            .first()
+        )
+        post = (
+            Post.objects.annotate(number=Count("comments"))
+            .order_by("-number", "pk")
+            .first()
+        )
+        comment = (
+            Comment.objects.filter(post=post)
+            .order_by("-reply_count", "pk")
+            .first()
+        )
+        tag = (
+            Tag.objects.annotate(number=Count("entries"))
+            .order_by("-number", "pk")
+            .first()
+        )
+        if None in (reader, author, group, post):
+            raise CommandError(
+                "Для прогона нужны пользователи, группа и пост."
+            )
+        return reader, {
+            "username": author.username,
+            "slug": group.slug,
+            "post_id": post.pk,
+            "comment_id": comment.pk if comment else 0,
+            "name": tag.name if tag else "yatube",
+            "uidb64": "MQ",
+            "token": "token",
+        }
+
+    def run_routes(self, options):
+        reader, samples = self.samples()
+        user = None if options["anonymous"] else reader
+        client = Client()
+        results = []
+        for name, params in iter_routes():
+            url = route_url(name, params, samples)
+            try:
+                # Тестовый клиент ходит на testserver.
+                with override_settings(
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]
+                ):
+                    result = measure(
+                        client,
+                        url,
+                        options["requests"],
+                        options["warmup"],
+                        user,
+                    )
+            except Exception as error:
+                # Сломанная страница не должна обрывать весь прогон.
+                results.append(
+                    {"name": name, "url": url, "error": repr(error)}
+                )
+                self.stderr.write(self.style.ERROR(f"{name}: {error!r}"))
+                continue
+            results.append({"name": name, **result})
+            self.stderr.write(
+                f"{name}: p50 {result['p50_ms']} ms, "
+                f"{result['queries']} запросов"
+            )
+        return results
@@ -0,0 +1,162 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+# Имя по sha256 содержимого: такой файл никогда не меняется.
+HASHED_NAME = re.compile(r"(^|/)[0-9a-f]{64}\.\w+$")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Ответы, к которым относятся заголовки кэширования файла.
+CACHEABLE_STATUSES = {200, 206, 304}
+
+
+def is_hashed(name):
+    return HASHED_NAME.search(name) is not None
+
+
+def file_etag(name, stat):
+    """
+    Сильный ETag: для имени по хэшу - сам хэш, для остальных файлов -
+    размер и время изменения в наносекундах.
+    """
+    if is_hashed(name):
+        return quote_etag(os.path.splitext(os.path.basename(name))[0])
+    return quote_etag(f"{stat.st_size:x}-{stat.st_mtime_ns:x}")
+
+
+def cache_control(name):
+    if is_hashed(name):
+        return IMMUTABLE
+    return f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+
+
+class RangeNotSatisfiable(Exception):
+    """
+    Запрошенный диапазон лежит за концом файла.
+    """
+
+
+def parse_range(header, size):
+    """
+    Диапазон байт из заголовка Range: пара (начало, конец включительно).
+
+    None - отдать файл целиком: заголовка нет, диапазонов несколько
+    или синтаксис непонятен (RFC 7233 разрешает так делать).
+    """
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        suffix = int(end)
+        if not suffix or not size:
+            raise RangeNotSatisfiable
+        return max(0, size - suffix), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, min(int(end), size - 1) if end else size - 1
+
+
+def range_allowed(request, etag, stat):
+    """
+    Проверка If-Range: диапазон отдаётся, только если клиент держит
+    ту же версию файла.
+    """
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return if_range == etag
+    modified = parse_http_date_safe(if_range)
+    return modified is not None and int(stat.st_mtime) <= modified
+
+
+class RangeFile:
+    """
+    Кусок открытого файла для ответа 206: читает не дальше конца
+    диапазона. У него нет fileno, поэтому сервер не отдаст через
+    sendfile весь файл вместо куска.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def file_response(request, name, full_path, stat, etag):
+    """
+    Ответ с содержимым файла.
+
+    Если за Django стоит прокси, файл отдаёт он по X-Accel-Redirect
+    (nginx) или X-Sendfile (Apache). Иначе целый файл уходит через
+    FileResponse, и WSGI-сервер передаёт его wsgi.file_wrapper
+    (sendfile без копирования), а диапазон читается кусками.
+    """
+    content_type = (
+        mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    )
+    if settings.MEDIA_SENDFILE == "x-accel-redirect":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + quote(
+            name
+        )
+        return response
+    if settings.MEDIA_SENDFILE == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = full_path
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    if range_allowed(request, etag, stat):
+        try:
+            byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+    file = open(full_path, "rb")
+    if byte_range is None:
+        return FileResponse(file, content_type=content_type)
+    start, end = byte_range
+    response = FileResponse(
+        RangeFile(file, start, end - start + 1),
+        status=206,
+        content_type=content_type,
+    )
+    response["Content-Length"] = end - start + 1
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
+
+
+def validators(name, stat):
+    """
+    Заголовки кэширования файла: ETag, Last-Modified, Cache-Control.
+    """
+    return {
+        "ETag": file_etag(name, stat),
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": cache_control(name),
+        "Accept-Ranges": "bytes",
+    }
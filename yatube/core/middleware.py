@@ -0,0 +1,45 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .query_profile import QueryProfile
+
+logger = logging.getLogger(__name__)
+
+QUERY_PROFILE_HEADER = "X-Query-Profile"
+
+
+class QueryProfileMiddleware:
+    """
+    Профиль SQL каждого запроса.
+
+    Запросы сверх бюджета и с вероятными N+1 пишутся в лог вместе
+    с повторяющимися формами SQL и местами их вызова. Персонал видит
+    сводку в заголовке X-Query-Profile. Работает, только если
+    включён QUERY_PROFILE.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_PROFILE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryProfile() as profile:
+            response = self.get_response(request)
+        if profile.over_budget():
+            logger.warning(
+                "%s %s: %s%s",
+                request.method,
+                request.get_full_path(),
+                profile.summary(),
+                "".join(
+                    f"\n  {number}x {origin}: {shape}"
+                    for shape, number, origin in profile.repeated
+                ),
+            )
+        user = getattr(request, "user", None)
+        if user is not None and user.is_staff:
+            response[QUERY_PROFILE_HEADER] = profile.summary()
+        return response
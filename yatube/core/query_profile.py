@@ -0,0 +1,121 @@
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+IN_LIST = re.compile(r"\((?:%s, )+%s\)")
+TEMPLATE_BASE = os.path.join("django", "template", "base.py")
+
+
+def query_shape(sql):
+    """
+    Форма запроса: SQL без параметров, списки IN любой длины
+    сворачиваются в одну форму.
+    """
+    return IN_LIST.sub("(...)", sql)
+
+
+def query_origin():
+    """
+    Откуда сделан запрос: строка шаблона, если запрос случился при
+    отрисовке, иначе ближайшая строка кода проекта.
+    """
+    frame = sys._getframe(1)
+    code_line = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "render_annotated" and code.co_filename.endswith(
+            TEMPLATE_BASE
+        ):
+            node = frame.f_locals.get("self")
+            origin = getattr(node, "origin", None)
+            token = getattr(node, "token", None)
+            if origin is not None and token is not None:
+                name = origin.template_name or origin.name
+                return f"{name}:{token.lineno}"
+        if (
+            code_line is None
+            and code.co_filename.startswith(settings.BASE_DIR)
+            and code.co_filename != __file__
+        ):
+            path = os.path.relpath(code.co_filename, settings.BASE_DIR)
+            code_line = f"{path}:{frame.f_lineno} in {code.co_name}"
+        frame = frame.f_back
+    return code_line
+
+
+class QueryProfile:
+    """
+    Профиль SQL-запросов блока кода.
+
+    Считает запросы и их суммарное время, одинаковые запросы
+    с одинаковыми параметрами и повторы одной формы запроса, а для
+    каждой формы запоминает место первого вызова. Форма, повторённая
+    QUERY_REPEAT_LIMIT раз и больше, - вероятный N+1.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.statements = Counter()
+        self.origins = {}
+        self._hooks = None
+
+    def __enter__(self):
+        self._hooks = ExitStack()
+        for connection in connections.all():
+            self._hooks.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._hooks.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            shape = query_shape(sql)
+            self.shapes[shape] += 1
+            self.statements[(sql, repr(params))] += 1
+            if shape not in self.origins:
+                self.origins[shape] = query_origin()
+
+    @property
+    def duplicates(self):
+        """
+        Сколько запросов повторили уже сделанный слово в слово.
+        """
+        return sum(number - 1 for number in self.statements.values())
+
+    @property
+    def repeated(self):
+        """
+        Вероятные N+1: список (форма, число повторов, место вызова).
+        """
+        return [
+            (shape, number, self.origins[shape])
+            for shape, number in self.shapes.most_common()
+            if number >= settings.QUERY_REPEAT_LIMIT
+        ]
+
+    def over_budget(self):
+        return (
+            self.count > settings.QUERY_COUNT_BUDGET
+            or self.duration > settings.QUERY_TIME_BUDGET
+            or bool(self.repeated)
+        )
+
+    def summary(self):
+        return (
+            f"queries={self.count}; time={self.duration * 1000:.1f}ms; "
+            f"duplicates={self.duplicates}; n+1={len(self.repeated)}"
+        )
@@ -0,0 +1,276 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import FileResponse
+from django.template import Context, Template
+from django.test import Client, TestCase, override_settings
+
+from core.benchmark import percentile
+from core.media import IMMUTABLE
+from core.middleware import QUERY_PROFILE_HEADER
+from core.query_profile import QueryProfile, query_shape
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+@override_settings(QUERY_PROFILE=True)
+class QueryProfileTests(TestCase):
+    """
+    Тест профиля SQL-запросов.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_user(username="profile_user")
+        cls.staff = User.objects.create_user(
+            username="profile_staff", is_staff=True
+        )
+        cls.group = Group.objects.create(
+            title="Группа", slug="profile-group", description="Описание"
+        )
+        for number in range(6):
+            Post.objects.create(
+                author=cls.user, text=f"Пост {number}", group=cls.group
+            )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_in_lists_share_shape(self):
+        """
+        Списки IN разной длины дают одну форму запроса.
+        """
+        self.assertEqual(
+            query_shape("SELECT 1 WHERE id IN (%s, %s)"),
+            query_shape("SELECT 1 WHERE id IN (%s, %s, %s, %s)"),
+        )
+
+    @override_settings(QUERY_REPEAT_LIMIT=5)
+    def test_repeated_shape_is_n_plus_one(self):
+        """
+        Форма, повторённая в цикле шаблона, помечается как N+1
+        со строкой шаблона.
+        """
+        template = Template(
+            "{% for post in posts %}\n{{ post.group.title }}{% endfor %}"
+        )
+        with QueryProfile() as profile:
+            template.render(Context({"posts": Post.objects.all()}))
+        self.assertEqual(profile.count, 7)
+        self.assertEqual(profile.duplicates, 5)
+        [(shape, number, origin)] = profile.repeated
+        self.assertEqual(number, 6)
+        self.assertIn('FROM "posts_group"', shape)
+        self.assertTrue(origin.endswith(":2"))
+
+    def test_code_origin(self):
+        """
+        Запрос вне шаблона привязывается к строке кода проекта.
+        """
+        with QueryProfile() as profile:
+            list(Post.objects.all())
+        [origin] = profile.origins.values()
+        self.assertIn("core/tests.py", origin)
+        self.assertIn("test_code_origin", origin)
+
+    def test_header_only_for_staff(self):
+        """
+        Сводка в заголовке видна только персоналу.
+        """
+        client = Client()
+        self.assertNotIn(QUERY_PROFILE_HEADER, client.get("/"))
+        client.force_login(self.user)
+        self.assertNotIn(QUERY_PROFILE_HEADER, client.get("/"))
+        client.force_login(self.staff)
+        self.assertIn("queries=", client.get("/")[QUERY_PROFILE_HEADER])
+
+    @override_settings(QUERY_PROFILE=False, QUERY_COUNT_BUDGET=0)
+    def test_disabled_by_setting(self):
+        """
+        Без QUERY_PROFILE профиль не снимается и не пишется в лог.
+        """
+        client = Client()
+        client.force_login(self.staff)
+        with self.assertRaises(AssertionError):
+            with self.assertLogs("core.middleware", "WARNING"):
+                response = client.get("/")
+        self.assertNotIn(QUERY_PROFILE_HEADER, response)
+
+    @override_settings(QUERY_COUNT_BUDGET=0)
+    def test_over_budget_is_logged(self):
+        """
+        Запрос сверх бюджета попадает в лог.
+        """
+        with self.assertLogs("core.middleware", "WARNING") as logs:
+            Client().get("/")
+        self.assertIn("GET /: queries=", logs.output[0])
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkCommandTests(TestCase):
+    """
+    Тест команды нагрузочного прогона.
+    """
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_percentile(self):
+        """
+        Перцентиль берётся по ближайшему рангу.
+        """
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.95), 7)
+
+    def test_report_covers_routes_and_rolls_back(self):
+        """
+        Отчёт есть по каждой странице, данные прогона не остаются.
+        """
+        stdout = StringIO()
+        call_command(
+            "benchmark",
+            users=20,
+            groups=2,
+            posts=60,
+            comments=40,
+            follows=5,
+            images=1,
+            requests=2,
+            stdout=stdout,
+            stderr=StringIO(),
+        )
+        report = json.loads(stdout.getvalue())
+        routes = {route["name"]: route for route in report["routes"]}
+        for name in ("posts:index", "posts:follow_index", "about:tech"):
+            with self.subTest(name=name):
+                self.assertEqual(routes[name]["status"], 200)
+                self.assertGreater(routes[name]["queries"], 0)
+                self.assertLessEqual(
+                    routes[name]["p50_ms"], routes[name]["p99_ms"]
+                )
+        self.assertIn("users:login", routes)
+        self.assertEqual(report["seeded"]["users"], 20)
+        self.assertFalse(
+            User.objects.filter(username__startswith="bench_").exists()
+        )
+
+
+MEDIA_TEST_ROOT = tempfile.mkdtemp()
+HASHED_NAME = "posts/ab/" + "ab" * 32 + ".jpg"
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TEST_ROOT, MEDIA_SENDFILE=None)
+class MediaViewTests(TestCase):
+    """
+    Тест раздачи медиафайлов.
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        for name in (HASHED_NAME, "posts/plain.txt"):
+            path = os.path.join(MEDIA_TEST_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(b"0123456789")
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_TEST_ROOT, ignore_errors=True)
+
+    def test_full_file(self):
+        """
+        Файл по хэшу отдаётся целиком с ETag из хэша и кэшируется
+        навсегда; остальные кэшируются на MEDIA_CACHE_MAX_AGE.
+        """
+        response = self.client.get(f"/media/{HASHED_NAME}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["ETag"], f'"{"ab" * 32}"')
+        self.assertEqual(response["Cache-Control"], IMMUTABLE)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        # Целый файл WSGI-сервер отдаст через wsgi.file_wrapper.
+        self.assertIsInstance(response, FileResponse)
+
+        response = self.client.get("/media/posts/plain.txt")
+        self.assertNotIn("immutable", response["Cache-Control"])
+
+    def test_not_modified(self):
+        """
+        Совпавший If-None-Match даёт 304 без тела.
+        """
+        etag = self.client.get(f"/media/{HASHED_NAME}")["ETag"]
+        response = self.client.get(
+            f"/media/{HASHED_NAME}", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_ranges(self):
+        """
+        Диапазоны байт: обычный, суффикс, за концом файла и If-Range
+        со старым ETag.
+        """
+        url = f"/media/{HASHED_NAME}"
+        cases = (
+            ("bytes=2-5", 206, b"2345", "bytes 2-5/10"),
+            ("bytes=-3", 206, b"789", "bytes 7-9/10"),
+            ("bytes=8-", 206, b"89", "bytes 8-9/10"),
+        )
+        for header, status, body, content_range in cases:
+            with self.subTest(header=header):
+                response = self.client.get(url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(b"".join(response.streaming_content), body)
+                self.assertEqual(response["Content-Range"], content_range)
+                self.assertEqual(response["Content-Length"], str(len(body)))
+
+        response = self.client.get(url, HTTP_RANGE="bytes=10-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+        self.assertFalse(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Cache-Control"))
+
+        response = self.client.get(
+            url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(
+        MEDIA_SENDFILE="x-accel-redirect",
+        MEDIA_ACCEL_PREFIX="/protected-media/",
+    )
+    def test_accel_redirect(self):
+        """
+        С прокси Django отдаёт только заголовки, файл шлёт nginx.
+        """
+        response = self.client.get(f"/media/{HASHED_NAME}")
+        self.assertEqual(
+            response["X-Accel-Redirect"], f"/protected-media/{HASHED_NAME}"
+        )
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["Cache-Control"], IMMUTABLE)
+
+    def test_missing_and_outside(self):
+        """
+        Нет файла, каталог или путь вне MEDIA_ROOT - 404.
+        """
+        for url in ("/media/posts/none.jpg", "/media/posts/", "/media/../x"):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
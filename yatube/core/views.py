@@ -1,4 +1,15 @@
+import os
+import stat as stat_module
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+from . import media
 
 
 def page_not_found(request, exception):
@@ -27,3 +38,33 @@ def page_error(request, exception):
     ошибка 403.
     """
     return render(request, 'core/403.html', status=403)
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Раздача загруженных файлов в продакшене.
+
+    Условные запросы отвечают 304 без чтения файла, имена по хэшу
+    кэшируются навсегда, поддерживаются диапазоны байт.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat_module.S_ISREG(stat.st_mode):
+        raise Http404
+    headers = media.validators(path, stat)
+    response = get_conditional_response(
+        request, etag=headers["ETag"], last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        response = media.file_response(
+            request, path, full_path, stat, headers["ETag"]
+        )
+    if response.status_code in media.CACHEABLE_STATUSES:
+        # Ошибку вроде 416 нельзя кэшировать как содержимое файла.
+        for header, value in headers.items():
+            response[header] = value
+    return response
@@ -1,9 +1,138 @@
-from django.contrib import admin
+from collections import Counter
 
-from .models import Comment, Follow, Group, Post
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils.functional import cached_property
 
+from . import (
+    counters,
+    feed_cache,
+    follows,
+    images,
+    recent,
+    search,
+    threads,
+    timeline,
+)
+from .models import (
+    Comment,
+    Follow,
+    Group,
+    Post,
+    PostCounter,
+    TaggedPost,
+    TimelineEntry,
+)
+from .signals import bump_responses, comments_removed, posts_changed
 
-class PostAdmin(admin.ModelAdmin):
+
+def table_estimate(model):
+    """
+    Число строк таблицы по статистике базы, без чтения самой
+    таблицы; None, если статистики нет.
+    """
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples FROM pg_class WHERE oid = %s::regclass'
+    elif connection.vendor == 'sqlite':
+        # Появляется после ANALYZE: первое число - строки таблицы.
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    else:
+        return None
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [table])
+                row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    estimate = int(float(str(row[0]).split()[0]))
+    return estimate if estimate > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Паджинатор списков админки без COUNT по всей таблице.
+
+    Список без фильтров берёт число строк у estimate, если оно больше
+    ADMIN_COUNT_LIMIT; меньшие таблицы и отфильтрованные списки
+    считаются запросом с LIMIT, не дальше этого предела.
+    """
+
+    def __init__(self, *args, estimate=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estimate = estimate
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_COUNT_LIMIT
+        if self.estimate is not None and not self.object_list.query.where:
+            estimate = self.estimate()
+            if estimate is not None and estimate > limit:
+                return estimate
+        return self.object_list[:limit + 1].count()
+
+
+class EstimatedCountAdmin(admin.ModelAdmin):
+    """
+    Список без точных COUNT по всей таблице.
+    """
+
+    show_full_result_count = False
+
+    def estimated_count(self):
+        return table_estimate(self.model)
+
+    def get_paginator(
+        self,
+        request,
+        queryset,
+        per_page,
+        orphans=0,
+        allow_empty_first_page=True,
+    ):
+        return EstimatedCountPaginator(
+            queryset,
+            per_page,
+            orphans,
+            allow_empty_first_page,
+            estimate=self.estimated_count,
+        )
+
+
+class BulkDeleteAdmin(EstimatedCountAdmin):
+    """
+    Удаление выбранного одним DELETE вместо удаления по одной
+    записи с сигналами.
+    """
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            # Сигналы не отправляются: их работу для всего набора
+            # сразу делают подклассы.
+            queryset._raw_delete(queryset.db)
+
+
+def _forget_and_release(author_ids, image_names):
+    for author_id in author_ids:
+        recent.forget(author_id)
+    for name in image_names:
+        images.release(name)
+
+
+class PostActionForm(ActionForm):
+    group_slug = forms.SlugField(label='Группа (slug)', required=False)
+
+
+class PostAdmin(BulkDeleteAdmin):
     """
     Добавление возможности изменения поста.
     """
@@ -14,18 +143,163 @@ class PostAdmin(admin.ModelAdmin):
         'pub_date',
         'author',
         'group',
+        'comment_count',
     )
 
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    action_form = PostActionForm
+    actions = ('move_to_group',)
+
+    def estimated_count(self):
+        return counters.site_posts_count()
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Поиск по тексту через полнотекстовый индекс вместо LIKE
+        по всей таблице.
+        """
+        if not search_term.strip():
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
+    def move_to_group(self, request, queryset):
+        """
+        Перенос выбранных постов в группу одним UPDATE; счётчики
+        групп меняются на разницу.
+        """
+        slug = request.POST.get('group_slug', '').strip()
+        group = None
+        if slug:
+            group = Group.objects.filter(slug=slug).first()
+            if group is None:
+                self.message_user(
+                    request, f'Группы {slug} нет.', messages.ERROR
+                )
+                return
+        rows = list(queryset.values_list('pk', 'author_id', 'group_id'))
+        old_groups = Counter(group_id for _, _, group_id in rows)
+        with transaction.atomic():
+            moved = queryset.update(group=group)
+            for group_id, number in old_groups.items():
+                if group_id is not None:
+                    counters.change(PostCounter.GROUP, group_id, -number)
+            if group is not None:
+                counters.change(PostCounter.GROUP, group.pk, moved)
+            posts_changed(rows, [group.pk] if group else ())
+        self.message_user(request, f'Перенесено постов: {moved}.')
+
+    move_to_group.short_description = (
+        'Перенести в группу (без slug - убрать из групп)'
+    )
+    move_to_group.allowed_permissions = ('change',)
+
+    def delete_queryset(self, request, queryset):
+        """
+        Удаление выбранных постов набором: комментарии, записи лент
+        и хэштегов уходят по одному DELETE на таблицу, счётчики
+        уменьшаются на разницу, кэш сбрасывается один раз, картинки
+        без других постов освобождаются после фиксации.
+        """
+        rows = list(
+            queryset.values_list('pk', 'author_id', 'group_id', 'image')
+        )
+        pks = [pk for pk, _, _, _ in rows]
+        with transaction.atomic():
+            for model in (Comment, TimelineEntry, TaggedPost):
+                related = model.objects.filter(post_id__in=pks)
+                related._raw_delete(related.db)
+            super().delete_queryset(request, Post.objects.filter(pk__in=pks))
+            counters.posts_deleted(
+                (author_id, group_id) for _, author_id, group_id, _ in rows
+            )
+            posts_changed(row[:3] for row in rows)
+            authors = {author_id for _, author_id, _, _ in rows}
+            names = {image for _, _, _, image in rows if image}
+            transaction.on_commit(lambda: _forget_and_release(authors, names))
+
+
+class GroupAdmin(EstimatedCountAdmin):
+    """
+    Сообщества с числом постов из счётчиков.
+    """
+
+    list_display = ('title', 'slug', 'post_count')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
+
+    def get_queryset(self, request):
+        counter = PostCounter.objects.filter(
+            scope=PostCounter.GROUP, object_id=OuterRef('pk')
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(post_count=Subquery(counter.values('value')[:1]))
+        )
+
+    def post_count(self, group):
+        return group.post_count
+
+    post_count.short_description = 'Постов'
+    post_count.admin_order_field = 'post_count'
+
+
+class CommentAdmin(BulkDeleteAdmin):
+    """
+    Комментарии: посты и авторы выбираются по id, удаление веток
+    одним DELETE с пересчётом счётчиков затронутых постов.
+    """
+
+    list_display = ('pk', 'text', 'author', 'post', 'created', 'reply_count')
+    list_select_related = ('author', 'post')
+    raw_id_fields = ('author', 'post')
+    # Путь в ветке задаётся при создании, перенос ответа его сломал бы.
+    readonly_fields = ('parent',)
+    search_fields = ('=author__username',)
+
+    def delete_queryset(self, request, queryset):
+        # Ответы удаляются вместе с комментариями, на которые отвечают:
+        # каждая ветка - один диапазон путей.
+        queryset = threads.with_replies(
+            queryset.only('pk', 'post_id', 'path', 'depth')
+        )
+        removed = list(queryset.values_list('post_id', 'path'))
+        with transaction.atomic():
+            super().delete_queryset(request, queryset)
+            comments_removed(removed)
+
+
+class FollowAdmin(BulkDeleteAdmin):
+    """
+    Подписки: удаление одним DELETE вместе с записями лент.
+    """
+
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+
+    def delete_queryset(self, request, queryset):
+        pairs = list(queryset.values_list('user_id', 'author_id'))
+        with transaction.atomic():
+            timeline.prune_pairs(pairs)
+            super().delete_queryset(request, queryset)
+            follows.changed(pairs)
+            timeline.unfollowed(pairs)
+            bump_responses(
+                *{('author', author_id) for _, author_id in pairs}
+            )
+            transaction.on_commit(feed_cache.bump)
 
 
 admin.site.register(Post, PostAdmin)
 
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
 
-admin.site.register(Comment)
+admin.site.register(Comment, CommentAdmin)
 
-admin.site.register(Follow)
+admin.site.register(Follow, FollowAdmin)
@@ -1,5 +1,22 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        post_migrate.connect(restore_search_triggers, sender=self)
+
+
+def restore_search_triggers(using, **kwargs):
+    """
+    Триггеры поиска после каждого migrate: изменение полей поста
+    в SQLite их удаляет.
+    """
+    from .search import create_triggers
+
+    create_triggers(connections[using])
@@ -0,0 +1,239 @@
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+
+from .models import Group
+
+User = get_user_model()
+
+VERSION_KEY = "autocomplete:version"
+
+_lock = threading.Lock()
+# Отсортированный список (терм, вид, id) и подписи с адресами
+# объектов: {(вид, id): (подпись, адрес, термы)}.
+_index = []
+_objects = {}
+_version = None
+# Когда индекс собран (time.monotonic), для сборки по сроку без общего
+# кэша.
+_built_at = None
+
+
+def _change_key(number):
+    return f"autocomplete:change:{number}"
+
+
+def normalize(text):
+    """
+    Строка для сравнения: без учёта регистра, ё и вариантов записи.
+    """
+    return unicodedata.normalize("NFKC", text).casefold().replace("ё", "е")
+
+
+def _user_change(pk, username, first_name, last_name, is_active=True):
+    if not is_active:
+        # Отключённые пользователи в подсказки не попадают.
+        return ("user", pk, None, None, ())
+    full_name = f"{first_name} {last_name}".strip()
+    return (
+        "user",
+        pk,
+        full_name or username,
+        reverse("posts:profile", args=(username,)),
+        (username, full_name, last_name),
+    )
+
+
+def _group_change(pk, slug, title):
+    return (
+        "group",
+        pk,
+        title,
+        reverse("posts:group_posts", args=(slug,)),
+        (title, slug),
+    )
+
+
+def _remove(kind, pk):
+    known = _objects.pop((kind, pk), None)
+    if known is None:
+        return
+    for term in known[2]:
+        position = bisect_left(_index, (term, kind, pk))
+        if position < len(_index) and _index[position] == (term, kind, pk):
+            del _index[position]
+
+
+def _terms(terms):
+    return tuple({normalize(term) for term in terms if term})
+
+
+def _apply(change):
+    """
+    Изменение объекта в индексе: удаление, если подписи нет, иначе
+    замена старых термов новыми. Повторное применение безопасно.
+    """
+    kind, pk, label, url, terms = change
+    _remove(kind, pk)
+    if label is None:
+        return
+    terms = _terms(terms)
+    _objects[kind, pk] = (label, url, terms)
+    for term in terms:
+        insort(_index, (term, kind, pk))
+
+
+def _current_version():
+    cache.add(VERSION_KEY, 0, None)
+    return cache.get(VERSION_KEY, 0)
+
+
+def rebuild():
+    """
+    Полная сборка индекса из базы: два запроса и одна сортировка.
+    Новый индекс собирается без блокировки и подменяет старый
+    целиком. Изменения, сделанные во время сборки, потом применяются
+    из журнала ещё раз.
+    """
+    global _version, _built_at
+    version = _current_version()
+    built_at = time.monotonic()
+    changes = [
+        _user_change(*row)
+        for row in User.objects.filter(is_active=True)
+        .values_list("pk", "username", "first_name", "last_name")
+        .iterator()
+    ]
+    changes += [
+        _group_change(*row)
+        for row in Group.objects.values_list("pk", "slug", "title").iterator()
+    ]
+    index = []
+    objects = {}
+    for kind, pk, label, url, terms in changes:
+        terms = _terms(terms)
+        objects[kind, pk] = (label, url, terms)
+        index.extend((term, kind, pk) for term in terms)
+    index.sort()
+    with _lock:
+        _index[:] = index
+        _objects.clear()
+        _objects.update(objects)
+        _version = version
+        _built_at = built_at
+
+
+def _expired():
+    if settings.SHARED_CACHE or _built_at is None:
+        return False
+    return time.monotonic() - _built_at > settings.LOCAL_CACHE_TIMEOUT
+
+
+def _sync():
+    """
+    Догоняет журнал изменений из кэша. Журнал общий для процессов,
+    только если общий кэш (SHARED_CACHE); в LocMemCache его видит
+    лишь свой процесс, поэтому индекс там собирается заново раз
+    в LOCAL_CACHE_TIMEOUT секунд. Если журнал отстал больше чем
+    на AUTOCOMPLETE_LOG_SIZE записей или записи пропали из кэша,
+    индекс тоже собирается заново.
+    """
+    latest = _current_version()
+    if _version is None or latest < _version or _expired():
+        rebuild()
+        return
+    if latest == _version:
+        return
+    if latest - _version > settings.AUTOCOMPLETE_LOG_SIZE:
+        rebuild()
+        return
+    numbers = range(_version + 1, latest + 1)
+    changes = cache.get_many([_change_key(number) for number in numbers])
+    if len(changes) != len(numbers):
+        rebuild()
+        return
+    _replay(numbers, changes)
+
+
+def _replay(numbers, changes):
+    global _version
+    with _lock:
+        for number in numbers:
+            _apply(changes[_change_key(number)])
+        _version = max(_version, numbers[-1])
+
+
+def publish(change):
+    """
+    Изменение сразу попадает в индекс этого процесса и в журнал
+    для остальных.
+    """
+    global _version
+    try:
+        number = cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 0, None)
+        number = cache.incr(VERSION_KEY)
+    cache.set(
+        _change_key(number), change, settings.AUTOCOMPLETE_LOG_TIMEOUT
+    )
+    if _version is None:
+        return
+    with _lock:
+        _apply(change)
+        if _version == number - 1:
+            _version = number
+
+
+def user_changed(user):
+    publish(
+        _user_change(
+            user.pk,
+            user.username,
+            user.first_name,
+            user.last_name,
+            user.is_active,
+        )
+    )
+
+
+def group_changed(group):
+    publish(_group_change(group.pk, group.slug, group.title))
+
+
+def forget(kind, pk):
+    publish((kind, pk, None, None, ()))
+
+
+def suggest(query, limit=None):
+    """
+    Пользователи и группы, у которых имя, полное имя, фамилия,
+    название или slug начинаются с query. Индекс в памяти процесса,
+    база не нужна.
+    """
+    prefix = normalize(query.strip())
+    if not prefix:
+        return []
+    _sync()
+    limit = limit or settings.AUTOCOMPLETE_LIMIT
+    results = []
+    seen = set()
+    with _lock:
+        position = bisect_left(_index, (prefix,))
+        while len(results) < limit and position < len(_index):
+            term, kind, pk = _index[position]
+            if not term.startswith(prefix):
+                break
+            position += 1
+            if (kind, pk) in seen:
+                continue
+            seen.add((kind, pk))
+            label, url, _ = _objects[kind, pk]
+            results.append({"type": kind, "label": label, "url": url})
+    return results
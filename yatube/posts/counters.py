@@ -0,0 +1,249 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Count,
+    DateTimeField,
+    F,
+    Max,
+    OuterRef,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Post, PostCounter
+
+
+def _posts(scope, object_id):
+    if scope == PostCounter.AUTHOR:
+        return Post.objects.filter(author_id=object_id)
+    if scope == PostCounter.GROUP:
+        return Post.objects.filter(group_id=object_id)
+    return Post.objects.all()
+
+
+def _scopes(author_id, group_id):
+    scopes = [(PostCounter.SITE, 0), (PostCounter.AUTHOR, author_id)]
+    if group_id is not None:
+        scopes.append((PostCounter.GROUP, group_id))
+    return scopes
+
+
+def recount(scope, object_id=0):
+    """
+    Пересчёт счётчика по таблице постов.
+    """
+    value = _posts(scope, object_id).count()
+    PostCounter.objects.update_or_create(
+        scope=scope, object_id=object_id, defaults={"value": value}
+    )
+    return value
+
+
+def get_count(scope, object_id=0):
+    """
+    Значение счётчика; отсутствующий счётчик считается один раз.
+    """
+    value = (
+        PostCounter.objects.filter(scope=scope, object_id=object_id)
+        .values_list("value", flat=True)
+        .first()
+    )
+    if value is None:
+        try:
+            with transaction.atomic():
+                value = recount(scope, object_id)
+        except IntegrityError:
+            return get_count(scope, object_id)
+    return value
+
+
+def change(scope, object_id, delta):
+    """
+    Атомарное изменение счётчика на delta.
+    """
+    with transaction.atomic():
+        updated = PostCounter.objects.filter(
+            scope=scope, object_id=object_id
+        ).update(value=F("value") + delta)
+        if not updated:
+            recount(scope, object_id)
+
+
+def site_posts_count():
+    return get_count(PostCounter.SITE)
+
+
+def author_posts_count(author):
+    return get_count(PostCounter.AUTHOR, author.pk)
+
+
+def group_posts_count(group):
+    return get_count(PostCounter.GROUP, group.pk)
+
+
+def post_created(post):
+    with transaction.atomic():
+        for scope, object_id in _scopes(post.author_id, post.group_id):
+            change(scope, object_id, 1)
+
+
+def post_deleted(post):
+    with transaction.atomic():
+        for scope, object_id in _scopes(post.author_id, post.group_id):
+            change(scope, object_id, -1)
+
+
+def posts_deleted(rows):
+    """
+    Удаление набора постов без сигналов: каждый счётчик уменьшается
+    один раз на число постов; rows - пары (автор, группа).
+    """
+    deltas = Counter(
+        scope
+        for author_id, group_id in rows
+        for scope in _scopes(author_id, group_id)
+    )
+    with transaction.atomic():
+        for (scope, object_id), number in deltas.items():
+            change(scope, object_id, -number)
+
+
+def post_group_changed(old_group_id, new_group_id):
+    with transaction.atomic():
+        if old_group_id is not None:
+            change(PostCounter.GROUP, old_group_id, -1)
+        if new_group_id is not None:
+            change(PostCounter.GROUP, new_group_id, 1)
+
+
+def find_drift():
+    """
+    Счётчики, расходящиеся с таблицей постов:
+    список (scope, object_id, сохранённое значение, реальное значение).
+    """
+    actual = {(PostCounter.SITE, 0): Post.objects.count()}
+    for scope, field in (
+        (PostCounter.AUTHOR, "author_id"),
+        (PostCounter.GROUP, "group_id"),
+    ):
+        rows = (
+            Post.objects.exclude(**{field: None})
+            .order_by()
+            .values_list(field)
+            .annotate(value=Count("id"))
+        )
+        actual.update(((scope, pk), value) for pk, value in rows)
+
+    stored = {
+        (scope, object_id): value
+        for scope, object_id, value in PostCounter.objects.values_list(
+            "scope", "object_id", "value"
+        )
+    }
+    drift = []
+    for key in sorted(actual.keys() | stored.keys()):
+        if actual.get(key, 0) != stored.get(key):
+            drift.append((*key, stored.get(key), actual.get(key, 0)))
+    return drift
+
+
+def repair(drift):
+    """
+    Запись реальных значений в разошедшиеся счётчики.
+    """
+    with transaction.atomic():
+        for scope, object_id, _, value in drift:
+            PostCounter.objects.update_or_create(
+                scope=scope, object_id=object_id, defaults={"value": value}
+            )
+
+
+def _last_comment():
+    """
+    Дата последнего комментария поста из внешнего запроса,
+    по индексу (post, created).
+    """
+    return Subquery(
+        Comment.objects.filter(post=OuterRef("pk"))
+        .order_by("-created")
+        .values("created")[:1]
+    )
+
+
+def comment_added(comment):
+    """
+    Атомарное увеличение счётчика комментариев поста и сдвиг даты
+    последнего комментария, без чтения поста.
+    """
+    created = Value(comment.created, output_field=DateTimeField())
+    Post.objects.filter(pk=comment.post_id).update(
+        comment_count=F("comment_count") + 1,
+        last_commented_at=Coalesce(
+            Greatest("last_commented_at", created), created
+        ),
+    )
+
+
+def comment_deleted(comment):
+    """
+    Атомарное уменьшение счётчика комментариев поста; дата
+    последнего комментария берётся из оставшихся.
+    """
+    Post.objects.filter(pk=comment.post_id).update(
+        comment_count=Greatest(F("comment_count") - 1, 0),
+        last_commented_at=_last_comment(),
+    )
+
+
+def recount_comments(posts):
+    """
+    Пересчёт счётчиков комментариев постов одним UPDATE.
+    """
+    comments = (
+        Comment.objects.filter(post=OuterRef("pk")).order_by().values("post")
+    )
+    return posts.update(
+        comment_count=Coalesce(
+            Subquery(comments.annotate(number=Count("pk")).values("number")),
+            0,
+        ),
+        last_commented_at=_last_comment(),
+    )
+
+
+def find_comment_drift():
+    """
+    Посты, у которых счётчик или дата последнего комментария
+    расходятся с таблицей комментариев: список (id поста,
+    сохранённое количество, реальное количество).
+    """
+    actual = {
+        pk: (number, last)
+        for pk, number, last in Comment.objects.exclude(post=None)
+        .order_by()
+        .values_list("post")
+        .annotate(number=Count("pk"), last=Max("created"))
+    }
+    drift = []
+    stored = Post.objects.order_by("pk").values_list(
+        "pk", "comment_count", "last_commented_at"
+    )
+    for pk, count, last_commented_at in stored.iterator():
+        number, last = actual.get(pk, (0, None))
+        if (count, last_commented_at) != (number, last):
+            drift.append((pk, count, number))
+    return drift
+
+
+def repair_comments(drift):
+    """
+    Запись реальных значений в разошедшиеся счётчики комментариев.
+    """
+    post_ids = [pk for pk, _, _ in drift]
+    with transaction.atomic():
+        for start in range(0, len(post_ids), 500):
+            recount_comments(
+                Post.objects.filter(pk__in=post_ids[start:start + 500])
+            )
@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .paginator import page_params
+
+GENERATION_KEY = "feed_cache:generation"
+
+
+def generation():
+    """
+    Текущее поколение кэша лент.
+
+    Пропавшее из кэша поколение начинается заново с текущего времени
+    в микросекундах, чтобы не совпасть ни с одним прежним значением.
+    """
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        cache.add(GENERATION_KEY, time.time_ns() // 1000, None)
+        value = cache.get(GENERATION_KEY)
+    return value
+
+
+def bump():
+    """
+    Новое поколение: все закэшированные фрагменты лент устаревают.
+    """
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        generation()
+
+
+def fragment_key(request, personal=False):
+    """
+    Ключ фрагмента ленты: поколение, адрес ленты, все параметры
+    выбора страницы и, для личных лент, пользователь.
+    """
+    parts = [generation(), request.path]
+    parts.extend(value or "" for value in page_params(request).values())
+    if personal:
+        parts.append(request.user.pk)
+    return ":".join(str(part) for part in parts)
+
+
+def context(request, personal=False):
+    return {
+        "feed_cache_key": fragment_key(request, personal),
+        "feed_cache_timeout": settings.FEED_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Follow
+
+
+def _following_key(user_id):
+    return f"follows:following:{user_id}"
+
+
+def _followers_key(author_id):
+    return f"follows:followers:{author_id}"
+
+
+def following_ids(user_id):
+    """
+    Множество id авторов, на которых подписан пользователь: из кэша
+    без запросов, при промахе - один запрос по индексу (user, author).
+    """
+    key = _following_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(
+            Follow.objects.filter(user_id=user_id).values_list(
+                "author_id", flat=True
+            )
+        )
+        cache.set(key, ids, settings.FOLLOW_GRAPH_TIMEOUT)
+    return ids
+
+
+def is_following(user, author):
+    """
+    Подписан ли пользователь на автора; аноним ни на кого не подписан.
+    """
+    if not user.is_authenticated or user.pk == author.pk:
+        return False
+    return author.pk in following_ids(user.pk)
+
+
+def following_count(user_id):
+    return len(following_ids(user_id))
+
+
+def follower_counts(author_ids):
+    """
+    Число подписчиков авторов: {author_id: количество}. Промахи кэша
+    считаются одним запросом с группировкой.
+    """
+    keys = {_followers_key(author_id): author_id for author_id in author_ids}
+    counts = {
+        keys[key]: value for key, value in cache.get_many(keys).items()
+    }
+    missing = [pk for pk in keys.values() if pk not in counts]
+    if missing:
+        found = dict(
+            Follow.objects.filter(author_id__in=missing)
+            .order_by()
+            .values_list("author_id")
+            .annotate(number=Count("id"))
+        )
+        fresh = {author_id: found.get(author_id, 0) for author_id in missing}
+        cache.set_many(
+            {_followers_key(pk): value for pk, value in fresh.items()},
+            settings.FOLLOW_GRAPH_TIMEOUT,
+        )
+        counts.update(fresh)
+    return counts
+
+
+def follower_count(author_id):
+    return follower_counts([author_id])[author_id]
+
+
+def changed(pairs):
+    """
+    Подписки (пользователь, автор) появились или пропали: подписки
+    пользователей и счётчики авторов сбрасываются сразу и ещё раз
+    после фиксации транзакции, чтобы чтение между ними не оставило
+    в кэше старое значение.
+    """
+    keys = set()
+    for user_id, author_id in pairs:
+        keys.update((_following_key(user_id), _followers_key(author_id)))
+    if not keys:
+        return
+
+    def forget():
+        cache.delete_many(keys)
+
+    forget()
+    transaction.on_commit(forget)
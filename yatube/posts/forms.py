@@ -1,5 +1,6 @@
 from django import forms
 
+from . import threads
 from .models import Comment, Post
 
 
@@ -12,6 +13,24 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('group', 'text', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Картинку, отклонённую при загрузке (см. posts.uploads),
+        # форма не разбирает, а показывает причину отказа.
+        self.upload_error = None
+        image = self.files.get('image')
+        if getattr(image, 'upload_error', None):
+            self.upload_error = image.upload_error
+            image.close()
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.upload_error:
+            self.add_error('image', self.upload_error)
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     """
@@ -21,3 +40,23 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.post = post
+
+    def clean(self):
+        # Родитель приходит скрытым полем ответа; у формы одно поле,
+        # поэтому он разбирается здесь.
+        cleaned_data = super().clean()
+        parent_id = self.data.get('parent')
+        if parent_id and self.post is not None:
+            parent = None
+            if parent_id.isdigit():
+                parent = self.post.comments.filter(pk=parent_id).first()
+            if parent is None:
+                raise forms.ValidationError(
+                    'Комментарий для ответа не найден.'
+                )
+            self.instance.parent = threads.reply_parent(parent)
+        return cleaned_data
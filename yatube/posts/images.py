@@ -0,0 +1,141 @@
+import base64
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from PIL import Image, ImageOps
+from sorl.thumbnail import default, delete
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post
+from .storage import image_storage
+
+# Заглушка в пропорциях превью (960x339) и число цветов для поиска
+# основного.
+PREVIEW_SIZE = (17, 6)
+PREVIEW_QUALITY = 40
+PALETTE_SIZE = 5
+
+
+def _thumbnails_size(source):
+    """
+    Сколько байт занимают превью картинки по записям sorl.
+    """
+    size = 0
+    for key in default.kvstore._get(source.key, identity="thumbnails") or []:
+        thumbnail = default.kvstore._get(key)
+        if thumbnail and thumbnail.exists():
+            size += thumbnail.storage.size(thumbnail.name)
+    return size
+
+
+def release(name):
+    """
+    Пост больше не ссылается на картинку: файл и его превью
+    удаляются, если на неё не ссылается ни один другой пост.
+    Возвращает число освобождённых байт.
+
+    Файл, который недавно загружали снова, не трогается: его пост
+    может быть ещё не сохранён. Такие файлы подберёт сборка мусора.
+    """
+    if not name or Post.objects.filter(image=name).exists():
+        return 0
+    try:
+        if not image_storage.exists(name):
+            return 0
+    except SuspiciousFileOperation:
+        # Имя вне MEDIA_ROOT: файл не принадлежит хранилищу.
+        return 0
+    modified = image_storage.get_modified_time(name).timestamp()
+    if time.time() - modified < settings.IMAGE_RELEASE_GRACE:
+        return 0
+    source = ImageFile(name, image_storage)
+    reclaimed = image_storage.size(name) + _thumbnails_size(source)
+    delete(source)
+    return reclaimed
+
+
+def preview(file):
+    """
+    Крошечная JPEG-заглушка картинки (data URL в несколько сотен байт)
+    и её основной цвет в виде #rrggbb.
+
+    JPEG декодируется сразу в уменьшенном виде, так что даже большая
+    картинка разбирается быстро. Для нечитаемого файла - пустые строки.
+    """
+    was_closed = file.closed
+    try:
+        file.open("rb")
+    except (OSError, SuspiciousFileOperation):
+        return "", ""
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            image.draft("RGB", (PREVIEW_SIZE[0] * 8, PREVIEW_SIZE[1] * 8))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        return "", ""
+    finally:
+        # Несохранённую загрузку ещё будет читать хранилище.
+        if was_closed:
+            file.close()
+        else:
+            file.seek(0)
+
+    small = ImageOps.fit(image, PREVIEW_SIZE, Image.BILINEAR)
+    raw = BytesIO()
+    small.save(raw, "JPEG", quality=PREVIEW_QUALITY, optimize=True)
+    placeholder = "data:image/jpeg;base64," + base64.b64encode(
+        raw.getvalue()
+    ).decode()
+
+    palette = image.resize((64, 64), Image.BILINEAR).quantize(PALETTE_SIZE)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    return placeholder, f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def fill_preview(post):
+    """
+    Заглушка и основной цвет для новой картинки поста. Одинаковые
+    картинки лежат в одном файле, поэтому готовые значения берутся
+    у другого поста с тем же файлом. Иначе поля остаются пустыми
+    до задачи превью (save_preview): в запросе картинка
+    не декодируется.
+    """
+    post.image_placeholder = post.image_color = ""
+    if post.image and post.image._committed:
+        # У новой загрузки имени по хэшу ещё нет.
+        known = _known_preview(post.image.name)
+        if known:
+            post.image_placeholder, post.image_color = known
+
+
+def _known_preview(name):
+    return (
+        Post.objects.filter(image=name)
+        .exclude(image_placeholder="")
+        .values_list("image_placeholder", "image_color")
+        .first()
+    )
+
+
+def save_preview(name):
+    """
+    Заглушка и основной цвет постов с картинкой name, у которых их
+    ещё нет: файл разбирается один раз, поля пишутся одним UPDATE.
+    Выполняется в задаче превью, вне запроса.
+    """
+    posts = Post.objects.filter(image=name, image_placeholder="")
+    if not posts.exists():
+        return
+    known = _known_preview(name)
+    if known is None:
+        try:
+            with image_storage.open(name) as file:
+                known = preview(file)
+        except (OSError, SuspiciousFileOperation):
+            return
+    if known[0]:
+        posts.update(image_placeholder=known[0], image_color=known[1])
@@ -0,0 +1,109 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from posts import orphans
+
+
+class Command(BaseCommand):
+    """
+    Сборка мусора в медиафайлах.
+    """
+
+    help = (
+        "Удаляет картинки, на которые не ссылается ни один пост, "
+        "превью без записей sorl и записи sorl о пропавших файлах. "
+        "Работает пачками и продолжает "
+        "прерванный проход с сохранённого места."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Сколько пачек обработать за этот запуск.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, что было бы удалено.",
+        )
+        parser.add_argument(
+            "--state",
+            default=settings.MEDIA_GC_STATE,
+            help="Файл с местом, где остановился прошлый проход.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Начать проход заново, не глядя на сохранённое место.",
+        )
+
+    def load_state(self, path):
+        try:
+            with open(path) as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return orphans.PHASES[0], ""
+        except ValueError:
+            raise CommandError(f"Файл {path} повреждён, задайте --restart.")
+        if state.get("phase") not in orphans.PHASES:
+            raise CommandError(f"Файл {path} повреждён, задайте --restart.")
+        return state["phase"], state.get("after", "")
+
+    def save_state(self, path, phase, after):
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump({"phase": phase, "after": after}, file)
+        os.replace(temporary, path)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должно быть не меньше 1.")
+        path = options["state"]
+        dry_run = options["dry_run"]
+        if options["restart"]:
+            phase, after = orphans.PHASES[0], ""
+        else:
+            phase, after = self.load_state(path)
+            if after:
+                self.stdout.write(f"Продолжение с {phase}: {after}")
+
+        totals = {"scanned": 0, "orphans": 0, "deleted": 0, "bytes": 0}
+        batches = 0
+        finished = True
+        for report in orphans.collect(
+            phase, after, options["batch_size"], dry_run
+        ):
+            for key in totals:
+                totals[key] += report[key]
+            batches += 1
+            if not dry_run:
+                self.save_state(path, report["phase"], report["after"])
+            if options["limit"] is not None and batches >= options["limit"]:
+                finished = False
+                break
+
+        if finished and not dry_run and os.path.exists(path):
+            os.remove(path)
+        verb = "Можно освободить" if dry_run else "Освобождено"
+        self.stdout.write(
+            f"Просмотрено файлов: {totals['scanned']}, "
+            f"сирот: {totals['orphans']}, удалено: {totals['deleted']}."
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb}: {filesizeformat(totals['bytes'])} "
+                f"({totals['bytes']} байт)."
+            )
+        )
+        if not finished:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Проход не закончен, следующий запуск продолжит его."
+                )
+            )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    """
+    Сверка счётчиков комментариев постов с таблицей комментариев.
+    """
+
+    help = (
+        "Сверяет число комментариев и дату последнего комментария "
+        "у постов и исправляет расхождения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только показать расхождения, ничего не исправляя.",
+        )
+
+    def handle(self, *args, **options):
+        drift = counters.find_comment_drift()
+        for post_id, stored, actual in drift:
+            self.stdout.write(
+                f"Пост {post_id}: сохранено {stored}, в базе {actual}"
+            )
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Расхождений нет."))
+            return
+        if options["check"]:
+            self.stdout.write(
+                self.style.WARNING(f"Расхождений: {len(drift)}.")
+            )
+            return
+        counters.repair_comments(drift)
+        self.stdout.write(
+            self.style.SUCCESS(f"Исправлено постов: {len(drift)}.")
+        )
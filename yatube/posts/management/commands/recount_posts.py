@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    """
+    Сверка счётчиков постов с таблицей постов.
+    """
+
+    help = "Сверяет счётчики постов и исправляет расхождения."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только показать расхождения, ничего не исправляя.",
+        )
+
+    def handle(self, *args, **options):
+        drift = counters.find_drift()
+        for scope, object_id, stored, actual in drift:
+            self.stdout.write(
+                f"{scope}:{object_id}: сохранено {stored}, в базе {actual}"
+            )
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Расхождений нет."))
+            return
+        if options["check"]:
+            self.stdout.write(
+                self.style.WARNING(f"Расхождений: {len(drift)}.")
+            )
+            return
+        counters.repair(drift)
+        self.stdout.write(
+            self.style.SUCCESS(f"Исправлено счётчиков: {len(drift)}.")
+        )
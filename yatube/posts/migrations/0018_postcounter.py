@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:34
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    PostCounter = apps.get_model('posts', 'PostCounter')
+    counters = [
+        PostCounter(scope='site', object_id=0, value=Post.objects.count())
+    ]
+    for scope, field in (('author', 'author_id'), ('group', 'group_id')):
+        rows = (
+            Post.objects.exclude(**{field: None})
+            .order_by()
+            .values(field)
+            .annotate(value=Count('id'))
+        )
+        counters.extend(
+            PostCounter(scope=scope, object_id=row[field], value=row['value'])
+            for row in rows
+        )
+    PostCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_auto_20220111_2244'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='post',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='posts.Post', verbose_name='Пост'),
+        ),
+        migrations.CreateModel(
+            name='PostCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('site', 'Сайт'), ('author', 'Автор'), ('group', 'Группа')], max_length=10, verbose_name='Область')),
+                ('object_id', models.PositiveIntegerField(default=0, verbose_name='ID объекта')),
+                ('value', models.IntegerField(default=0, verbose_name='Количество постов')),
+            ],
+            options={
+                'verbose_name': 'Счётчик постов',
+                'verbose_name_plural': 'Счётчики постов',
+                'unique_together': {('scope', 'object_id')},
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+from posts import search
+
+# Таблица FTS5 с внешним содержимым: хранит только индекс, текст
+# берётся из posts_post. Триггеры (posts.search.TRIGGERS) держат индекс
+# в синхронизации при любой записи, включая bulk_create и update().
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+REBUILD = "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')"
+
+
+def create(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(CREATE_TABLE)
+    search.create_triggers(schema_editor.connection)
+    schema_editor.execute(REBUILD)
+
+
+def drop(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    search.drop_triggers(schema_editor.connection)
+    schema_editor.execute("DROP TABLE IF EXISTS posts_post_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_image_preview'),
+    ]
+
+    operations = [
+        migrations.RunPython(create, drop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:10
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копия posts.tags.HASHTAG на момент миграции.
+HASHTAG = re.compile(r"(?<![\w#&])#(\w{1,64})(?!\w)")
+
+
+def index_posts(apps, schema_editor):
+    """
+    Индекс хэштегов для уже написанных постов, пачками.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Tag = apps.get_model('posts', 'Tag')
+    TaggedPost = apps.get_model('posts', 'TaggedPost')
+    tag_ids = {}
+    entries = []
+    for pk, text, pub_date in Post.objects.values_list(
+        'pk', 'text', 'pub_date'
+    ).iterator():
+        for name in {name.lower() for name in HASHTAG.findall(text)}:
+            if name not in tag_ids:
+                tag_ids[name] = Tag.objects.create(name=name).pk
+            entries.append(
+                TaggedPost(tag_id=tag_ids[name], post_id=pk, pub_date=pub_date)
+            )
+        if len(entries) >= 500:
+            TaggedPost.objects.bulk_create(entries)
+            entries = []
+    TaggedPost.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='Название')),
+            ],
+            options={
+                'verbose_name': 'Хэштег',
+                'verbose_name_plural': 'Хэштеги',
+            },
+        ),
+        migrations.CreateModel(
+            name='TaggedPost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_entries', to='posts.Post')),
+                ('tag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='posts.Tag')),
+            ],
+            options={
+                'verbose_name': 'Пост с хэштегом',
+                'verbose_name_plural': 'Посты с хэштегами',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='taggedpost',
+            index=models.Index(fields=['tag', 'pub_date', 'post'], name='tagged_post_tag_pub_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='taggedpost',
+            unique_together={('tag', 'post')},
+        ),
+        migrations.RunPython(index_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:13
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+
+from posts import search
+
+
+def restore_search_triggers(apps, schema_editor):
+    """
+    SQLite добавляет поля, пересоздавая posts_post, и триггеры
+    поискового индекса пропадают вместе со старой таблицей.
+    """
+    search.create_triggers(schema_editor.connection)
+
+
+def count_comments(apps, schema_editor):
+    """
+    Счётчики для уже написанных комментариев одним UPDATE.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = (
+        Comment.objects.filter(post=OuterRef('pk')).order_by().values('post')
+    )
+    Post.objects.filter(pk__in=Comment.objects.values('post')).update(
+        comment_count=Subquery(
+            comments.annotate(number=Count('pk')).values('number')
+        ),
+        last_commented_at=Subquery(
+            comments.annotate(last=Max('created')).values('last')
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_hashtags'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop, restore_search_triggers
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='last_commented_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последний комментарий'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['last_commented_at', 'id'], name='post_last_commented_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
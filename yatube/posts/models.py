@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+
+from .storage import image_storage
 
 User = get_user_model()
 
@@ -53,22 +55,75 @@ class Post(models.Model):
         verbose_name="Группа",
         related_name="posts",
     )
-    image = models.ImageField("Картинка", upload_to="posts/", blank=True)
+    image = models.ImageField(
+        "Картинка",
+        upload_to="posts/",
+        storage=image_storage,
+        blank=True,
+    )
+    image_placeholder = models.TextField(
+        "Заглушка картинки", blank=True, editable=False
+    )
+    image_color = models.CharField(
+        "Основной цвет картинки", max_length=7, blank=True, editable=False
+    )
+    comment_count = models.PositiveIntegerField(
+        "Количество комментариев", default=0, editable=False
+    )
+    last_commented_at = models.DateTimeField(
+        "Последний комментарий", null=True, blank=True, editable=False
+    )
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_group_id = loaded.get("group_id")
+        instance._loaded_image = loaded.get("image")
+        instance._loaded_text = loaded.get("text")
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Счётчики обновляются в post_save, в той же транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         ordering = ("-pub_date",)
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
+        indexes = [
+            models.Index(
+                fields=["author", "pub_date"], name="post_author_pub_date_idx"
+            ),
+            models.Index(
+                fields=["group", "pub_date"], name="post_group_pub_date_idx"
+            ),
+            models.Index(fields=["pub_date", "id"], name="post_pub_date_idx"),
+            models.Index(fields=["image"], name="post_image_idx"),
+            models.Index(
+                fields=["last_commented_at", "id"],
+                name="post_last_commented_idx",
+            ),
+        ]
 
 
 class Comment(CreatedModel):
     """
     Модель для комментариев.
+
+    Ответы хранят материализованный путь: id всех предков и самого
+    комментария, по PATH_STEP цифр на уровень. Сортировка по пути
+    даёт обход ветки в глубину, а вся ветка читается одним
+    диапазоном по индексу (post, path).
     """
 
+    PATH_STEP = 10
+    MAX_DEPTH = 8
+
     text = models.TextField("Текст комментария", max_length=200)
     author = models.ForeignKey(
         User,
@@ -83,15 +138,49 @@ class Comment(CreatedModel):
         null=True,
         blank=True,
     )
+    parent = models.ForeignKey(
+        "self",
+        related_name="replies",
+        verbose_name="Ответ на",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+    )
+    path = models.CharField(
+        "Путь в ветке",
+        max_length=PATH_STEP * MAX_DEPTH,
+        blank=True,
+        editable=False,
+    )
+    depth = models.PositiveSmallIntegerField(
+        "Уровень", default=0, editable=False
+    )
+    reply_count = models.PositiveIntegerField(
+        "Количество ответов", default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
         ordering = ("-created",)
+        indexes = [
+            models.Index(
+                fields=["post", "created"], name="comment_post_created_idx"
+            ),
+            models.Index(
+                fields=["post", "path"], name="comment_post_path_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Комментарий {self.author.username}"
 
+    def save(self, *args, **kwargs):
+        # Счётчик комментариев поста обновляется в post_save,
+        # в той же транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Follow(models.Model):
     """
@@ -108,3 +197,114 @@ class Follow(models.Model):
         related_name="following",
         on_delete=models.CASCADE,
     )
+
+    class Meta:
+        unique_together = ("user", "author")
+
+
+class PostCounter(models.Model):
+    """
+    Денормализованный счётчик постов автора, группы или всего сайта.
+    """
+
+    SITE = "site"
+    AUTHOR = "author"
+    GROUP = "group"
+    SCOPES = (
+        (SITE, "Сайт"),
+        (AUTHOR, "Автор"),
+        (GROUP, "Группа"),
+    )
+
+    scope = models.CharField("Область", max_length=10, choices=SCOPES)
+    object_id = models.PositiveIntegerField("ID объекта", default=0)
+    value = models.IntegerField("Количество постов", default=0)
+
+    class Meta:
+        verbose_name = "Счётчик постов"
+        verbose_name_plural = "Счётчики постов"
+        unique_together = ("scope", "object_id")
+
+    def __str__(self):
+        return f"{self.scope}:{self.object_id} = {self.value}"
+
+
+class TimelineEntry(models.Model):
+    """
+    Пост в материализованной ленте подписок пользователя.
+    """
+
+    user = models.ForeignKey(
+        User,
+        related_name="timeline",
+        on_delete=models.CASCADE,
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name="timeline_entries",
+        on_delete=models.CASCADE,
+    )
+    author = models.ForeignKey(
+        User,
+        related_name="+",
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    pub_date = models.DateTimeField("Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(
+                fields=["user", "pub_date", "post"],
+                name="timeline_user_pub_date_idx",
+            ),
+        ]
+
+
+class Tag(models.Model):
+    """
+    Хэштег из текста постов.
+    """
+
+    name = models.CharField("Название", max_length=64, unique=True)
+
+    def __str__(self):
+        return f"#{self.name}"
+
+    class Meta:
+        verbose_name = "Хэштег"
+        verbose_name_plural = "Хэштеги"
+
+
+class TaggedPost(models.Model):
+    """
+    Запись инвертированного индекса хэштегов: пост с тегом
+    и датой публикации, чтобы лента тега читалась по индексу.
+    """
+
+    tag = models.ForeignKey(
+        Tag,
+        related_name="entries",
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name="tag_entries",
+        on_delete=models.CASCADE,
+    )
+    pub_date = models.DateTimeField("Дата публикации")
+
+    class Meta:
+        verbose_name = "Пост с хэштегом"
+        verbose_name_plural = "Посты с хэштегами"
+        unique_together = ("tag", "post")
+        indexes = [
+            models.Index(
+                fields=["tag", "pub_date", "post"],
+                name="tagged_post_tag_pub_date_idx",
+            ),
+        ]
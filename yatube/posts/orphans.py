@@ -0,0 +1,222 @@
+import heapq
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from . import images
+from .models import Post
+
+# Этапы прохода: картинки постов, файлы превью sorl, затем записи
+# sorl о файлах, которых уже нет.
+PHASES = ("images", "thumbnails", "records")
+# Сколько записей каталога или хранилища ключей держится в памяти.
+PAGE_SIZE = 1000
+
+
+def _prefix(phase):
+    if phase == "images":
+        return Post._meta.get_field("image").upload_to
+    return sorl_settings.THUMBNAIL_PREFIX
+
+
+def _sort_key(entry):
+    # Каталог сравнивается как "имя/", чтобы порядок обхода
+    # совпадал с порядком строк полных путей.
+    return entry.name + "/" * entry.is_dir()
+
+
+def _entries(directory, after):
+    """
+    Записи каталога с ключом больше after по возрастанию, страницами
+    по PAGE_SIZE: каждая страница - новый просмотр каталога с выбором
+    наименьших ключей через кучу, без сортировки всего списка.
+    """
+    while True:
+        try:
+            with os.scandir(directory) as entries:
+                page = heapq.nsmallest(
+                    PAGE_SIZE,
+                    (
+                        entry
+                        for entry in entries
+                        if not entry.name.startswith(".")
+                        and _sort_key(entry) > after
+                    ),
+                    key=_sort_key,
+                )
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        yield from page
+        if len(page) < PAGE_SIZE:
+            return
+        after = _sort_key(page[-1])
+
+
+def _walk(root, directory, after):
+    """
+    Файлы каталога по возрастанию пути относительно root, только
+    те, что идут после after. В памяти держится не больше PAGE_SIZE
+    записей на уровень; каталоги, целиком лежащие до after,
+    не читаются.
+    """
+    base = os.path.relpath(directory, root).replace(os.sep, "/") + "/"
+    # Внутри каталога, где лежит after, начинаем с его первой части.
+    start = after[len(base):].split("/")[0] if after.startswith(base) else ""
+    for entry in _entries(directory, start):
+        relative = base + entry.name
+        if entry.is_dir(follow_symlinks=False):
+            subtree = relative + "/"
+            if after > subtree and not after.startswith(subtree):
+                continue
+            yield from _walk(root, entry.path, after)
+        elif entry.is_file(follow_symlinks=False) and relative > after:
+            yield relative, entry.stat(follow_symlinks=False)
+
+
+def iter_files(phase, after=""):
+    """
+    Поток пар (имя, stat) файлов этапа в MEDIA_ROOT.
+    """
+    root = settings.MEDIA_ROOT
+    return _walk(root, os.path.join(root, _prefix(phase)), after)
+
+
+def _orphan_images(batch):
+    names = [name for name, _ in batch]
+    referenced = set(
+        Post.objects.filter(image__in=names).values_list("image", flat=True)
+    )
+    return [(name, stat) for name, stat in batch if name not in referenced]
+
+
+def _orphan_thumbnails(batch):
+    """
+    Превью, на которые нет записи в хранилище ключей sorl: ключ
+    вычисляется по имени файла, все ключи пачки проверяются одним
+    запросом.
+    """
+    keys = {
+        add_prefix(ImageFile(name, default.storage).key): (name, stat)
+        for name, stat in batch
+    }
+    stored = set(
+        KVStore.objects.filter(key__in=list(keys)).values_list(
+            "key", flat=True
+        )
+    )
+    return [value for key, value in keys.items() if key not in stored]
+
+
+def iter_records(after=""):
+    """
+    Поток пар (ключ, файл) записей sorl об отдельных файлах,
+    исходниках и превью, по возрастанию ключа. Записи читаются
+    страницами: между ними проход удаляет найденные сироты.
+    """
+    prefix = add_prefix("", "image")
+    after = max(after, prefix)
+    while True:
+        page = list(
+            KVStore.objects.filter(key__startswith=prefix, key__gt=after)
+            .order_by("key")
+            .values_list("key", "value")[:PAGE_SIZE]
+        )
+        for key, value in page:
+            yield key, deserialize_image_file(value)
+        if len(page) < PAGE_SIZE:
+            return
+        after = page[-1][0]
+
+
+def _orphan_records(batch):
+    return [(key, image) for key, image in batch if not image.exists()]
+
+
+def _delete_image(name, stat):
+    size = images.release(name)
+    return bool(size), size
+
+
+def _delete_thumbnail(name, stat):
+    default.storage.delete(name)
+    return True, stat.st_size
+
+
+def _delete_record(key, image):
+    """
+    Запись о пропавшем файле удаляется вместе с записями его превью
+    и их файлами.
+    """
+    default.kvstore.delete(image)
+    return True, 0
+
+
+def _fresh_files(orphans):
+    """
+    Файлы моложе IMAGE_RELEASE_GRACE: их пост может быть ещё
+    не сохранён.
+    """
+    fresh_after = time.time() - settings.IMAGE_RELEASE_GRACE
+    return [
+        (name, stat) for name, stat in orphans if stat.st_mtime < fresh_after
+    ]
+
+
+def _items(phase, after):
+    if phase == "records":
+        return iter_records(after)
+    return iter_files(phase, after)
+
+
+# Для каждого этапа: поиск сирот в пачке и удаление одной сироты.
+HANDLERS = {
+    "images": (_orphan_images, _delete_image),
+    "thumbnails": (_orphan_thumbnails, _delete_thumbnail),
+    "records": (_orphan_records, _delete_record),
+}
+
+
+def collect(phase=PHASES[0], after="", batch_size=500, dry_run=False):
+    """
+    Поиск и удаление осиротевших файлов и записей sorl пачками,
+    начиная с этапа phase после пути или ключа after.
+
+    После каждой пачки отдаётся отчёт о ней: по его полям phase
+    и after проход можно продолжить в другой раз. Картинки
+    освобождаются через images.release вместе с превью и записями
+    sorl; файлы моложе IMAGE_RELEASE_GRACE не трогаются.
+    """
+    for phase in PHASES[PHASES.index(phase):]:
+        find, delete = HANDLERS[phase]
+        items = _items(phase, after)
+        while True:
+            batch = list(islice(items, batch_size))
+            if not batch:
+                break
+            orphans = find(batch)
+            if phase != "records":
+                orphans = _fresh_files(orphans)
+            reclaimed = deleted = 0
+            if not dry_run:
+                for item in orphans:
+                    removed, size = delete(*item)
+                    deleted += removed
+                    reclaimed += size
+            elif phase != "records":
+                reclaimed = sum(stat.st_size for _, stat in orphans)
+            yield {
+                "phase": phase,
+                "after": batch[-1][0],
+                "scanned": len(batch),
+                "orphans": len(orphans),
+                "deleted": deleted,
+                "bytes": reclaimed,
+            }
+        after = ""
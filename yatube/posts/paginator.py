@@ -0,0 +1,209 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+from . import threads
+
+
+def encode_cursor(obj, date_field="pub_date"):
+    """
+    Курсор объекта: его дата (по умолчанию pub_date) и id,
+    упакованные в base64.
+    """
+    raw = f"{getattr(obj, date_field).isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Разбор курсора в пару (pub_date, id), для битого курсора - None.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk = raw.rsplit("|", 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+def cursor_filter(key, newer=False, date_field="pub_date", pk_field="pk"):
+    """
+    Условие «старше ключа» (или «новее» при newer) для пары (pub_date, id).
+    """
+    pub_date, pk = key
+    op = "gt" if newer else "lt"
+    return Q(**{f"{date_field}__{op}": pub_date}) | Q(
+        **{date_field: pub_date, f"{pk_field}__{op}": pk}
+    )
+
+
+class CursorPaginator(Paginator):
+    """
+    Паджинатор по ключу (pub_date, id); поле даты задаёт date_field.
+
+    Страница читается одним запросом с LIMIT без OFFSET и COUNT,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    Отдаётся обычный Page: number и num_pages описывают только
+    соседство страниц, а курсоры соседей лежат в next_cursor
+    и previous_cursor.
+    """
+
+    date_field = "pub_date"
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(
+            object_list.order_by(f"-{self.date_field}", "-pk"),
+            per_page,
+            **kwargs,
+        )
+        if count is not None:
+            self.__dict__["count"] = count
+
+    def get_page(self, after=None, before=None, page=None):
+        """
+        Страница объектов старше курсора after или новее курсора before.
+        Номер page из старых ссылок учитывается, только если курсоров нет.
+        """
+        if page is not None and after is None and before is None:
+            return self._numbered_page(page)
+        before_key = decode_cursor(before)
+        if before_key is not None:
+            rows = self._rows(before_key, True, self.per_page + 1)
+            if rows:
+                has_previous = len(rows) > self.per_page
+                rows = rows[:self.per_page][::-1]
+                return self._cursor_page(rows, True, has_previous)
+
+        after_key = decode_cursor(after)
+        rows = self._rows(after_key, False, self.per_page + 1)
+        has_next = len(rows) > self.per_page
+        return self._cursor_page(
+            rows[:self.per_page], has_next, after_key is not None
+        )
+
+    def _numbered_page(self, number):
+        """
+        Страница по номеру из старых ссылок ?page=N: все объекты до неё
+        читаются одним запросом, ссылки со страницы уже курсорные.
+        Номер не из 1..LEGACY_PAGE_LIMIT или за концом ленты - 404.
+        """
+        try:
+            number = int(number)
+        except ValueError:
+            raise Http404("Неверный номер страницы.")
+        if not 1 <= number <= settings.LEGACY_PAGE_LIMIT:
+            raise Http404("Неверный номер страницы.")
+        start = (number - 1) * self.per_page
+        rows = self._rows(None, False, start + self.per_page + 1)
+        if number > 1 and len(rows) <= start:
+            raise Http404("Такой страницы нет.")
+        has_next = len(rows) > start + self.per_page
+        return self._cursor_page(
+            rows[start:start + self.per_page], has_next, number > 1
+        )
+
+    def _rows(self, key, newer, limit):
+        """
+        Не больше limit объектов старше ключа (при newer - новее),
+        начиная с ближайшего к ключу.
+        """
+        rows = self.object_list
+        if key is not None:
+            rows = rows.filter(cursor_filter(key, newer, self.date_field))
+        if newer:
+            rows = rows.order_by(self.date_field, "pk")
+        return list(rows[:limit])
+
+    def _cursor_page(self, rows, has_next, has_previous):
+        number = 2 if has_previous else 1
+        self.__dict__["num_pages"] = number + 1 if has_next else number
+        page = self._get_page(rows, number, self)
+        page.next_cursor = (
+            encode_cursor(rows[-1], self.date_field)
+            if has_next and rows
+            else None
+        )
+        page.previous_cursor = (
+            encode_cursor(rows[0], self.date_field)
+            if has_previous and rows
+            else None
+        )
+        return page
+
+
+def page_params(request):
+    """
+    Параметры страницы ленты из запроса: курсоры after/before
+    и номер page из старых ссылок.
+    """
+    return {key: request.GET.get(key) for key in ("after", "before", "page")}
+
+
+def get_page_obj(request, posts, count=None):
+    """
+    Страница ленты по параметрам after/before/page из запроса.
+    """
+    paginator = CursorPaginator(posts, settings.PAGINATOR_NUM, count=count)
+    return paginator.get_page(**page_params(request))
+
+
+class CommentPaginator(CursorPaginator):
+    """
+    Корневые комментарии поста порциями от новых к старым, вместе
+    с авторами; ответы к порции добавляет threads.attach_replies.
+    """
+
+    date_field = "created"
+
+    def __init__(self, post, per_page, **kwargs):
+        super().__init__(
+            post.comments.filter(parent=None).select_related("author"),
+            per_page,
+            **kwargs,
+        )
+
+
+def get_comments_page(request, post):
+    """
+    Порция комментариев поста по параметру after из запроса,
+    с ответами.
+    """
+    paginator = CommentPaginator(post, settings.COMMENTS_PAGE_SIZE)
+    page = paginator.get_page(after=request.GET.get("after"))
+    threads.attach_replies(page)
+    return page
+
+
+class DiscussionPaginator(CursorPaginator):
+    """
+    Посты с комментариями, от недавно обсуждавшихся к давним:
+    страница читается по индексу (last_commented_at, id).
+    """
+
+    date_field = "last_commented_at"
+
+    def __init__(self, posts, per_page, **kwargs):
+        super().__init__(
+            posts.filter(last_commented_at__isnull=False), per_page, **kwargs
+        )
+
+
+def get_discussions_page(request, posts):
+    """
+    Страница активных обсуждений по параметрам after/before/page
+    из запроса.
+    """
+    paginator = DiscussionPaginator(posts, settings.PAGINATOR_NUM)
+    return paginator.get_page(**page_params(request))
@@ -0,0 +1,175 @@
+import heapq
+from array import array
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Post
+from .paginator import CursorPaginator, page_params
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+# Больше частей в одном составном SELECT SQLite по умолчанию не берёт.
+UNION_LIMIT = 500
+
+
+def _key(author_id):
+    return f"recent_posts:{author_id}"
+
+
+def _pack(rows):
+    """
+    Пары (pub_date, id) в плоский массив int64: время в микросекундах
+    и id по очереди, от нового поста к старому.
+    """
+    buffer = array("q")
+    for pub_date, pk in rows:
+        buffer.extend(((pub_date - EPOCH) // MICROSECOND, pk))
+    return buffer.tobytes()
+
+
+def _unpack(raw):
+    buffer = array("q")
+    buffer.frombytes(raw)
+    return list(zip(buffer[::2], buffer[1::2]))
+
+
+def author_slices(author_ids, limit, condition=None, newer=False):
+    """
+    Не больше limit постов каждого автора, подходящих под condition,
+    от новых к старым (при newer - от старых к новым): UNION ALL
+    из диапазонов по индексу (author, pub_date), у каждой части свой
+    LIMIT. SQLite собирает не больше UNION_LIMIT частей в один
+    запрос, поэтому на очень длинный список уходит несколько.
+    У постов загружены только id, автор и pub_date.
+    """
+    order = ("pub_date", "pk") if newer else ("-pub_date", "-pk")
+    author_ids = list(author_ids)
+    for start in range(0, len(author_ids), UNION_LIMIT):
+        parts = []
+        for author_id in author_ids[start:start + UNION_LIMIT]:
+            posts = Post.objects.filter(author_id=author_id)
+            if condition is not None:
+                posts = posts.filter(condition)
+            parts.append(
+                posts.order_by(*order)
+                .values_list("pk", "author_id", "pub_date")[:limit]
+                .query.sql_with_params()
+            )
+        sql = " UNION ALL ".join(
+            f"SELECT * FROM ({part}) slice_{number}"
+            for number, (part, _) in enumerate(parts)
+        )
+        params = [param for _, part_params in parts for param in part_params]
+        yield from Post.objects.raw(sql, params)
+
+
+def _load(author_ids):
+    """
+    Буферы авторов из базы одним запросом: по RECENT_POSTS_SIZE
+    последних постов на автора (author_slices).
+    """
+    rows = {author_id: [] for author_id in author_ids}
+    for post in author_slices(rows, settings.RECENT_POSTS_SIZE):
+        rows[post.author_id].append((post.pub_date, post.pk))
+    raws = {_key(author_id): _pack(rows[author_id]) for author_id in rows}
+    cache.set_many(raws, settings.RECENT_POSTS_TIMEOUT)
+    return raws
+
+
+def get_buffers(author_ids):
+    """
+    Буферы последних постов авторов: {author_id: [(время, id), ...]}.
+    Отсутствующие в кэше буферы собираются из базы одним запросом.
+    """
+    keys = {_key(author_id): author_id for author_id in author_ids}
+    cached = cache.get_many(keys)
+    missing = [pk for key, pk in keys.items() if key not in cached]
+    if missing:
+        cached.update(_load(missing))
+    return {author_id: _unpack(cached[key]) for key, author_id in keys.items()}
+
+
+def push(post):
+    """
+    Новый пост встаёт в начало буфера автора.
+    """
+    key = _key(post.author_id)
+    raw = cache.get(key)
+    if raw is None:
+        return
+    rows = _unpack(raw)
+    rows.insert(0, ((post.pub_date - EPOCH) // MICROSECOND, post.pk))
+    buffer = array("q")
+    for row in rows[:settings.RECENT_POSTS_SIZE]:
+        buffer.extend(row)
+    cache.set(key, buffer.tobytes(), settings.RECENT_POSTS_TIMEOUT)
+
+
+def forget(author_id):
+    """
+    Сброс буфера автора, он соберётся заново при следующем чтении.
+    """
+    cache.delete(_key(author_id))
+
+
+def merge(author_ids, limit):
+    """
+    ID первых limit постов авторов, слитых из их буферов по убыванию
+    (pub_date, id).
+    """
+    buffers = get_buffers(author_ids).values()
+    merged = heapq.merge(*buffers, reverse=True)
+    return [pk for _, pk in islice(merged, limit)]
+
+
+class RecentPostsMixin:
+    """
+    Первая страница ленты из буферов последних постов авторов.
+
+    Каждый буфер хранит RECENT_POSTS_SIZE самых новых постов автора
+    (или все его посты), поэтому первые limit постов ленты всегда
+    есть в слиянии буферов. Посты страницы достаются одним запросом
+    in_bulk, таблица постов не сортируется. Если часть ID из буферов
+    уже удалена, буферы сбрасываются и страница читается из базы.
+
+    Авторов ленты возвращает get_author_ids() паджинатора.
+    """
+
+    def _rows(self, key, newer, limit):
+        if key is not None or limit > settings.RECENT_POSTS_SIZE:
+            return super()._rows(key, newer, limit)
+        author_ids = list(self.get_author_ids())
+        ids = merge(author_ids, limit)
+        posts = self.object_list.in_bulk(ids)
+        if len(posts) < len(ids):
+            for author_id in author_ids:
+                forget(author_id)
+            return super()._rows(key, newer, limit)
+        return [posts[pk] for pk in ids]
+
+
+class ProfilePaginator(RecentPostsMixin, CursorPaginator):
+    """
+    Паджинатор постов одного автора.
+    """
+
+    def __init__(self, author, per_page, **kwargs):
+        super().__init__(
+            author.posts.select_related("author", "group"), per_page, **kwargs
+        )
+        self.author = author
+
+    def get_author_ids(self):
+        return [self.author.pk]
+
+
+def get_profile_page(request, author, count=None):
+    """
+    Страница постов автора по параметрам after/before/page из запроса.
+    """
+    paginator = ProfilePaginator(author, settings.PAGINATOR_NUM, count=count)
+    return paginator.get_page(**page_params(request))
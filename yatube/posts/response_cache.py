@@ -0,0 +1,126 @@
+import hashlib
+import time
+import zlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def _stamp_key(scope, pk):
+    return f"response_cache:stamp:{scope}:{pk}"
+
+
+def _page_key(request):
+    path = request.get_full_path().encode()
+    return f"response_cache:page:{hashlib.md5(path).hexdigest()}"
+
+
+def _now():
+    return time.time_ns() // 1000
+
+
+def bump(scope, pk=0):
+    """
+    Отметка об изменении объекта: закэшированные страницы,
+    зависящие от него, устаревают.
+    """
+    key = _stamp_key(scope, pk)
+    cache.set(key, max(_now(), (cache.get(key) or 0) + 1), None)
+
+
+def _stamps(keys):
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            cache.add(key, _now(), None)
+            stamps[key] = cache.get(key)
+    return stamps
+
+
+def depends_on(request, scope, pk=0):
+    """
+    Страница зависит от объекта: её кэш сбросится вместе с ним.
+
+    Отметку нужно снимать до чтения данных страницы, чтобы изменение,
+    случившееся во время отрисовки, не попало в кэш как актуальное.
+    """
+    stamps = getattr(request, "response_cache_stamps", None)
+    if stamps is not None:
+        stamps.update(_stamps([_stamp_key(scope, pk)]))
+
+
+def _validators(request, stamps):
+    raw = f"{request.get_full_path()}:{sorted(stamps.items())}"
+    etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+    last_modified = max(stamps.values(), default=_now()) // 10 ** 6
+    return etag, last_modified
+
+
+def _set_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def _cached_response(request, entry):
+    etag, last_modified = entry["etag"], entry["last_modified"]
+    not_modified = get_conditional_response(request, etag, last_modified)
+    if not_modified is not None:
+        return _set_validators(not_modified, etag, last_modified)
+    response = HttpResponse(
+        zlib.decompress(entry["body"]), content_type=entry["content_type"]
+    )
+    return _set_validators(response, etag, last_modified)
+
+
+def _is_fresh(entry):
+    return entry is not None and _stamps(list(entry["stamps"])) == entry[
+        "stamps"
+    ]
+
+
+def cache_for_anonymous(view):
+    """
+    Кэш целых ответов для анонимных читателей.
+
+    Страница хранится сжатой вместе с отметками объектов, от которых
+    она зависит (см. depends_on). Пока отметки не менялись, ответ
+    отдаётся из кэша без вызова вью и шаблонов, а If-None-Match
+    и If-Modified-Since получают 304.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != "GET" or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        key = _page_key(request)
+        entry = cache.get(key)
+        if _is_fresh(entry):
+            return _cached_response(request, entry)
+
+        request.response_cache_stamps = {}
+        response = view(request, *args, **kwargs)
+        stamps = request.response_cache_stamps
+        if response.status_code != 200 or response.streaming or not stamps:
+            return response
+
+        etag, last_modified = _validators(request, stamps)
+        entry = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "stamps": stamps,
+            "content_type": response["Content-Type"],
+            "body": zlib.compress(response.content),
+        }
+        cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+        not_modified = get_conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return _set_validators(not_modified, etag, last_modified)
+        return _set_validators(response, etag, last_modified)
+
+    return wrapper
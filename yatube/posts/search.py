@@ -0,0 +1,137 @@
+import re
+
+from django.db import connection
+
+from .models import Post
+
+# Виртуальная таблица FTS5 над posts_post.text (миграция 0023).
+FTS_TABLE = "posts_post_fts"
+# Границы совпадений во фрагменте: управляющие символы не встречаются
+# в тексте поста, поэтому фрагмент можно экранировать целиком,
+# а потом заменить их на <mark>.
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+SNIPPET_TOKENS = 24
+MAX_TERMS = 8
+TERM = re.compile(r"\w+")
+
+# Триггеры держат внешний индекс FTS5 в синхронизации с posts_post
+# при любой записи, включая bulk_create и update().
+TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert "
+    "AFTER INSERT ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete "
+    "AFTER DELETE ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_update "
+    "AFTER UPDATE OF text ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    "END",
+)
+TRIGGER_NAMES = (
+    "posts_post_fts_insert",
+    "posts_post_fts_delete",
+    "posts_post_fts_update",
+)
+
+
+def available():
+    """
+    Полнотекстовый индекс есть только в SQLite.
+    """
+    return connection.vendor == "sqlite"
+
+
+def create_triggers(db_connection):
+    """
+    Триггеры поискового индекса, если их нет.
+
+    SQLite меняет поля posts_post, пересоздавая таблицу, и триггеры
+    пропадают вместе со старой. Поэтому они ставятся заново после
+    каждого migrate (PostsConfig.ready) и в миграциях, которым
+    индекс нужен сразу.
+    """
+    if db_connection.vendor != "sqlite":
+        return
+    with db_connection.cursor() as cursor:
+        if FTS_TABLE not in db_connection.introspection.table_names(cursor):
+            return
+        for statement in TRIGGERS:
+            cursor.execute(statement)
+
+
+def drop_triggers(db_connection):
+    if db_connection.vendor != "sqlite":
+        return
+    with db_connection.cursor() as cursor:
+        for name in TRIGGER_NAMES:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def match_expression(query):
+    """
+    Запрос пользователя в выражение MATCH: каждое слово - префикс
+    в кавычках, нужны все слова. Синтаксис FTS5 из ввода
+    не проходит, поэтому запрос не может сломать MATCH.
+    """
+    terms = TERM.findall(query.lower())[:MAX_TERMS]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def filter_posts(queryset, query):
+    """
+    Посты, подходящие под запрос, без ранжирования: для админки
+    и других мест со своим порядком.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not available():
+        return queryset.filter(text__icontains=query)
+    # Не pk__in=RawSQL(...): Django обернёт подзапрос в двойные
+    # скобки, и SQLite вернёт из него только первую строку.
+    return queryset.extra(
+        where=[
+            f"{Post._meta.db_table}.id IN (SELECT rowid FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s)"
+        ],
+        params=[expression],
+    )
+
+
+def search(queryset, query):
+    """
+    Посты, подходящие под запрос, от самых релевантных (bm25)
+    к менее релевантным, с фрагментом текста в search_snippet.
+
+    Поиск идёт по индексу FTS5, соединение с постами - по rowid,
+    так что время зависит от числа совпадений, а не от размера
+    таблицы.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not available():
+        return queryset.filter(text__icontains=query).extra(
+            select={"search_snippet": "NULL"}
+        )
+    table = Post._meta.db_table
+    return queryset.extra(
+        select={
+            "search_snippet": (
+                f"snippet({FTS_TABLE}, 0, %s, %s, '…', %s)"
+            ),
+            "search_rank": f"{FTS_TABLE}.rank",
+        },
+        select_params=(SNIPPET_START, SNIPPET_END, SNIPPET_TOKENS),
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = {table}.id", f"{FTS_TABLE} MATCH %s"],
+        params=[expression],
+        order_by=["search_rank", "-pub_date"],
+    )
@@ -0,0 +1,264 @@
+import random
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, LPad
+from django.utils import timezone
+from PIL import Image
+
+from . import counters, images as post_images
+from .models import Comment, Follow, Group, Post, TimelineEntry
+from .storage import image_storage
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """
+    Поля auto_now_add на время блока принимают заданные даты:
+    иначе bulk_create проставит всем объектам текущее время.
+    """
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in saved:
+            field.auto_now_add = auto_now_add
+
+
+def _zipf_weights(number, exponent):
+    return [1 / (rank ** exponent) for rank in range(1, number + 1)]
+
+
+def _save_images(prefix, number, rng):
+    names = []
+    for index in range(number):
+        color = tuple(rng.randrange(256) for _ in range(3))
+        raw = BytesIO()
+        Image.new("RGB", (960, 640), color).save(raw, "JPEG")
+        names.append(
+            image_storage.save(
+                f"posts/{prefix}_{index}.jpg", ContentFile(raw.getvalue())
+            )
+        )
+    return names
+
+
+def _build_timelines(follows, author_posts):
+    """
+    Ленты подписчиков без раскладки по одному посту: по TIMELINE_SIZE
+    самых новых постов из подписок, «тяжёлые» авторы пропускаются.
+    """
+    followers = defaultdict(int)
+    for _, author_id in follows:
+        followers[author_id] += 1
+    heavy = {
+        author_id
+        for author_id, number in followers.items()
+        if number > settings.TIMELINE_FANOUT_LIMIT
+    }
+    subscriptions = defaultdict(list)
+    for user_id, author_id in follows:
+        if author_id not in heavy:
+            subscriptions[user_id].append(author_id)
+
+    entries = []
+    for user_id, author_ids in subscriptions.items():
+        rows = sorted(
+            (
+                (pub_date, pk, author_id)
+                for author_id in author_ids
+                for pk, pub_date in author_posts[author_id]
+            ),
+            reverse=True,
+        )[:settings.TIMELINE_SIZE]
+        entries.extend(
+            TimelineEntry(
+                user_id=user_id,
+                post_id=pk,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for pub_date, pk, author_id in rows
+        )
+        if len(entries) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(entries, BATCH_SIZE)
+            entries = []
+    TimelineEntry.objects.bulk_create(entries, BATCH_SIZE)
+
+
+def seed(
+    users,
+    groups,
+    posts,
+    comments,
+    follows,
+    images=8,
+    image_share=0.1,
+    exponent=1.2,
+    days=365,
+    prefix="seed",
+    random_seed=0,
+):
+    """
+    Синтетические данные масштаба продакшена, вставленные пачками.
+
+    Популярность авторов и число их постов распределены по Ципфу,
+    подписки тоже тянутся к популярным авторам: граф подписок
+    получается степенным. Счётчики и ленты подписок собираются
+    после вставки, сигналы при bulk_create не срабатывают.
+    Возвращает словарь с созданными пользователями и группами.
+    """
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    password = make_password(None)
+
+    User.objects.bulk_create(
+        (
+            User(
+                username=f"{prefix}_user_{index}",
+                first_name="Имя",
+                last_name=f"Фамилия {index}",
+                password=password,
+            )
+            for index in range(users)
+        ),
+        BATCH_SIZE,
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith=f"{prefix}_user_")
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    Group.objects.bulk_create(
+        (
+            Group(
+                title=f"Группа {index}",
+                slug=f"{prefix}-group-{index}",
+                description="Описание группы",
+            )
+            for index in range(groups)
+        ),
+        BATCH_SIZE,
+    )
+    group_ids = list(
+        Group.objects.filter(slug__startswith=f"{prefix}-group-")
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+    weights = _zipf_weights(len(user_ids), exponent)
+    image_names = _save_images(prefix, images, rng) if images else []
+    with explicit_dates(Post._meta.get_field("pub_date")):
+        Post.objects.bulk_create(
+            (
+                Post(
+                    author_id=author_id,
+                    group_id=(
+                        rng.choice(group_ids)
+                        if group_ids and rng.random() < 0.5
+                        else None
+                    ),
+                    text=f"Синтетический пост {index}",
+                    image=(
+                        rng.choice(image_names)
+                        if image_names and rng.random() < image_share
+                        else ""
+                    ),
+                    pub_date=now - timedelta(days=rng.uniform(0, days)),
+                )
+                for index, author_id in enumerate(
+                    rng.choices(user_ids, weights, k=posts)
+                )
+            ),
+            BATCH_SIZE,
+        )
+    # Сигналы при bulk_create не срабатывают: заглушки считаются здесь,
+    # по одной на картинку.
+    for name in image_names:
+        with image_storage.open(name) as file:
+            placeholder, color = post_images.preview(file)
+        Post.objects.filter(author_id__in=user_ids, image=name).update(
+            image_placeholder=placeholder, image_color=color
+        )
+    author_posts = defaultdict(list)
+    post_dates = {}
+    for pk, author_id, pub_date in Post.objects.filter(
+        author_id__in=user_ids
+    ).values_list("pk", "author_id", "pub_date"):
+        author_posts[author_id].append((pk, pub_date))
+        post_dates[pk] = pub_date
+    post_ids = list(post_dates)
+
+    post_weights = _zipf_weights(len(post_ids), exponent)
+    rng.shuffle(post_ids)
+    if post_ids:
+        with explicit_dates(Comment._meta.get_field("created")):
+            Comment.objects.bulk_create(
+                (
+                    Comment(
+                        post_id=post_id,
+                        author_id=rng.choice(user_ids),
+                        text=f"Синтетический комментарий {index}",
+                        created=min(
+                            now,
+                            post_dates[post_id]
+                            + timedelta(days=rng.uniform(0, 30)),
+                        ),
+                    )
+                    for index, post_id in enumerate(
+                        rng.choices(post_ids, post_weights, k=comments)
+                    )
+                ),
+                BATCH_SIZE,
+            )
+        # Синтетические комментарии - корни веток, путь из одного id.
+        Comment.objects.filter(
+            post__author_id__in=user_ids, path=""
+        ).update(
+            path=LPad(Cast("pk", CharField()), Comment.PATH_STEP, Value("0"))
+        )
+        counters.recount_comments(
+            Post.objects.filter(author_id__in=user_ids)
+        )
+
+    pairs = set()
+    for user_id in user_ids:
+        wanted = min(
+            int(rng.expovariate(1 / follows)) if follows else 0,
+            len(user_ids) - 1,
+        )
+        for author_id in rng.choices(user_ids, weights, k=wanted * 2):
+            if wanted <= 0:
+                break
+            if author_id != user_id and (user_id, author_id) not in pairs:
+                pairs.add((user_id, author_id))
+                wanted -= 1
+    Follow.objects.bulk_create(
+        (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs
+        ),
+        BATCH_SIZE,
+    )
+    _build_timelines(pairs, author_posts)
+    counters.repair(counters.find_drift())
+
+    return {
+        "users": user_ids,
+        "groups": group_ids,
+        "images": image_names,
+        "follows": len(pairs),
+    }
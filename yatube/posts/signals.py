@@ -0,0 +1,357 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from . import (
+    autocomplete,
+    counters,
+    feed_cache,
+    follows,
+    images,
+    recent,
+    response_cache,
+    tags,
+    threads,
+    thumbnails,
+    timeline,
+)
+from .models import Comment, Follow, Group, Post, PostCounter
+
+User = get_user_model()
+
+# Поля пользователя, от которых зависят подсказки поиска.
+AUTOCOMPLETE_USER_FIELDS = {
+    "username",
+    "first_name",
+    "last_name",
+    "is_active",
+}
+
+# Удаление в этом потоке: сколько объектов получили pre_delete,
+# но ещё не post_delete, какие посты и пользователи удаляются и пары
+# (пост, путь) комментариев, удалённых вместе с пользователями.
+# Django шлёт pre_delete для всего каскада до первого удаления,
+# так что нулевой счётчик означает конец каскада.
+_cascade = threading.local()
+
+
+def _cascade_state():
+    if not hasattr(_cascade, "pending"):
+        _reset_cascade()
+    return _cascade
+
+
+@receiver(request_started)
+def _reset_cascade(**kwargs):
+    """
+    Отметки прерванного ошибкой удаления не переходят в следующий
+    запрос этого потока.
+    """
+    _cascade.pending = 0
+    _cascade.posts = set()
+    _cascade.users = set()
+    _cascade.comments = []
+
+
+def bump_responses(*scopes):
+    """
+    Сброс кэша ответов сразу и ещё раз после фиксации транзакции:
+    страница, закэшированная между ними, содержит старые данные.
+    """
+
+    def bump():
+        for scope in scopes:
+            response_cache.bump(*scope)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def post_changed(post, old_group_id=None):
+    """
+    Сброс закэшированных ответов, на которых виден пост.
+    """
+    scopes = [
+        ("site", 0),
+        ("author", post.author_id),
+        ("post", post.pk),
+    ]
+    for group_id in {post.group_id, old_group_id} - {None}:
+        scopes.append(("group", group_id))
+    bump_responses(*scopes)
+
+
+def posts_changed(rows, group_ids=()):
+    """
+    Сброс закэшированных ответов для набора постов после массового
+    UPDATE или DELETE: rows - тройки (id, автор, группа), group_ids -
+    группы, откуда посты ушли или куда пришли.
+    """
+    scopes = {("site", 0), ("discussions", 0)}
+    for pk, author_id, group_id in rows:
+        scopes.update({("post", pk), ("comments", pk), ("author", author_id)})
+        if group_id is not None:
+            scopes.add(("group", group_id))
+    scopes.update(("group", group_id) for group_id in group_ids)
+    bump_responses(*scopes)
+    transaction.on_commit(feed_cache.bump)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    """
+    Обновление счётчиков постов при создании и смене группы.
+    """
+    if raw:
+        return
+    loaded_group_id = getattr(instance, "_loaded_group_id", None)
+    post_changed(instance, loaded_group_id)
+    if created:
+        counters.post_created(instance)
+        timeline.fan_out(instance)
+        transaction.on_commit(lambda: recent.push(instance))
+    elif loaded_group_id != instance.group_id:
+        counters.post_group_changed(loaded_group_id, instance.group_id)
+    instance._loaded_group_id = instance.group_id
+    if created or instance.text != getattr(instance, "_loaded_text", None):
+        tags.sync(instance, created)
+    instance._loaded_text = instance.text
+
+
+@receiver(pre_save, sender=Post)
+def post_image_preview(sender, instance, raw=False, **kwargs):
+    """
+    Заглушка и основной цвет новой картинки: готовые берутся у поста
+    с тем же файлом, иначе их считает задача превью вне запроса.
+    """
+    if raw:
+        return
+    if instance.image.name != getattr(instance, "_loaded_image", None):
+        images.fill_preview(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, raw=False, **kwargs):
+    """
+    Новая картинка поста: превью строятся заранее, вне запроса,
+    а прежняя картинка освобождается.
+    """
+    if raw:
+        return
+    name = instance.image.name
+    old_name = getattr(instance, "_loaded_image", None)
+    if name != old_name:
+        if name:
+            transaction.on_commit(lambda: thumbnails.enqueue(name))
+        if old_name:
+            transaction.on_commit(lambda: images.release(old_name))
+    instance._loaded_image = name
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    """
+    Обновление счётчиков постов при удалении.
+    """
+    counters.post_deleted(instance)
+    post_changed(instance)
+    bump_responses(("comments", instance.pk))
+    author_id = instance.author_id
+    transaction.on_commit(lambda: recent.forget(author_id))
+    image = instance.image.name
+    if image:
+        transaction.on_commit(lambda: images.release(image))
+
+
+def comment_changed(comment):
+    """
+    Сброс закэшированных ответов, на которых видно число
+    комментариев поста.
+    """
+    if Comment.post.is_cached(comment):
+        post = comment.post
+    else:
+        post = (
+            Post.objects.only("author_id", "group_id")
+            .filter(pk=comment.post_id)
+            .first()
+        )
+    if post is not None:
+        post_changed(post)
+    bump_responses(("comments", comment.post_id), ("discussions", 0))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    """
+    Новый комментарий получает место в ветке и увеличивает
+    счётчики поста и предков.
+    """
+    if raw or instance.post_id is None:
+        return
+    if created:
+        threads.comment_added(instance)
+        counters.comment_added(instance)
+    comment_changed(instance)
+
+
+def comments_removed(removed):
+    """
+    Поправки после удаления набора комментариев без их сигналов:
+    removed - пары (пост, путь). Счётчики ответов уцелевших предков
+    и комментариев постов пересчитываются по одному UPDATE,
+    кэш постов сбрасывается один раз.
+    """
+    threads.replies_removed([path for _, path in removed])
+    posts = Post.objects.filter(
+        pk__in={post_id for post_id, _ in removed} - {None}
+    )
+    counters.recount_comments(posts)
+    posts_changed(posts.values_list("pk", "author_id", "group_id"))
+
+
+def _cascaded(comment):
+    """
+    Комментарий удаляется каскадом: вместе с постом (тогда поправлять
+    нечего) или с пользователем (поправки - одним проходом в конце).
+    """
+    state = _cascade_state()
+    if comment.post_id in state.posts:
+        return True
+    if state.users:
+        state.comments.append((comment.post_id, comment.path))
+        return True
+    return False
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    """
+    Удалённый комментарий уменьшает счётчики поста и предков.
+    """
+    if _cascaded(instance):
+        return
+    threads.comment_deleted(instance)
+    if instance.post_id is not None:
+        counters.comment_deleted(instance)
+        comment_changed(instance)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_responses(("group", instance.pk))
+        transaction.on_commit(lambda: autocomplete.group_changed(instance))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        bump_responses(("author", instance.pk))
+        # Вход сохраняет только last_login: подсказки не меняются.
+        if update_fields is None or AUTOCOMPLETE_USER_FIELDS & set(
+            update_fields
+        ):
+            transaction.on_commit(
+                lambda: autocomplete.user_changed(instance)
+            )
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    group_id = instance.pk
+    transaction.on_commit(lambda: autocomplete.forget("group", group_id))
+    PostCounter.objects.filter(
+        scope=PostCounter.GROUP, object_id=instance.pk
+    ).delete()
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: autocomplete.forget("user", user_id))
+    PostCounter.objects.filter(
+        scope=PostCounter.AUTHOR, object_id=instance.pk
+    ).delete()
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    """
+    Новая подписка дополняет ленту пользователя и меняет граф
+    подписок в кэше.
+    """
+    if created and not raw:
+        follows.changed([(instance.user_id, instance.author_id)])
+        bump_responses(("author", instance.author_id))
+        timeline.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """
+    Отписка убирает посты автора из ленты пользователя и из графа
+    подписок в кэше; автор, переставший быть «тяжёлым», раскладывает
+    посты по лентам остальных подписчиков.
+    """
+    pair = (instance.user_id, instance.author_id)
+    follows.changed([pair])
+    bump_responses(("author", instance.author_id))
+    timeline.prune(instance)
+    timeline.unfollowed([pair])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def feed_changed(sender, raw=False, **kwargs):
+    """
+    Любое изменение постов, комментариев и подписок
+    делает закэшированные фрагменты лент устаревшими.
+    """
+    if not raw:
+        transaction.on_commit(feed_cache.bump)
+
+
+@receiver(pre_delete, sender=Post)
+@receiver(pre_delete, sender=User)
+@receiver(pre_delete, sender=Comment)
+def cascade_started(sender, instance, **kwargs):
+    """
+    Комментарии удаляемого поста уходят вместе с ним: их сигналы
+    не трогают ни его счётчики, ни кэш. Комментарии удаляемого
+    пользователя и ответы на них поправляют счётчики постов одним
+    проходом в конце каскада, а не по одному.
+    """
+    state = _cascade_state()
+    state.pending += 1
+    if sender is Post:
+        state.posts.add(instance.pk)
+    elif sender is User:
+        state.users.add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Comment)
+def cascade_step(sender, instance, **kwargs):
+    state = _cascade_state()
+    state.pending -= 1
+    if state.pending > 0:
+        return
+    removed = state.comments
+    _reset_cascade()
+    if removed:
+        comments_removed(removed)
@@ -0,0 +1,44 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+EXTENSIONS = {".jpeg": ".jpg"}
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, где имя файла - хэш его содержимого.
+
+    Одинаковые загрузки получают одно имя, поэтому делят один файл
+    на диске и один набор превью. Удаляет файл не хранилище,
+    а posts.images.release, когда на него не осталось ссылок.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        extension = EXTENSIONS.get(extension, extension)
+        directory = os.path.dirname(name)
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        hashed = self.hashed_name(name, content)
+        if self.exists(hashed):
+            # Свежая отметка времени защищает файл от posts.images.release.
+            os.utime(self.path(hashed))
+            return hashed
+        saved = super()._save(hashed, content)
+        if saved != hashed:
+            # Тот же файл параллельно сохранила другая загрузка.
+            self.delete(saved)
+        return hashed
+
+
+# Хранилище картинок постов; им же пользуются превью и сборка мусора.
+image_storage = ContentAddressedStorage()
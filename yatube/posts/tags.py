@@ -0,0 +1,102 @@
+import re
+
+from django.conf import settings
+
+from .models import Post, Tag, TaggedPost
+from .paginator import CursorPaginator, cursor_filter, page_params
+
+# Хэштег: # в начале слова и до 64 букв, цифр или _ после него;
+# слова длиннее тегами не считаются.
+HASHTAG = re.compile(r"(?<![\w#&])#(\w{1,64})(?!\w)")
+
+
+def normalize(name):
+    return name.lower()
+
+
+def extract(text):
+    """
+    Названия хэштегов из текста, без повторов.
+    """
+    return {normalize(name) for name in HASHTAG.findall(text or "")}
+
+
+def _tag_ids(names):
+    """
+    ID тегов по названиям; недостающие теги создаются одним запросом.
+    """
+    if not names:
+        return {}
+    Tag.objects.bulk_create(
+        (Tag(name=name) for name in names), ignore_conflicts=True
+    )
+    return dict(
+        Tag.objects.filter(name__in=names).values_list("name", "pk")
+    )
+
+
+def sync(post, created=False):
+    """
+    Запись поста в индексе хэштегов приводится к его тексту:
+    добавляются новые теги и удаляются исчезнувшие. Текст
+    других постов при этом не читается.
+    """
+    names = extract(post.text)
+    existing = {}
+    if not created:
+        existing = dict(
+            TaggedPost.objects.filter(post=post).values_list(
+                "tag__name", "tag_id"
+            )
+        )
+    removed = [
+        tag_id for name, tag_id in existing.items() if name not in names
+    ]
+    if removed:
+        TaggedPost.objects.filter(post=post, tag_id__in=removed).delete()
+    added = _tag_ids(names - set(existing))
+    TaggedPost.objects.bulk_create(
+        (
+            TaggedPost(tag_id=tag_id, post=post, pub_date=post.pub_date)
+            for tag_id in added.values()
+        ),
+        ignore_conflicts=True,
+    )
+
+
+class TagPaginator(CursorPaginator):
+    """
+    Лента хэштега из индекса TaggedPost.
+
+    Ключи (pub_date, id) страницы читаются диапазоном по индексу
+    (tag, pub_date, post), сами посты достаются одним in_bulk.
+    """
+
+    def __init__(self, tag, per_page, **kwargs):
+        super().__init__(
+            Post.objects.select_related("author", "group"), per_page, **kwargs
+        )
+        self.tag = tag
+
+    def _rows(self, key, newer, limit):
+        entries = TaggedPost.objects.filter(tag=self.tag)
+        if key is not None:
+            entries = entries.filter(
+                cursor_filter(key, newer, pk_field="post_id")
+            )
+        order = ("pub_date", "post_id") if newer else ("-pub_date", "-post_id")
+        keys = list(
+            entries.order_by(*order).values_list("pub_date", "post_id")[
+                :limit
+            ]
+        )
+        posts = self.object_list.in_bulk([pk for _, pk in keys])
+        return [posts[pk] for _, pk in keys if pk in posts]
+
+
+def get_tag_page(request, tag):
+    """
+    Страница ленты хэштега по параметрам after/before/page из запроса.
+    """
+    paginator = TagPaginator(tag, settings.PAGINATOR_NUM)
+    return paginator.get_page(**page_params(request))
@@ -0,0 +1,85 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from posts import thumbnails
+
+register = template.Library()
+
+MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+DEFAULT_SIZES = "(min-width: 1200px) 960px, 100vw"
+
+
+def _srcset(variants):
+    return ", ".join(f"{variant.url} {variant.x}w" for variant in variants)
+
+
+def _preview_style(placeholder, color):
+    """
+    Фон картинки, пока она грузится: заглушка, растянутая на весь
+    размер, поверх основного цвета.
+    """
+    style = f"background-color: {color};" if color else ""
+    if placeholder:
+        style += (
+            f" background-image: url({placeholder});"
+            " background-size: cover;"
+        )
+    return style.strip()
+
+
+@register.simple_tag
+def responsive_image(image, css_class="", sizes=DEFAULT_SIZES, alt=""):
+    """
+    Картинка поста в <picture>: варианты разной ширины в WebP и JPEG
+    через srcset/sizes, с размерами и отложенной загрузкой.
+
+    Пока картинка грузится, под ней видна встроенная заглушка
+    поста в основном цвете; пока превью не готовы, заглушка выводится
+    вместо картинки того же размера.
+    """
+    if not image:
+        return ""
+    post = getattr(image, "instance", None)
+    preview = getattr(post, "image_placeholder", "")
+    style = _preview_style(preview, getattr(post, "image_color", ""))
+    ready = thumbnails.variants(image)
+    fallback = ready.pop("JPEG")
+    if not fallback:
+        width = max(thumbnails.VARIANT_WIDTHS)
+        placeholder = thumbnails.Placeholder(
+            thumbnails.variant_geometry(width)
+        )
+        return format_html(
+            '<img class="{}" src="{}" width="{}" height="{}" style="{}" '
+            'alt="{}">',
+            css_class,
+            preview or placeholder.url,
+            placeholder.x,
+            placeholder.y,
+            style,
+            alt,
+        )
+    largest = fallback[-1]
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (MIME_TYPES[image_format], _srcset(variants), sizes)
+            for image_format, variants in ready.items()
+            if variants
+        ),
+    )
+    return format_html(
+        '<picture>{}<img class="{}" src="{}" srcset="{}" sizes="{}" '
+        'width="{}" height="{}" loading="lazy" decoding="async" '
+        'style="{}" alt="{}"></picture>',
+        sources,
+        css_class,
+        largest.url,
+        _srcset(fallback),
+        sizes,
+        largest.x,
+        largest.y,
+        style,
+        alt,
+    )
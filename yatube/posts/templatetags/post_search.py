@@ -0,0 +1,20 @@
+from django import template
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from posts.search import SNIPPET_END, SNIPPET_START
+
+register = template.Library()
+
+
+@register.filter
+def highlight(snippet):
+    """
+    Фрагмент текста из поиска: текст экранируется, совпадения
+    выделяются тегом <mark>.
+    """
+    return mark_safe(
+        escape(snippet)
+        .replace(SNIPPET_START, "<mark>")
+        .replace(SNIPPET_END, "</mark>")
+    )
@@ -0,0 +1,25 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
+
+from posts.tags import HASHTAG, normalize
+
+register = template.Library()
+
+
+def _link(match):
+    return format_html(
+        '<a href="{}">#{}</a>',
+        reverse("posts:tag_posts", args=(normalize(match.group(1)),)),
+        match.group(1),
+    )
+
+
+@register.filter
+def hashtags(text):
+    """
+    Текст поста с хэштегами-ссылками на ленты тегов; остальной
+    текст экранируется.
+    """
+    return mark_safe(HASHTAG.sub(_link, escape(text)))
@@ -0,0 +1,142 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import autocomplete
+from posts.models import Group
+
+User = get_user_model()
+
+
+class AutocompleteTests(TestCase):
+    """
+    Тест подсказок для поиска пользователей и групп.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_user(
+            username="lev", first_name="Лев", last_name="Толстой"
+        )
+        User.objects.create_user(username="leonid", last_name="Андреев")
+        cls.group = Group.objects.create(
+            title="Ёлки", slug="elki", description="Описание"
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        autocomplete.rebuild()
+
+    def labels(self, query):
+        return [item["label"] for item in autocomplete.suggest(query)]
+
+    def test_prefix_matches(self):
+        """
+        Подсказки ищутся по началу логина, имени, фамилии, названия
+        и slug группы, без учёта регистра и ё.
+        """
+        self.assertEqual(self.labels("LE"), ["Андреев", "Лев Толстой"])
+        self.assertEqual(self.labels("толст"), ["Лев Толстой"])
+        self.assertEqual(self.labels("ел"), ["Ёлки"])
+        self.assertEqual(self.labels("elk"), ["Ёлки"])
+        self.assertEqual(self.labels(""), [])
+        self.assertEqual(
+            autocomplete.suggest("лев")[0]["url"],
+            reverse("posts:profile", args=("lev",)),
+        )
+
+    def test_suggest_without_queries(self):
+        """
+        Собранный индекс отвечает без запросов к базе.
+        """
+        self.labels("л")
+        with self.assertNumQueries(0):
+            start = time.perf_counter()
+            for _ in range(100):
+                self.labels("ле")
+            elapsed = (time.perf_counter() - start) / 100
+        self.assertLess(elapsed, 0.001)
+
+    def test_local_cache_index_expires(self):
+        """
+        Без общего кэша журнал других процессов не виден, и индекс
+        собирается заново по сроку.
+        """
+        # Изменение из другого процесса без записи в журнал.
+        User.objects.filter(pk=self.user.pk).update(last_name="Гоголь")
+        self.assertEqual(self.labels("гог"), [])
+        with override_settings(SHARED_CACHE=False, LOCAL_CACHE_TIMEOUT=0):
+            self.assertEqual(self.labels("гог"), ["Лев Гоголь"])
+        with override_settings(SHARED_CACHE=True, LOCAL_CACHE_TIMEOUT=0):
+            with self.assertNumQueries(0):
+                self.labels("гог")
+
+    def test_incremental_changes(self):
+        """
+        Изменения применяются без пересборки, в том числе теми
+        процессами, что узнают о них из журнала в кэше.
+        """
+        # on_commit внутри TestCase не срабатывает: обработчики
+        # вызываются напрямую.
+        self.group.title = "Сосны"
+        autocomplete.group_changed(self.group)
+        autocomplete.forget("user", self.user.pk)
+        self.assertEqual(self.labels("со"), ["Сосны"])
+        self.assertEqual(self.labels("лев"), [])
+
+        # Изменение из другого процесса: только запись в журнале.
+        number = cache.incr(autocomplete.VERSION_KEY)
+        cache.set(
+            autocomplete._change_key(number),
+            ("group", self.group.pk, None, None, ()),
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels("со"), [])
+
+    def test_rebuild_sorts_once(self):
+        """
+        Сборка даёт тот же отсортированный индекс, что и поштучные
+        изменения, но без вставок по одному терму.
+        """
+        for number in range(50):
+            User.objects.create_user(username=f"reader{number:02}")
+        with mock.patch.object(autocomplete, "insort") as insort:
+            autocomplete.rebuild()
+        insort.assert_not_called()
+        self.assertEqual(autocomplete._index, sorted(autocomplete._index))
+        self.assertEqual(len(self.labels("reader")), 10)
+
+    def test_inactive_users(self):
+        """
+        Отключённые пользователи не попадают в индекс и пропадают
+        из него при отключении.
+        """
+        User.objects.create_user(username="leopold", is_active=False)
+        autocomplete.rebuild()
+        self.assertEqual(self.labels("leo"), ["Андреев"])
+
+        self.user.is_active = False
+        autocomplete.user_changed(self.user)
+        self.assertEqual(self.labels("лев"), [])
+
+    def test_endpoint(self):
+        """
+        Эндпоинт отдаёт подсказки в JSON.
+        """
+        response = self.client.get(reverse("posts:suggest"), {"q": "Ёл"})
+        self.assertEqual(
+            response.json(),
+            {
+                "results": [
+                    {
+                        "type": "group",
+                        "label": "Ёлки",
+                        "url": reverse("posts:group_posts", args=("elki",)),
+                    }
+                ]
+            },
+        )
@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PAGE_SIZE=3)
+class CommentPagesTests(TestCase):
+    """
+    Тест порций комментариев на странице поста.
+    """
+
+    COMMENTS_NUM = 8
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create_user(username="comments_author")
+        cls.post = Post.objects.create(author=cls.author, text="Пост")
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f"reader_{number}"),
+                text=f"Комментарий {number}",
+            )
+            for number in range(cls.COMMENTS_NUM)
+        ]
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.guest_client = Client()
+        self.more_url = reverse("posts:post_comments", args=(self.post.pk,))
+
+    def read_comments(self):
+        """
+        Все комментарии: первая порция со страницы поста,
+        остальные - через фрагмент «Показать ещё».
+        """
+        response = self.guest_client.get(
+            reverse("posts:post_detail", args=(self.post.pk,))
+        )
+        page = response.context["comments"]
+        comments = list(page)
+        while page.has_next():
+            response = self.guest_client.get(
+                self.more_url, {"after": page.next_cursor}
+            )
+            page = response.context["comments"]
+            comments.extend(page)
+        return comments
+
+    def test_pages_cover_all_comments(self):
+        """
+        Порции идут от новых комментариев к старым без пропусков.
+        """
+        self.assertEqual(self.read_comments(), self.comments[::-1])
+
+    def test_chunk_loads_authors(self):
+        """
+        Авторы комментариев читаются тем же запросом, что и порция.
+        """
+        first = self.guest_client.get(
+            reverse("posts:post_detail", args=(self.post.pk,))
+        ).context["comments"]
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                self.more_url, {"after": first.next_cursor}
+            )
+        self.assertContains(response, "reader_4")
+        comment_queries = [
+            query for query in queries if "posts_comment" in query["sql"]
+        ]
+        self.assertEqual(len(comment_queries), 1)
+        self.assertIn("auth_user", comment_queries[0]["sql"])
+
+    def test_new_comment_refreshes_fragment(self):
+        """
+        Новый комментарий сбрасывает закэшированный фрагмент.
+        """
+        self.guest_client.get(self.more_url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text="Свежий"
+        )
+        self.assertContains(self.guest_client.get(self.more_url), "Свежий")
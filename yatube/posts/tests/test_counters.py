@@ -0,0 +1,251 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import counters, feed_cache
+from posts.models import Comment, Group, Post, PostCounter
+
+User = get_user_model()
+
+
+class PostCounterTests(TestCase):
+    """
+    Тест денормализованных счётчиков постов.
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="counter_author")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="counter-slug",
+            description="Тестовое описание",
+        )
+        cls.other_group = Group.objects.create(
+            title="Другая группа",
+            slug="counter-other-slug",
+            description="Тестовое описание",
+        )
+
+    def assertCounts(self, site, author, group, other_group=0):
+        self.assertEqual(counters.site_posts_count(), site)
+        self.assertEqual(counters.author_posts_count(self.user), author)
+        self.assertEqual(counters.group_posts_count(self.group), group)
+        self.assertEqual(
+            counters.group_posts_count(self.other_group), other_group
+        )
+
+    def test_counters_follow_create_edit_delete(self):
+        """
+        Счётчики меняются при создании, смене группы и удалении поста.
+        """
+        post = Post.objects.create(
+            author=self.user, text="Пост", group=self.group
+        )
+        Post.objects.create(author=self.user, text="Пост без группы")
+        self.assertCounts(site=2, author=2, group=1)
+
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.other_group
+        post.save()
+        self.assertCounts(site=2, author=2, group=0, other_group=1)
+
+        post.delete()
+        self.assertCounts(site=1, author=1, group=0)
+
+    def test_counter_read_is_single_query(self):
+        """
+        Профиль читает количество постов из счётчика.
+        """
+        Post.objects.create(author=self.user, text="Пост")
+        counters.author_posts_count(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(counters.author_posts_count(self.user), 1)
+        response = self.client.get(
+            reverse("posts:profile", args=(self.user.username,))
+        )
+        self.assertEqual(response.context["number_of_posts"], 1)
+
+    def test_recount_command_repairs_drift(self):
+        """
+        Команда recount_posts находит и исправляет расхождения.
+        """
+        Post.objects.create(author=self.user, text="Пост", group=self.group)
+        PostCounter.objects.filter(scope=PostCounter.AUTHOR).update(value=7)
+        Post.objects.bulk_create([Post(author=self.user, text="Без сигнала")])
+
+        out = StringIO()
+        call_command("recount_posts", "--check", stdout=out)
+        self.assertIn(f"author:{self.user.pk}: сохранено 7", out.getvalue())
+        self.assertEqual(counters.author_posts_count(self.user), 7)
+
+        call_command("recount_posts", stdout=StringIO())
+        self.assertEqual(counters.find_drift(), [])
+        self.assertCounts(site=2, author=2, group=1)
+
+
+class CommentCounterTests(TestCase):
+    """
+    Тест счётчиков комментариев и ленты обсуждений.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create_user(username="comment_author")
+        cls.reader = User.objects.create_user(username="comment_reader")
+        cls.quiet_post = Post.objects.create(author=cls.author, text="Тихо")
+        cls.first_post = Post.objects.create(author=cls.author, text="Один")
+        cls.second_post = Post.objects.create(author=cls.author, text="Два")
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def comment(self, post, text="Комментарий"):
+        self.client.post(
+            reverse("posts:add_comment", args=(post.pk,)), {"text": text}
+        )
+        return Comment.objects.filter(post=post).latest("created")
+
+    def reply(self, parent):
+        self.client.post(
+            reverse("posts:add_comment", args=(parent.post_id,)),
+            {"text": "Ответ", "parent": parent.pk},
+        )
+
+    def test_counts_follow_add_and_delete(self):
+        """
+        Счётчик и дата последнего комментария меняются при добавлении
+        и удалении комментариев.
+        """
+        first = self.comment(self.first_post)
+        last = self.comment(self.first_post)
+        post = Post.objects.get(pk=self.first_post.pk)
+        self.assertEqual(post.comment_count, 2)
+        self.assertEqual(post.last_commented_at, last.created)
+
+        Comment.objects.filter(pk=last.pk).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(post.last_commented_at, first.created)
+
+        Comment.objects.filter(pk=first.pk).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertIsNone(post.last_commented_at)
+
+    def test_post_delete_skips_comment_work(self):
+        """
+        Удаление поста не пересчитывает его счётчики на каждый
+        комментарий: число запросов не зависит от числа комментариев.
+        """
+        costs = []
+        for number in (1, 50):
+            post = Post.objects.create(author=self.author, text="Спор")
+            Comment.objects.bulk_create(
+                Comment(post=post, author=self.reader, text=f"К{i}")
+                for i in range(number)
+            )
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+            costs.append(len(queries))
+        self.assertEqual(costs[0], costs[1])
+
+    def test_user_delete_fixes_counts_once(self):
+        """
+        Комментарии удалённого пользователя и ответы на них
+        поправляют счётчики постов и предков одним проходом.
+        """
+        self.comment(self.first_post, "Останется")
+        kept = self.comment(self.second_post, "Корень")
+        costs = []
+        for number in (1, 30):
+            user = User.objects.create_user(username=f"leaving_{number}")
+            self.client.force_login(user)
+            for _ in range(number):
+                own = self.comment(self.first_post)
+                self.reply(kept)
+            self.client.force_login(self.reader)
+            self.reply(own)
+            with CaptureQueriesContext(connection) as queries:
+                user.delete()
+            costs.append(len(queries))
+        self.assertEqual(costs[0], costs[1])
+        self.assertEqual(counters.find_comment_drift(), [])
+        kept.refresh_from_db()
+        self.assertEqual(kept.reply_count, 0)
+        self.assertEqual(
+            Post.objects.get(pk=self.first_post.pk).comment_count, 1
+        )
+
+    def test_feed_shows_counts(self):
+        """
+        Лента показывает число комментариев из поля поста,
+        закэшированная страница сбрасывается новым комментарием.
+        """
+        self.client.logout()
+        self.client.get(reverse("posts:index"))
+        Comment.objects.create(
+            post=self.second_post, author=self.reader, text="Текст"
+        )
+        # Фрагменты лент сбрасываются после фиксации транзакции.
+        feed_cache.bump()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, "Комментариев: 1,")
+
+    def test_discussions_feed(self):
+        """
+        В обсуждениях только посты с комментариями, сверху
+        недавно обсуждавшиеся.
+        """
+        self.comment(self.second_post)
+        self.comment(self.first_post)
+        response = self.client.get(reverse("posts:discussions"))
+        self.assertEqual(
+            list(response.context["page_obj"]),
+            [self.first_post, self.second_post],
+        )
+
+        self.comment(self.second_post)
+        response = self.client.get(reverse("posts:discussions"))
+        self.assertEqual(
+            list(response.context["page_obj"]),
+            [self.second_post, self.first_post],
+        )
+
+    def test_recount_command_repairs_drift(self):
+        """
+        Команда recount_comments находит и исправляет расхождения.
+        """
+        comment = self.comment(self.first_post)
+        Post.objects.filter(pk=self.second_post.pk).update(comment_count=3)
+        Comment.objects.bulk_create(
+            [Comment(post=self.quiet_post, author=self.reader, text="Тайно")]
+        )
+
+        out = StringIO()
+        call_command("recount_comments", "--check", stdout=out)
+        self.assertIn(
+            f"Пост {self.second_post.pk}: сохранено 3, в базе 0",
+            out.getvalue(),
+        )
+        self.assertIn(
+            f"Пост {self.quiet_post.pk}: сохранено 0, в базе 1",
+            out.getvalue(),
+        )
+
+        call_command("recount_comments", stdout=StringIO())
+        self.assertEqual(counters.find_comment_drift(), [])
+        post = Post.objects.get(pk=self.first_post.pk)
+        self.assertEqual(
+            (post.comment_count, post.last_commented_at),
+            (1, comment.created),
+        )
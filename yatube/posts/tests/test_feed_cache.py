@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import feed_cache
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+class FeedCacheTests(TestCase):
+    """
+    Тест ключей кэша фрагментов лент.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username="cache_author")
+        self.posts = [
+            Post.objects.create(author=self.author, text=f"Пост номер {i}")
+            for i in range(settings.PAGINATOR_NUM + 1)
+        ]
+
+    def test_pages_are_cached_separately(self):
+        """
+        Вторая страница не отдаёт закэшированную первую.
+        """
+        first = self.client.get(reverse("posts:index"))
+        second = self.client.get(
+            reverse("posts:index"),
+            {"after": first.context["page_obj"].next_cursor},
+        )
+        self.assertIn(self.posts[0].text, second.content.decode())
+        self.assertNotIn(self.posts[-1].text, second.content.decode())
+
+    def test_numbered_pages_are_cached_separately(self):
+        """
+        Старая ссылка ?page=2 не отдаёт закэшированную первую страницу.
+        """
+        reader = User.objects.create_user(username="cache_page_reader")
+        Follow.objects.create(user=reader, author=self.author)
+        client = Client()
+        client.force_login(reader)
+        for url in (reverse("posts:index"), reverse("posts:follow_index")):
+            with self.subTest(url=url):
+                client.get(url)
+                second = client.get(url, {"page": 2}).content.decode()
+                self.assertIn(self.posts[0].text, second)
+                self.assertNotIn(self.posts[-1].text, second)
+
+    def test_follow_feed_is_cached_per_user(self):
+        """
+        Лента подписок одного пользователя не видна другому.
+        """
+        reader = User.objects.create_user(username="cache_reader")
+        Follow.objects.create(user=reader, author=self.author)
+        stranger = User.objects.create_user(username="cache_stranger")
+        for user, visible in ((reader, True), (stranger, False)):
+            with self.subTest(user=user.username):
+                client = Client()
+                client.force_login(user)
+                response = client.get(reverse("posts:follow_index"))
+                self.assertEqual(
+                    self.posts[-1].text in response.content.decode(),
+                    visible,
+                )
+
+    def test_bump_invalidates_fragments(self):
+        """
+        Новое поколение сбрасывает закэшированные фрагменты.
+        """
+        client = Client()
+        client.force_login(self.author)
+        client.get(reverse("posts:index"))
+        post = Post.objects.create(author=self.author, text="Свежий пост")
+        response = client.get(reverse("posts:index"))
+        self.assertNotIn(post.text, response.content.decode())
+
+        generation = feed_cache.generation()
+        feed_cache.bump()
+        self.assertEqual(feed_cache.generation(), generation + 1)
+        response = client.get(reverse("posts:index"))
+        self.assertIn(post.text, response.content.decode())
@@ -0,0 +1,124 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import follows, timeline
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+    """
+    Тест графа подписок в кэше.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.reader = User.objects.create_user(username="graph_reader")
+        cls.author = User.objects.create_user(username="graph_author")
+        cls.other = User.objects.create_user(username="graph_other")
+        Follow.objects.create(user=cls.reader, author=cls.other)
+        Follow.objects.create(user=cls.author, author=cls.other)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_warm_reads_without_queries(self):
+        """
+        Подписки и счётчики из прогретого кэша читаются без SQL.
+        """
+        with self.assertNumQueries(2):
+            self.assertTrue(follows.is_following(self.reader, self.other))
+            follows.follower_counts([self.author.pk, self.other.pk])
+        with self.assertNumQueries(0):
+            self.assertTrue(follows.is_following(self.reader, self.other))
+            self.assertFalse(follows.is_following(self.reader, self.author))
+            self.assertFalse(follows.is_following(self.other, self.other))
+            self.assertFalse(
+                follows.is_following(AnonymousUser(), self.other)
+            )
+            self.assertEqual(follows.following_count(self.reader.pk), 1)
+            self.assertEqual(follows.follower_count(self.other.pk), 2)
+            self.assertEqual(
+                follows.follower_counts([self.author.pk, self.other.pk]),
+                {self.author.pk: 0, self.other.pk: 2},
+            )
+
+    def test_follow_and_unfollow_invalidate(self):
+        """
+        Подписка и отписка через страницы сразу видны в графе
+        и в счётчиках профиля.
+        """
+        profile_url = reverse("posts:profile", args=(self.author.username,))
+        response = self.client.get(profile_url)
+        self.assertFalse(response.context["following"])
+        self.assertEqual(response.context["followers_count"], 0)
+
+        self.client.get(
+            reverse("posts:profile_follow", args=(self.author.username,))
+        )
+        self.assertTrue(follows.is_following(self.reader, self.author))
+        response = self.client.get(profile_url)
+        self.assertTrue(response.context["following"])
+        self.assertEqual(response.context["followers_count"], 1)
+        self.assertEqual(response.context["following_count"], 1)
+
+        self.client.get(
+            reverse("posts:profile_unfollow", args=(self.author.username,))
+        )
+        self.assertFalse(
+            Follow.objects.filter(user=self.reader, author=self.author)
+        )
+        self.assertFalse(follows.is_following(self.reader, self.author))
+        self.assertEqual(follows.follower_count(self.author.pk), 0)
+
+    def test_stale_cache_does_not_block_writes(self):
+        """
+        Подписка и отписка пишутся в базу, даже если кэш думает иначе,
+        а кэш после них совпадает с базой.
+        """
+        cache.set(
+            follows._following_key(self.reader.pk),
+            frozenset({self.author.pk}),
+        )
+        self.client.get(
+            reverse("posts:profile_follow", args=(self.author.username,))
+        )
+        pair = Follow.objects.filter(user=self.reader, author=self.author)
+        self.assertTrue(pair.exists())
+
+        cache.set(follows._following_key(self.reader.pk), frozenset())
+        self.client.get(
+            reverse("posts:profile_unfollow", args=(self.author.username,))
+        )
+        self.assertFalse(pair.exists())
+        self.assertEqual(
+            follows.following_ids(self.reader.pk), {self.other.pk}
+        )
+
+    def test_anonymous_profile_shows_new_count(self):
+        """
+        Закэшированный для анонимов профиль сбрасывается подпиской.
+        """
+        self.client.logout()
+        profile_url = reverse("posts:profile", args=(self.author.username,))
+        self.assertContains(self.client.get(profile_url), "Подписчиков: 0")
+        Follow.objects.create(user=self.other, author=self.author)
+        self.assertContains(self.client.get(profile_url), "Подписчиков: 1")
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_heavy_authors_from_graph(self):
+        """
+        «Тяжёлые» авторы ленты определяются по счётчикам из кэша.
+        """
+        follows.follower_counts([self.other.pk])
+        follows.following_ids(self.reader.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                timeline.heavy_author_ids(self.reader), [self.other.pk]
+            )
+            self.assertTrue(timeline.is_heavy(self.other.pk))
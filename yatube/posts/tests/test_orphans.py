@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from posts import orphans
+from posts.models import Post
+from posts.storage import image_storage
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def jpeg(color):
+    raw = BytesIO()
+    Image.new("RGB", (300, 200), color).save(raw, "JPEG")
+    return raw.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    IMAGE_RELEASE_GRACE=0,
+    MEDIA_GC_STATE=os.path.join(TEMP_MEDIA_ROOT, ".gc_state.json"),
+)
+class CollectMediaTests(TestCase):
+    """
+    Тест сборки мусора в медиафайлах.
+    """
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        cache.clear()
+        author = User.objects.create_user(username="gc_author")
+        self.post = Post(author=author, text="Пост с картинкой")
+        self.post.image.save("kept.jpg", ContentFile(jpeg((10, 10, 10))))
+        self.kept_thumbnail = get_thumbnail(self.post.image, "100x50")
+
+        self.orphan = image_storage.save(
+            "posts/orphan.jpg", ContentFile(jpeg((200, 10, 10)))
+        )
+        self.orphan_thumbnail = get_thumbnail(
+            ImageFile(self.orphan, image_storage), "100x50"
+        )
+        self.stray = default.storage.save(
+            "cache/zz/stray.jpg", ContentFile(b"x" * 100)
+        )
+
+    def tearDown(self) -> None:
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def call(self, **options):
+        stdout = StringIO()
+        call_command("collect_media", stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_walk_is_sorted_and_resumes(self):
+        """
+        Обход идёт по возрастанию путей и продолжается после after.
+        """
+        names = [name for name, _ in orphans.iter_files("images")]
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(
+            [name for name, _ in orphans.iter_files("images", names[0])],
+            names[1:],
+        )
+
+    def test_walk_reads_directory_in_pages(self):
+        """
+        Каталог больше страницы читается по частям в том же порядке.
+        """
+        for number in range(5):
+            image_storage.save(f"posts/page_{number}.jpg", ContentFile(b"x"))
+        names = [name for name, _ in orphans.iter_files("images")]
+        with mock.patch.object(orphans, "PAGE_SIZE", 2):
+            self.assertEqual(
+                [name for name, _ in orphans.iter_files("images")], names
+            )
+            self.assertEqual(
+                [name for name, _ in orphans.iter_files("images", names[2])],
+                names[3:],
+            )
+
+    def test_records_of_missing_files_deleted(self):
+        """
+        Записи sorl о пропавшей картинке удаляются вместе с записями
+        её превью; записи картинки поста остаются.
+        """
+        lost = ImageFile(self.orphan, image_storage)
+        os.remove(os.path.join(TEMP_MEDIA_ROOT, self.orphan))
+        self.call()
+        keys = set(KVStore.objects.values_list("key", flat=True))
+        self.assertNotIn(add_prefix(lost.key), keys)
+        self.assertNotIn(add_prefix(lost.key, "thumbnails"), keys)
+        self.assertNotIn(add_prefix(self.orphan_thumbnail.key), keys)
+        self.assertIn(add_prefix(self.kept_thumbnail.key), keys)
+        self.assertIn(
+            add_prefix(ImageFile(self.post.image.name, image_storage).key),
+            keys,
+        )
+
+    def test_orphans_deleted(self):
+        """
+        Удаляются картинка без поста с её превью и превью без записи
+        sorl; картинка поста остаётся. Освобождённые байты в отчёте.
+        """
+        expected = (
+            image_storage.size(self.orphan)
+            + default.storage.size(self.orphan_thumbnail.name)
+            + 100
+        )
+        output = self.call(batch_size=1)
+        self.assertIn(f"({expected} байт)", output)
+        self.assertTrue(image_storage.exists(self.post.image.name))
+        self.assertTrue(self.kept_thumbnail.exists())
+        self.assertFalse(image_storage.exists(self.orphan))
+        self.assertFalse(self.orphan_thumbnail.exists())
+        self.assertFalse(default.storage.exists(self.stray))
+        self.assertFalse(os.path.exists(settings.MEDIA_GC_STATE))
+
+    def test_dry_run_keeps_files(self):
+        """
+        Пробный проход ничего не удаляет.
+        """
+        output = self.call(dry_run=True)
+        self.assertIn("сирот: 2", output)
+        self.assertTrue(image_storage.exists(self.orphan))
+        self.assertTrue(default.storage.exists(self.stray))
+
+    def test_resume_after_limit(self):
+        """
+        Прерванный по --limit проход продолжается со своего места.
+        """
+        output = self.call(batch_size=1, limit=1)
+        self.assertIn("Проход не закончен", output)
+        self.assertTrue(os.path.exists(settings.MEDIA_GC_STATE))
+        first = int(output.split("Просмотрено файлов: ")[1].split(",")[0])
+        self.assertEqual(first, 1)
+
+        output = self.call(batch_size=100)
+        self.assertIn("Продолжение с images", output)
+        self.assertFalse(image_storage.exists(self.orphan))
+        self.assertFalse(default.storage.exists(self.stray))
+        self.assertFalse(os.path.exists(settings.MEDIA_GC_STATE))
@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post
+from posts.paginator import CursorPaginator, decode_cursor, encode_cursor
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+    """
+    Тест паджинатора по курсору.
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="paginator_author")
+        cls.reader = User.objects.create_user(username="paginator_reader")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="paginator-slug",
+            description="Тестовое описание",
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f"Пост {i}", group=cls.group)
+            for i in range(settings.PAGINATOR_NUM + 3)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.urls = {
+            "index": reverse("posts:index"),
+            "group": reverse("posts:group_posts", args=(cls.group.slug,)),
+            "profile": reverse("posts:profile", args=(cls.author.username,)),
+            "follow": reverse("posts:follow_index"),
+        }
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_cursor_roundtrip(self):
+        """
+        Курсор однозначно кодирует pub_date и id поста.
+        """
+        post = Post.objects.first()
+        self.assertEqual(
+            decode_cursor(encode_cursor(post)), (post.pub_date, post.pk)
+        )
+        self.assertIsNone(decode_cursor("not-a-cursor"))
+
+    def test_pages_follow_each_other(self):
+        """
+        Страница «Старее» продолжает первую, «Новее» возвращает к ней.
+        """
+        for name, url in self.urls.items():
+            with self.subTest(feed=name):
+                first = self.reader_client.get(url).context["page_obj"]
+                self.assertEqual(len(first), settings.PAGINATOR_NUM)
+                self.assertTrue(first.has_next())
+                self.assertFalse(first.has_previous())
+
+                second = self.reader_client.get(
+                    url, {"after": first.next_cursor}
+                ).context["page_obj"]
+                self.assertEqual(len(second), 3)
+                self.assertFalse(second.has_next())
+                self.assertTrue(second.has_previous())
+                self.assertFalse(
+                    set(first.object_list) & set(second.object_list)
+                )
+
+                back = self.reader_client.get(
+                    url, {"before": second.previous_cursor}
+                ).context["page_obj"]
+                self.assertEqual(back.object_list, first.object_list)
+                self.assertFalse(back.has_previous())
+
+    def test_page_costs_single_query(self):
+        """
+        Страница читается одним запросом без COUNT и OFFSET.
+        """
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page()
+        with self.assertNumQueries(1):
+            page = paginator.get_page(after=first.next_cursor)
+        self.assertEqual(len(page), 3)
+
+    def test_broken_cursor_opens_first_page(self):
+        """
+        Битый курсор открывает первую страницу.
+        """
+        response = self.client.get(self.urls["index"], {"after": "%%%"})
+        self.assertEqual(
+            len(response.context["page_obj"]), settings.PAGINATOR_NUM
+        )
+
+    def test_old_page_links(self):
+        """
+        Старая ссылка ?page=N открывает ту же страницу, что и курсор;
+        номер за концом ленты или не число - 404.
+        """
+        for name, url in self.urls.items():
+            with self.subTest(feed=name):
+                first = self.reader_client.get(url).context["page_obj"]
+                second = self.reader_client.get(url, {"page": 2})
+                self.assertEqual(second.status_code, 200)
+                page_obj = second.context["page_obj"]
+                self.assertEqual(len(page_obj), 3)
+                self.assertTrue(page_obj.has_previous())
+                self.assertFalse(
+                    set(first.object_list) & set(page_obj.object_list)
+                )
+                back = self.reader_client.get(
+                    url, {"before": page_obj.previous_cursor}
+                ).context["page_obj"]
+                self.assertEqual(back.object_list, first.object_list)
+                for page in (3, 0, "last"):
+                    response = self.reader_client.get(url, {"page": page})
+                    self.assertEqual(response.status_code, 404)
+
+    def test_fragment_endpoint(self):
+        """
+        Фрагмент для бесконечной прокрутки отдаёт только список постов.
+        """
+        response = self.client.get(reverse("posts:index_more"))
+        self.assertTemplateUsed(response, "includes/feed_page.html")
+        self.assertTemplateNotUsed(response, "base.html")
+        self.assertEqual(
+            len(response.context["page_obj"]), settings.PAGINATOR_NUM
+        )
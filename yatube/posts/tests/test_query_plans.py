@@ -0,0 +1,150 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Индексы порядка лент: чтение по ним допустимо, только если запрос
+# не фильтрует посты ничем, кроме колонок самого индекса. Иначе
+# диапазон «старше курсора» по такому индексу - просмотр почти всей
+# таблицы ради немногих подходящих строк.
+ORDERING_INDEXES = {
+    "post_pub_date_idx": {"pub_date", "id"},
+    "post_last_commented_idx": {"last_commented_at", "id"},
+}
+USED_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\S+)")
+
+
+class QueryPlanTests(TestCase):
+    """
+    Регрессионный тест планов запросов лент.
+
+    Каждый SELECT по таблицам постов должен идти по индексу:
+    без полного просмотра таблицы и без сортировки во временном
+    B-дереве. Просмотр целого индекса допустим только для индекса
+    порядка ленты и запроса без других условий на посты.
+    """
+
+    POSTS_NUM = 15
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create_user(username="plan_author")
+        cls.other = User.objects.create_user(username="plan_other")
+        cls.reader = User.objects.create_user(username="plan_reader")
+        cls.group = Group.objects.create(
+            title="Группа", slug="plan-group", description="Описание"
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.other)
+        for number in range(cls.POSTS_NUM):
+            cls.post = Post.objects.create(
+                author=cls.author if number % 2 else cls.other,
+                text=f"Пост {number}",
+                group=cls.group,
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text="Комментарий"
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def assertIndexedPlans(self, queries):
+        for query in queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT") or "posts_" not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+            # Подзапросы читаются из готовых строк, а не из таблицы.
+            subqueries = {
+                step.replace("CO-ROUTINE", "SCAN", 1)
+                for step in plan
+                if step.startswith("CO-ROUTINE")
+            }
+            for step in plan:
+                with self.subTest(sql=sql, step=step):
+                    self.assertNotIn("TEMP B-TREE", step)
+                    if step.startswith("SCAN") and step not in subqueries:
+                        self.assertIn("INDEX", step)
+                    self.assertOrderingIndexUnfiltered(sql, step)
+
+    def assertOrderingIndexUnfiltered(self, sql, step):
+        match = USED_INDEX.search(step)
+        columns = ORDERING_INDEXES.get(match and match.group(1))
+        if columns is None:
+            return
+        where = sql.partition(" WHERE ")[2].partition(" ORDER BY ")[0]
+        filtered = set(re.findall(r'"posts_post"\."(\w+)"', where))
+        self.assertLessEqual(filtered, columns, "условие вне индекса")
+
+    def read_pages(self, url):
+        """
+        Все страницы ленты, от первой до последней.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            page = self.reader_client.get(url).context["page_obj"]
+            while page.has_next():
+                page = self.reader_client.get(
+                    url, {"after": page.next_cursor}
+                ).context["page_obj"]
+            if page.has_previous():
+                self.reader_client.get(url, {"before": page.previous_cursor})
+        return queries
+
+    def test_feeds_use_indexes(self):
+        """
+        Ленты главной, группы, профиля и подписок читаются по индексам.
+        """
+        urls = (
+            reverse("posts:index"),
+            reverse("posts:group_posts", args=(self.group.slug,)),
+            reverse("posts:profile", args=(self.author.username,)),
+            reverse("posts:follow_index"),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIndexedPlans(self.read_pages(url))
+
+    @override_settings(TIMELINE_SIZE=3)
+    def test_timeline_fallback_uses_indexes(self):
+        """
+        Посты старше конца материализованной ленты читаются по индексу
+        (pub_date, id).
+        """
+        Follow.objects.filter(user=self.reader).delete()
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        self.assertIndexedPlans(
+            self.read_pages(reverse("posts:follow_index"))
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_heavy_authors_use_indexes(self):
+        """
+        Посты «тяжёлых» авторов подмешиваются по индексу.
+        """
+        self.assertIndexedPlans(
+            self.read_pages(reverse("posts:follow_index"))
+        )
+
+    def test_post_detail_uses_indexes(self):
+        """
+        Страница поста с комментариями читается по индексам.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.reader_client.get(
+                reverse("posts:post_detail", args=(self.post.pk,))
+            )
+        self.assertIndexedPlans(queries)
@@ -0,0 +1,106 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import recent
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+class RecentPostsTests(TestCase):
+    """
+    Тест буферов последних постов авторов.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.reader = User.objects.create_user(username="recent_reader")
+        self.authors = [
+            User.objects.create_user(username=f"recent_author_{i}")
+            for i in range(3)
+        ]
+        for author in self.authors:
+            Follow.objects.create(user=self.reader, author=author)
+        self.posts = [
+            Post.objects.create(author=self.authors[i % 3], text=f"Пост {i}")
+            for i in range(14)
+        ]
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_merge_matches_feed_order(self):
+        """
+        Слияние буферов даёт те же посты, что и сортировка в базе.
+        """
+        newest = [post.pk for post in self.posts[::-1]]
+        author_ids = [author.pk for author in self.authors]
+        self.assertEqual(recent.merge(author_ids, 11), newest[:11])
+
+    @override_settings(RECENT_POSTS_SIZE=2)
+    def test_cold_buffers_load_in_one_query(self):
+        """
+        Холодные буферы всех авторов читаются одним запросом, каждый
+        не длиннее RECENT_POSTS_SIZE.
+        """
+        author_ids = [author.pk for author in self.authors]
+        with self.assertNumQueries(1):
+            buffers = recent.get_buffers(author_ids)
+        for author in self.authors:
+            newest = [
+                post.pk for post in self.posts[::-1] if post.author == author
+            ]
+            self.assertEqual(
+                [pk for _, pk in buffers[author.pk]], newest[:2]
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(recent.get_buffers(author_ids), buffers)
+
+    def test_first_page_reads_buffers(self):
+        """
+        Первая страница ленты подписок и профиля собирается из буферов.
+        """
+        recent.merge([author.pk for author in self.authors], 1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(reverse("posts:follow_index"))
+        self.assertFalse(
+            any("posts_timelineentry" in q["sql"] for q in queries)
+        )
+        page = response.context["page_obj"]
+        self.assertEqual(list(page), self.posts[::-1][:10])
+        self.assertTrue(page.has_next())
+
+        second = self.reader_client.get(
+            reverse("posts:follow_index"), {"after": page.next_cursor}
+        ).context["page_obj"]
+        self.assertEqual(list(second), self.posts[::-1][10:])
+
+        author = self.authors[0]
+        response = self.client.get(
+            reverse("posts:profile", args=(author.username,))
+        )
+        self.assertEqual(
+            list(response.context["page_obj"]),
+            [post for post in self.posts[::-1] if post.author == author],
+        )
+
+    def test_buffer_follows_new_and_deleted_posts(self):
+        """
+        Буфер пополняется новым постом и сбрасывается при удалении.
+        """
+        author = self.authors[0]
+        recent.merge([author.pk], 1)
+        # Внутри TestCase транзакция не фиксируется и on_commit
+        # не срабатывает, поэтому обработчики вызываются напрямую.
+        post = Post.objects.create(author=author, text="Новый пост")
+        recent.push(post)
+        self.assertEqual(recent.merge([author.pk], 1), [post.pk])
+
+        post.delete()
+        recent.forget(author.pk)
+        self.assertEqual(
+            recent.merge([author.pk], 1), [self.posts[12].pk]
+        )
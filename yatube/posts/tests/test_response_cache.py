@@ -0,0 +1,90 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ResponseCacheTests(TransactionTestCase):
+    """
+    Тест кэша ответов для анонимных читателей.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username="response_author")
+        self.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="response-slug",
+            description="Тестовое описание",
+        )
+        self.post = Post.objects.create(
+            author=self.author, text="Первый пост", group=self.group
+        )
+        self.urls = (
+            reverse("posts:index"),
+            reverse("posts:group_posts", args=(self.group.slug,)),
+            reverse("posts:profile", args=(self.author.username,)),
+            reverse("posts:post_detail", args=(self.post.pk,)),
+        )
+
+    def test_repeated_request_skips_view(self):
+        """
+        Повторный запрос отдаётся из кэша без запросов к базе.
+        """
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second.content, first.content)
+                self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_if_none_match_gets_304(self):
+        """
+        Совпавший ETag даёт 304 без тела.
+        """
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(response.content, b"")
+
+    def test_changes_invalidate_pages(self):
+        """
+        Новый пост и комментарий сбрасывают зависящие от них страницы.
+        """
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.create(
+            author=self.author, text="Второй пост", group=self.group
+        )
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), "Второй пост")
+
+        detail_url = self.urls[3]
+        etag = self.client.get(detail_url)["ETag"]
+        Comment.objects.create(
+            post=self.post, author=self.author, text="Комментарий"
+        )
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, "Комментарий")
+
+    def test_authorized_user_is_not_cached(self):
+        """
+        Авторизованному пользователю ответ всегда собирается заново.
+        """
+        client = Client()
+        client.force_login(self.author)
+        client.get(self.urls[0])
+        response = client.get(self.urls[0])
+        self.assertIsNotNone(response.context)
+        self.assertFalse(response.has_header("ETag"))
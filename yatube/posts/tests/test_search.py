@@ -0,0 +1,116 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    """
+    Тест полнотекстового поиска по постам.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create_user(username="search_author")
+        cls.admin = User.objects.create_superuser(
+            "search_admin", "admin@example.com", "password"
+        )
+        cls.rare = Post.objects.create(
+            author=cls.author, text="Ёжик бежал по лесу <script>"
+        )
+        cls.frequent = Post.objects.create(
+            author=cls.author, text="Лесу лесом лесной, ёжики в лесу"
+        )
+        Post.objects.bulk_create(
+            [Post(author=cls.author, text=f"Про море {n}") for n in range(3)]
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_match_expression_is_safe(self):
+        """
+        Операторы FTS5 из запроса превращаются в обычные слова.
+        """
+        self.assertEqual(
+            search.match_expression('лес OR "x" NEAR(*)'),
+            '"лес"* "or"* "x"* "near"*',
+        )
+        self.assertEqual(search.match_expression("?!"), "")
+
+    def test_ranked_results_with_snippets(self):
+        """
+        Слова ищутся по префиксу без учёта регистра, посты
+        с большим числом совпадений выше, совпадения выделены.
+        """
+        posts = list(search.search(Post.objects.all(), "лес"))
+        self.assertEqual(posts, [self.frequent, self.rare])
+        self.assertIn(search.SNIPPET_START, posts[1].search_snippet)
+
+    def test_index_follows_updates(self):
+        """
+        Индекс обновляется триггерами при изменении и удалении,
+        в том числе через update() и bulk_create.
+        """
+        self.assertEqual(search.search(Post.objects.all(), "море").count(), 3)
+        Post.objects.filter(pk=self.rare.pk).update(text="Кот в сапогах")
+        self.assertEqual(
+            list(search.search(Post.objects.all(), "кот")), [self.rare]
+        )
+        self.assertFalse(search.search(Post.objects.all(), "бежал").exists())
+        Post.objects.filter(pk=self.rare.pk).delete()
+        self.assertFalse(search.search(Post.objects.all(), "кот").exists())
+
+    def triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+            )
+            return {name for name, in cursor.fetchall()}
+
+    def test_triggers_after_migrate(self):
+        """
+        Триггеры индекса есть после всех миграций и ставятся заново
+        после migrate, если пересоздание posts_post их удалило.
+        """
+        self.assertLessEqual(set(search.TRIGGER_NAMES), self.triggers())
+        search.drop_triggers(connection)
+        self.assertFalse(set(search.TRIGGER_NAMES) & self.triggers())
+        call_command("migrate", verbosity=0)
+        self.assertLessEqual(set(search.TRIGGER_NAMES), self.triggers())
+        post = Post.objects.create(author=self.author, text="Снегирь")
+        self.assertEqual(
+            list(search.filter_posts(Post.objects.all(), "снег")), [post]
+        )
+
+    def test_search_page(self):
+        """
+        Страница поиска показывает найденное с экранированным
+        фрагментом и постраничной навигацией.
+        """
+        response = self.client.get(reverse("posts:search"), {"q": "Ёжик"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["page_obj"]), 2)
+        content = response.content.decode()
+        self.assertIn("<mark>Ёжик</mark>", content)
+        self.assertIn("бежал по лесу &lt;script&gt;", content)
+
+        response = self.client.get(reverse("posts:search"))
+        self.assertIsNone(response.context["page_obj"])
+
+    def test_admin_search_uses_index(self):
+        """
+        Поиск в админке идёт по индексу.
+        """
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "море"}
+        )
+        self.assertEqual(response.context["cl"].result_count, 3)
@@ -0,0 +1,216 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageFile as PILImageFile
+from sorl.thumbnail import get_thumbnail
+
+from posts import images
+from posts.models import Post
+from posts.storage import image_storage
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def jpeg(color):
+    raw = BytesIO()
+    Image.new("RGB", (200, 100), color).save(raw, "JPEG")
+    return raw.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_RELEASE_GRACE=0)
+class ContentAddressedStorageTests(TestCase):
+    """
+    Тест хранения картинок по хэшу содержимого.
+    """
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username="storage_author")
+
+    def create_post(self, name, content):
+        post = Post(author=self.author, text="Пост с картинкой")
+        post.image.save(name, ContentFile(content), save=False)
+        post.save()
+        return post
+
+    def test_identical_uploads_share_file(self):
+        """
+        Одинаковые картинки получают одно имя по хэшу и один файл.
+        """
+        first = self.create_post("first.jpeg", jpeg((10, 20, 30)))
+        second = self.create_post("second.jpg", jpeg((10, 20, 30)))
+        other = self.create_post("first.jpeg", jpeg((200, 0, 0)))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        directory, name = os.path.split(first.image.name)
+        self.assertEqual(directory, f"posts/{name[:2]}")
+        self.assertTrue(name.endswith(".jpg"))
+        self.assertEqual(len(image_storage.listdir(directory)[1]), 1)
+
+    def test_release_keeps_shared_file(self):
+        """
+        Файл удаляется вместе с превью, только когда на него не
+        ссылается ни один пост.
+        """
+        first = self.create_post("shared.jpg", jpeg((40, 50, 60)))
+        second = self.create_post("shared.jpg", jpeg((40, 50, 60)))
+        name = first.image.name
+        thumbnail = get_thumbnail(first.image, "100x50")
+        self.assertTrue(thumbnail.exists())
+
+        first.delete()
+        images.release(name)
+        self.assertTrue(image_storage.exists(name))
+
+        second.delete()
+        images.release(name)
+        self.assertFalse(image_storage.exists(name))
+        self.assertFalse(thumbnail.exists())
+
+    @override_settings(IMAGE_RELEASE_GRACE=3600)
+    def test_release_skips_fresh_upload(self):
+        """
+        Недавно загруженный файл не удаляется: его пост может быть
+        ещё не сохранён.
+        """
+        post = self.create_post("fresh.jpg", jpeg((70, 80, 90)))
+        name = post.image.name
+        post.delete()
+        images.release(name)
+        self.assertTrue(image_storage.exists(name))
+
+    def test_release_ignores_foreign_names(self):
+        """
+        Имена вне MEDIA_ROOT не трогаются.
+        """
+        images.release("/tmp/missing.jpg")
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImagePreviewTests(TestCase):
+    """
+    Тест заглушек картинок, которые считает задача превью.
+    """
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username="preview_author")
+
+    def test_preview_saved_with_post(self):
+        """
+        Новая загрузка получает крошечную заглушку и основной цвет.
+        """
+        post = Post.objects.create(
+            author=self.author,
+            text="Пост",
+            image=SimpleUploadedFile(
+                "upload.jpg", jpeg((250, 0, 0)), "image/jpeg"
+            ),
+        )
+        images.save_preview(post.image.name)
+        post.refresh_from_db()
+        self.assertTrue(
+            post.image_placeholder.startswith("data:image/jpeg;base64,")
+        )
+        self.assertLess(len(post.image_placeholder), 1000)
+        self.assertRegex(post.image_color, r"^#[0-9a-f]{6}$")
+        red, green, blue = (
+            int(post.image_color[index:index + 2], 16) for index in (1, 3, 5)
+        )
+        self.assertGreater(red, 200)
+        self.assertLess(max(green, blue), 50)
+        self.assertTrue(image_storage.exists(post.image.name))
+
+    def test_preview_reused_for_same_file(self):
+        """
+        Для уже известного файла картинка заново не разбирается.
+        """
+        first = Post(author=self.author, text="Первый")
+        first.image.save("same.jpg", ContentFile(jpeg((0, 90, 0))))
+        second = Post(author=self.author, text="Второй")
+        second.image.save("same.jpg", ContentFile(jpeg((0, 90, 0))), False)
+        with mock.patch.object(images, "preview") as preview:
+            second.save()
+        preview.assert_not_called()
+        self.assertEqual(second.image_color, first.image_color)
+        self.assertEqual(second.image_placeholder, first.image_placeholder)
+
+    def test_large_png_not_decoded_in_request(self):
+        """
+        Загрузка большой PNG не декодирует пиксели в запросе:
+        заглушку считает задача превью.
+        """
+        raw = BytesIO()
+        Image.new("RGB", (4000, 2500), (0, 0, 250)).save(raw, "PNG")
+        client = Client()
+        client.force_login(self.author)
+        decoded = []
+        load = PILImageFile.ImageFile.load
+
+        def counting_load(image):
+            decoded.append(image.size)
+            return load(image)
+
+        with mock.patch.object(PILImageFile.ImageFile, "load", counting_load):
+            client.post(
+                reverse("posts:post_create"),
+                {
+                    "text": "Большая картинка",
+                    "image": SimpleUploadedFile(
+                        "large.png", raw.getvalue(), "image/png"
+                    ),
+                },
+            )
+        self.assertEqual(decoded, [])
+        post = Post.objects.get(text="Большая картинка")
+        self.assertEqual(post.image_placeholder, "")
+
+        images.save_preview(post.image.name)
+        post.refresh_from_db()
+        self.assertTrue(post.image_placeholder.startswith("data:image/jpeg"))
+
+    def test_broken_image_has_no_preview(self):
+        """
+        Нечитаемый файл оставляет поля пустыми.
+        """
+        post = Post(author=self.author, text="Пост")
+        post.image.save("broken.jpg", ContentFile(b"not an image"))
+        images.save_preview(post.image.name)
+        post.refresh_from_db()
+        self.assertEqual((post.image_placeholder, post.image_color), ("", ""))
+
+    def test_tag_renders_preview(self):
+        """
+        Тег выводит заглушку фоном картинки.
+        """
+        post = Post(author=self.author, text="Пост")
+        post.image.save("tag.jpg", ContentFile(jpeg((0, 0, 200))))
+        images.save_preview(post.image.name)
+        post.refresh_from_db()
+        html = Template(
+            "{% load post_images %}{% responsive_image image %}"
+        ).render(Context({"image": post.image}))
+        self.assertIn(f"background-color: {post.image_color};", html)
+        self.assertIn(f"url({post.image_placeholder})", html)
@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import tags
+from posts.models import Post, Tag, TaggedPost
+
+User = get_user_model()
+
+
+class HashtagTests(TestCase):
+    """
+    Тест хэштегов и лент тегов.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create_user(username="tag_author")
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f"Пост {number} #Кино #день{number}"
+            )
+            for number in range(13)
+        ]
+        Post.objects.create(author=cls.author, text="Без тегов, но с # и a#b")
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def entries(self, post):
+        return set(
+            TaggedPost.objects.filter(post=post).values_list(
+                "tag__name", flat=True
+            )
+        )
+
+    def test_extract(self):
+        """
+        Хэштеги ищутся в начале слов, без учёта регистра.
+        """
+        self.assertEqual(
+            tags.extract("#Кино и #кино, e#mail, ##x, &#39; #snake_case"),
+            {"кино", "snake_case"},
+        )
+
+    def test_long_words_are_not_tags(self):
+        """
+        Слово длиннее 64 символов не обрезается до тега.
+        """
+        self.assertEqual(
+            tags.extract(f"#{'a' * 64} #{'b' * 65}"), {"a" * 64}
+        )
+
+    def test_index_follows_edit_and_delete(self):
+        """
+        Индекс обновляется при правке текста и удалении поста.
+        """
+        post = Post.objects.get(pk=self.posts[0].pk)
+        self.assertEqual(self.entries(post), {"кино", "день0"})
+        post.text = "Теперь #театр и #кино"
+        post.save()
+        self.assertEqual(self.entries(post), {"кино", "театр"})
+        entry = TaggedPost.objects.get(post=post, tag__name="театр")
+        self.assertEqual(entry.pub_date, post.pub_date)
+
+        post.delete()
+        self.assertFalse(TaggedPost.objects.filter(post_id=entry.post_id))
+
+    def test_tag_feed_pages(self):
+        """
+        Лента тега идёт по курсору от новых постов к старым
+        и не читает тексты постов вне страницы.
+        """
+        url = reverse("posts:tag_posts", args=("КИНО",))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        page_obj = response.context["page_obj"]
+        self.assertEqual(list(page_obj), self.posts[::-1][:10])
+
+        response = self.client.get(url, {"after": page_obj.next_cursor})
+        self.assertEqual(
+            list(response.context["page_obj"]), self.posts[::-1][10:]
+        )
+        self.assertEqual(
+            self.client.get(
+                reverse("posts:tag_posts", args=("нет",))
+            ).status_code,
+            404,
+        )
+
+    def test_tag_links(self):
+        """
+        Хэштеги в тексте поста ведут на ленты тегов.
+        """
+        response = self.client.get(
+            reverse("posts:post_detail", args=(self.posts[1].pk,))
+        )
+        self.assertContains(
+            response,
+            f'<a href="{reverse("posts:tag_posts", args=("кино",))}">'
+            "#Кино</a>",
+        )
+
+    def test_tag_created_once(self):
+        """
+        Тег заводится один раз на все посты.
+        """
+        self.assertEqual(Tag.objects.filter(name="кино").count(), 1)
+        self.assertEqual(
+            TaggedPost.objects.filter(tag__name="кино").count(), 13
+        )
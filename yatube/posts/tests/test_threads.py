@@ -0,0 +1,175 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import counters, threads
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(COMMENT_THREAD_DEPTH=2)
+class CommentThreadTests(TestCase):
+    """
+    Тест веток ответов на комментарии.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create_user(username="thread_author")
+        cls.post = Post.objects.create(author=cls.author, text="Пост")
+        cls.other_post = Post.objects.create(author=cls.author, text="Другой")
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def reply(self, text, parent=None, post=None):
+        data = {"text": text}
+        if parent is not None:
+            data["parent"] = parent.pk
+        self.client.post(
+            reverse("posts:add_comment", args=((post or self.post).pk,)),
+            data,
+        )
+        return Comment.objects.filter(text=text).first()
+
+    def build(self):
+        """
+        Ветка: root -> first -> deep -> deeper, root -> second,
+        и отдельный корень other.
+        """
+        root = self.reply("root")
+        first = self.reply("first", root)
+        deep = self.reply("deep", first)
+        deeper = self.reply("deeper", deep)
+        second = self.reply("second", root)
+        other = self.reply("other")
+        return root, first, deep, deeper, second, other
+
+    def test_paths_and_reply_counts(self):
+        """
+        Путь состоит из id предков, счётчики ответов считают всех
+        потомков.
+        """
+        root, first, deep, deeper, second, other = self.build()
+        self.assertEqual(
+            deeper.path,
+            "".join(
+                threads.segment(c.pk) for c in (root, first, deep, deeper)
+            ),
+        )
+        self.assertEqual(deeper.depth, 3)
+        counts = dict(Comment.objects.values_list("text", "reply_count"))
+        self.assertEqual(
+            counts,
+            {
+                "root": 4,
+                "first": 2,
+                "deep": 1,
+                "deeper": 0,
+                "second": 0,
+                "other": 0,
+            },
+        )
+        self.assertEqual(
+            list(
+                Comment.objects.filter(threads._replies(root)).order_by(
+                    "path"
+                )
+            ),
+            [first, deep, deeper, second],
+        )
+
+    def test_page_loads_threads_in_one_query(self):
+        """
+        Ответы всех корней порции читаются одним запросом по путям,
+        не глубже COMMENT_THREAD_DEPTH.
+        """
+        root, first, deep, deeper, second, other = self.build()
+        self.client.logout()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("posts:post_detail", args=(self.post.pk,))
+            )
+        comment_queries = [
+            query["sql"]
+            for query in queries
+            if 'FROM "posts_comment"' in query["sql"]
+        ]
+        self.assertEqual(len(comment_queries), 2)
+        page = list(response.context["comments"])
+        self.assertEqual(page, [other, root])
+        self.assertEqual(page[1].thread, [first, deep, second])
+        self.assertEqual(
+            [reply.level for reply in page[1].thread], [0, 1, 0]
+        )
+        self.assertContains(
+            response,
+            reverse("posts:comment_thread", args=(self.post.pk, deep.pk)),
+        )
+
+        response = self.client.get(
+            reverse("posts:comment_thread", args=(self.post.pk, first.pk))
+        )
+        self.assertEqual(response.context["comment"], first)
+        self.assertEqual(response.context["comment"].thread, [deep, deeper])
+
+    def test_reply_parent_checked(self):
+        """
+        Ответить можно только на комментарий того же поста;
+        глубже MAX_DEPTH ответ становится соседом.
+        """
+        root = self.reply("root")
+        self.assertIsNone(self.reply("чужой", root, self.other_post))
+
+        parent = root
+        for level in range(1, Comment.MAX_DEPTH + 1):
+            parent = self.reply(f"level {level}", parent)
+        self.assertEqual(parent.depth, Comment.MAX_DEPTH - 1)
+        self.assertEqual(
+            parent.parent.text, f"level {Comment.MAX_DEPTH - 2}"
+        )
+
+    def test_delete_updates_counts(self):
+        """
+        Удаление ответа уменьшает счётчики предков, удаление ветки
+        уносит все её ответы.
+        """
+        root, first, deep, deeper, second, other = self.build()
+        Comment.objects.filter(pk=deeper.pk).delete()
+        counts = dict(Comment.objects.values_list("text", "reply_count"))
+        self.assertEqual((counts["root"], counts["first"]), (3, 1))
+
+        Comment.objects.filter(pk=first.pk).delete()
+        self.assertEqual(
+            set(Comment.objects.values_list("text", "reply_count")),
+            {("root", 1), ("second", 0), ("other", 0)},
+        )
+        self.assertEqual(counters.find_comment_drift(), [])
+
+    def test_admin_deletes_subtrees(self):
+        """
+        Админка удаляет ветку одним запросом и поправляет счётчики.
+        """
+        root, first, deep, deeper, second, other = self.build()
+        admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        self.client.force_login(admin)
+        self.client.post(
+            reverse("admin:posts_comment_changelist"),
+            {
+                "action": "delete_selected",
+                "_selected_action": [first.pk, other.pk],
+                "post": "yes",
+            },
+        )
+        self.assertEqual(
+            set(Comment.objects.values_list("text", "reply_count")),
+            {("root", 1), ("second", 0)},
+        )
+        self.assertEqual(counters.find_comment_drift(), [])
@@ -0,0 +1,286 @@
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.models import KVStore
+
+from posts import images, thumbnails
+from posts.models import Post
+from posts.storage import image_storage
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def jpeg(color=(20, 120, 220)):
+    raw = BytesIO()
+    Image.new("RGB", (1200, 800), color).save(raw, "JPEG")
+    return raw.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    """
+    Тест заблаговременной генерации превью.
+    """
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        cache.clear()
+        thumbnails._pending.clear()
+        self.author = User.objects.create_user(username="thumb_author")
+
+    def create_post(self, name, content):
+        post = Post(author=self.author, text="Пост с картинкой")
+        post.image.save(name, ContentFile(content), save=False)
+        post.save()
+        return post
+
+    def render(self, post):
+        return get_thumbnail(
+            post.image, "960x339", format="JPEG", **thumbnails.VARIANT_OPTIONS
+        )
+
+    def test_generate_builds_every_geometry(self):
+        """
+        Задача пула строит все превью, которые нужны шаблонам,
+        и записывает заглушку поста.
+        """
+        post = self.create_post("ready.jpg", jpeg())
+        self.assertEqual(post.image_placeholder, "")
+        thumbnails._generate(post.image.name)
+        with mock.patch.object(thumbnails, "pool_enabled", return_value=True):
+            thumbnail = self.render(post)
+        self.assertNotIsInstance(thumbnail, thumbnails.Placeholder)
+        self.assertEqual((thumbnail.x, thumbnail.y), (960, 339))
+        post.refresh_from_db()
+        self.assertTrue(post.image_placeholder.startswith("data:image/jpeg"))
+
+    def test_placeholder_until_ready(self):
+        """
+        Пока превью нет, шаблон получает заглушку, а картинка один раз
+        уходит в пул.
+        """
+        post = self.create_post("queued.jpg", jpeg((200, 10, 10)))
+        with mock.patch.object(
+            thumbnails, "pool_enabled", return_value=True
+        ), mock.patch.object(thumbnails, "_submit") as submit:
+            first = self.render(post)
+            second = self.render(post)
+        self.assertIsInstance(first, thumbnails.Placeholder)
+        self.assertIsInstance(second, thumbnails.Placeholder)
+        self.assertTrue(first.url.startswith("data:image/svg+xml,"))
+        self.assertEqual((first.x, first.y), (960, 339))
+        submit.assert_called_once_with(post.image.name)
+
+    def test_broken_image_is_not_retried(self):
+        """
+        Сломанная картинка запоминается и не разбирается
+        на каждой отрисовке.
+        """
+        post = self.create_post("broken.jpg", b"not an image")
+        with mock.patch.object(
+            default.engine, "get_image", wraps=default.engine.get_image
+        ) as get_image, self.assertLogs("sorl.thumbnail", "ERROR"):
+            self.assertIsInstance(self.render(post), thumbnails.Placeholder)
+            self.assertIsInstance(self.render(post), thumbnails.Placeholder)
+            thumbnails.enqueue(post.image.name)
+        self.assertEqual(get_image.call_count, 1)
+        self.assertTrue(thumbnails.has_failed(post.image.name))
+
+    def test_failed_task_marks_image(self):
+        """
+        Ошибка в пуле попадает в кэш неудач.
+        """
+        future = mock.Mock()
+        future.exception.return_value = thumbnails.ThumbnailError("x.jpg")
+        thumbnails._pending.add("posts/x.jpg")
+        with self.assertLogs("posts.thumbnails", "WARNING"):
+            thumbnails._done("posts/x.jpg", future)
+        self.assertTrue(thumbnails.has_failed("posts/x.jpg"))
+        self.assertNotIn("posts/x.jpg", thumbnails._pending)
+
+    def test_responsive_image_tag(self):
+        """
+        Тег выводит все ширины в srcset, размеры и ленивую загрузку.
+        """
+        post = self.create_post("responsive.jpg", jpeg())
+        html = Template(
+            "{% load post_images %}{% responsive_image image 'card-img' %}"
+        ).render(Context({"image": post.image}))
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('width="960" height="339"', html)
+        self.assertIn('class="card-img"', html)
+        for width in thumbnails.VARIANT_WIDTHS:
+            self.assertIn(f" {width}w", html)
+        if "WEBP" in thumbnails.VARIANT_FORMATS:
+            self.assertIn('<source type="image/webp"', html)
+
+    def test_responsive_image_placeholder(self):
+        """
+        Пока вариантов нет, тег выводит заглушку поста того же размера,
+        а без неё - серый SVG.
+        """
+        post = self.create_post("pending.jpg", jpeg((1, 2, 3)))
+        images.save_preview(post.image.name)
+        post.refresh_from_db()
+        with mock.patch.object(
+            thumbnails, "pool_enabled", return_value=True
+        ), mock.patch.object(thumbnails, "_submit") as submit:
+            html = Template(
+                "{% load post_images %}{% responsive_image image %}"
+            ).render(Context({"image": post.image}))
+        self.assertIn(f'src="{post.image_placeholder}"', html)
+        self.assertIn('width="960" height="339"', html)
+        self.assertNotIn("srcset", html)
+        submit.assert_called_once_with(post.image.name)
+
+        post.image_placeholder = ""
+        with mock.patch.object(
+            thumbnails, "pool_enabled", return_value=True
+        ), mock.patch.object(thumbnails, "_submit"):
+            html = Template(
+                "{% load post_images %}{% responsive_image image %}"
+            ).render(Context({"image": post.image}))
+        self.assertIn('src="data:image/svg+xml,', html)
+
+    def test_prefetch_reads_page_in_one_query(self):
+        """
+        Превью всей страницы читаются одним запросом, после этого
+        шаблону не нужны ни база, ни генерация.
+        """
+        posts = [
+            self.create_post(f"page_{index}.jpg", jpeg((index, 0, 0)))
+            for index in range(3)
+        ]
+        for post in posts:
+            thumbnails._generate(post.image.name)
+        cache.clear()
+        posts = list(Post.objects.filter(pk__in=[post.pk for post in posts]))
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(post.image for post in posts)
+        with self.assertNumQueries(0), mock.patch.object(
+            default.backend, "get_thumbnail"
+        ) as get_thumbnail:
+            ready = [thumbnails.variants(post.image) for post in posts]
+        get_thumbnail.assert_not_called()
+        for variants in ready:
+            self.assertEqual(
+                [thumbnail.x for thumbnail in variants["JPEG"]],
+                list(thumbnails.VARIANT_WIDTHS),
+            )
+
+    def test_page_with_missing_thumbnails(self):
+        """
+        Страница с постами без превью читает хранилище ключей одним
+        запросом, ничего в него не пишет, а картинки уходят в пул.
+        """
+        posts = [
+            self.create_post(f"missing_{index}.jpg", jpeg((0, index, 0)))
+            for index in range(3)
+        ]
+        for attempt in range(2):
+            with mock.patch.object(
+                thumbnails, "pool_enabled", return_value=True
+            ), mock.patch.object(
+                thumbnails, "_submit"
+            ) as submit, CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse("posts:index"))
+            cache.clear()
+            thumbnails._pending.clear()
+            kvstore = [
+                query["sql"]
+                for query in queries
+                if "thumbnail_kvstore" in query["sql"]
+            ]
+            self.assertEqual(len(kvstore), 1)
+            self.assertTrue(kvstore[0].startswith("SELECT"))
+            self.assertEqual(submit.call_count, len(posts))
+            self.assertNotContains(response, "srcset")
+
+    def test_prefetch_skips_failed_images(self):
+        """
+        Сломанная картинка после prefetch сразу даёт пустые варианты.
+        """
+        post = self.create_post("page_broken.jpg", b"not an image")
+        thumbnails.mark_failed(post.image.name)
+        with self.assertNumQueries(0):
+            thumbnails.prefetch([post.image])
+            ready = thumbnails.variants(post.image)
+        self.assertEqual(ready["JPEG"], [])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=1)
+class ThumbnailPoolTests(TransactionTestCase):
+    """
+    Тест полного цикла с настоящим пулом: превью строит другой
+    процесс, а процесс сайта видит их при следующей отрисовке.
+    """
+
+    def setUp(self) -> None:
+        # Базу в памяти процесс пула не видит, поэтому на время теста
+        # соединение переключается на файл с нужными таблицами.
+        cache.clear()
+        thumbnails._pending.clear()
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        saved = connection.settings_dict["NAME"], connection.connection
+        connection.connection = None
+        connection.settings_dict["NAME"] = os.path.join(directory, "db")
+        self.addCleanup(self.restore_connection, directory, *saved)
+        with connection.schema_editor() as editor:
+            editor.create_model(KVStore)
+            editor.create_model(Post)
+
+    def restore_connection(self, directory, name, saved):
+        if thumbnails._pool is not None:
+            thumbnails._pool.shutdown()
+            thumbnails._pool = None
+        connection.close()
+        connection.settings_dict["NAME"] = name
+        connection.connection = saved
+        shutil.rmtree(directory, ignore_errors=True)
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def wait(self, name):
+        deadline = time.monotonic() + 60
+        while name in thumbnails._pending and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertNotIn(name, thumbnails._pending)
+
+    def test_ready_thumbnail_replaces_placeholder(self):
+        """
+        Промах не кэшируется: после работы пула та же отрисовка
+        в этом процессе получает готовое превью.
+        """
+        self.assertTrue(thumbnails.pool_enabled())
+        name = image_storage.save("posts/pool.jpg", ContentFile(jpeg()))
+        source = ImageFile(name, image_storage)
+        options = {**thumbnails.VARIANT_OPTIONS, "format": "JPEG"}
+
+        first = get_thumbnail(source, "960x339", **options)
+        self.assertIsInstance(first, thumbnails.Placeholder)
+        self.wait(name)
+
+        second = get_thumbnail(source, "960x339", **options)
+        self.assertNotIsInstance(second, thumbnails.Placeholder)
+        self.assertTrue(second.exists())
+        self.assertEqual((second.x, second.y), (960, 339))
@@ -0,0 +1,141 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    """
+    Тест материализованной ленты подписок.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username="timeline_author")
+        self.reader = User.objects.create_user(username="timeline_reader")
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed(self, **params):
+        response = self.reader_client.get(
+            reverse("posts:follow_index"), params
+        )
+        return response.context["page_obj"]
+
+    def read_all(self):
+        page = self.feed()
+        posts = list(page)
+        while page.has_next():
+            page = self.feed(after=page.next_cursor)
+            posts.extend(page)
+        return posts
+
+    def test_entries_follow_posts_and_subscriptions(self):
+        """
+        Лента заполняется при подписке и постинге, чистится при отписке
+        и удалении поста.
+        """
+        old_post = Post.objects.create(author=self.author, text="Старый")
+        self.reader_client.get(
+            reverse("posts:profile_follow", args=(self.author.username,))
+        )
+        new_post = Post.objects.create(author=self.author, text="Новый")
+        self.assertEqual(
+            list(self.reader.timeline.values_list("post_id", flat=True)),
+            [old_post.pk, new_post.pk],
+        )
+        self.assertEqual(list(self.feed()), [new_post, old_post])
+
+        new_post.delete()
+        self.assertEqual(self.reader.timeline.count(), 1)
+
+        self.reader_client.get(
+            reverse("posts:profile_unfollow", args=(self.author.username,))
+        )
+        self.assertFalse(self.reader.timeline.exists())
+        self.assertEqual(list(self.feed()), [])
+
+    @override_settings(TIMELINE_SIZE=3, TIMELINE_TRIM_EVERY=1)
+    def test_trimmed_timeline_falls_back_to_join(self):
+        """
+        Посты старше обрезанной ленты читаются из подписок.
+        """
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f"Пост {i}")
+            for i in range(13)
+        ]
+        self.assertEqual(self.reader.timeline.count(), 3)
+        self.assertEqual(self.read_all(), posts[::-1])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_heavy_author_is_merged_on_read(self):
+        """
+        Посты автора с множеством подписчиков подмешиваются при чтении.
+        """
+        fan = User.objects.create_user(username="timeline_fan")
+        Follow.objects.create(user=fan, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        other = User.objects.create_user(username="timeline_other")
+        Follow.objects.create(user=self.reader, author=other)
+
+        heavy_post = Post.objects.create(author=self.author, text="Тяжёлый")
+        light_post = Post.objects.create(author=other, text="Лёгкий")
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list("post_id", flat=True)),
+            [light_post.pk],
+        )
+        self.assertEqual(
+            timeline.heavy_author_ids(self.reader), [self.author.pk]
+        )
+        self.assertEqual(list(self.feed()), [light_post, heavy_post])
+
+    def test_fallback_reads_authors_in_one_query(self):
+        """
+        Пустая лента читается из подписок одним запросом на всех
+        авторов, а не запросом на каждого.
+        """
+        counts = []
+        followed = 0
+        for number in (1, 4):
+            followed += number
+            for index in range(number):
+                author = User.objects.create_user(
+                    username=f"timeline_many_{number}_{index}"
+                )
+                Follow.objects.create(user=self.reader, author=author)
+                Post.objects.create(author=author, text=f"Пост {index}")
+            TimelineEntry.objects.filter(user=self.reader).delete()
+            cache.clear()
+            paginator = timeline.TimelinePaginator(self.reader, 10)
+            paginator.get_page()
+            with CaptureQueriesContext(connection) as queries:
+                page = timeline.TimelinePaginator(self.reader, 10).get_page()
+            self.assertEqual(len(page), followed)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_no_longer_heavy_is_backfilled(self):
+        """
+        Автор, переставший быть «тяжёлым», раскладывает по лентам
+        посты, написанные, пока их подмешивали при чтении.
+        """
+        fan = User.objects.create_user(username="timeline_fan")
+        Follow.objects.create(user=fan, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text="Тяжёлый")
+        self.assertFalse(self.reader.timeline.exists())
+
+        Follow.objects.filter(user=fan).delete()
+        self.assertEqual(
+            list(self.reader.timeline.values_list("post_id", flat=True)),
+            [post.pk],
+        )
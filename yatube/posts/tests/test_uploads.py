@@ -0,0 +1,184 @@
+import shutil
+import struct
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, PngImagePlugin
+
+from posts.models import Post
+from posts.uploads import ORIENTATION, _strip_webp
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+MAKE = 0x010F
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    """
+    Тест потоковой проверки и очистки загружаемых картинок.
+    """
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        self.author = User.objects.create_user(username="upload_author")
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def upload(self, name, content):
+        image = SimpleUploadedFile(
+            name, content, content_type="application/octet-stream"
+        )
+        return self.authorized_client.post(
+            reverse("posts:post_create"),
+            {"text": "Пост с картинкой", "image": image},
+        )
+
+    def test_jpeg_keeps_only_orientation(self):
+        """
+        Из JPEG уходит EXIF, кроме ориентации.
+        """
+        exif = Image.Exif()
+        exif[MAKE] = "Camera"
+        exif[ORIENTATION] = 6
+        raw = BytesIO()
+        Image.new("RGB", (40, 20), "red").save(raw, "JPEG", exif=exif)
+        self.upload("photo.jpg", raw.getvalue())
+
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            saved = image.getexif()
+            self.assertEqual(image.size, (40, 20))
+            image.load()
+        self.assertEqual(saved.get(ORIENTATION), 6)
+        self.assertNotIn(MAKE, saved)
+
+    def test_png_text_is_stripped(self):
+        """
+        Текстовые чанки PNG не сохраняются.
+        """
+        info = PngImagePlugin.PngInfo()
+        info.add_text("Comment", "secret")
+        raw = BytesIO()
+        Image.new("RGB", (10, 10), "blue").save(raw, "PNG", pnginfo=info)
+        self.upload("picture.png", raw.getvalue())
+
+        post = Post.objects.get()
+        with open(post.image.path, "rb") as saved:
+            self.assertNotIn(b"secret", saved.read())
+        with Image.open(post.image.path) as image:
+            image.load()
+            self.assertEqual(image.size, (10, 10))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1024)
+    def test_byte_limit(self):
+        """
+        Файл больше предела отклоняется с понятной ошибкой.
+        """
+        raw = BytesIO()
+        Image.effect_noise((200, 200), 100).save(raw, "PNG")
+        response = self.upload("noise.png", raw.getvalue())
+        self.assertIn(
+            "Файл больше 1,0", response.context["form"].errors["image"][0]
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=100)
+    def test_pixel_limit(self):
+        """
+        Картинка с большим числом пикселей отклоняется по заголовку.
+        """
+        raw = BytesIO()
+        Image.new("RGB", (20, 20)).save(raw, "PNG")
+        response = self.upload("wide.png", raw.getvalue())
+        self.assertIn(
+            "слишком большое", response.context["form"].errors["image"][0]
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_gif_comment_and_application_data_are_stripped(self):
+        """
+        Из GIF уходят комментарий и данные приложений, повтор
+        анимации остаётся.
+        """
+        frames = [Image.new("P", (8, 8), color) for color in (1, 2)]
+        raw = BytesIO()
+        frames[0].save(
+            raw,
+            "GIF",
+            save_all=True,
+            append_images=frames[1:],
+            loop=0,
+            comment=b"secret",
+        )
+        content = raw.getvalue()
+        # Расширение XMP сразу после общей палитры.
+        start = 13 + (3 << ((content[10] & 0x07) + 1))
+        xmp = b"\x21\xff\x0bXMP DataXMP\x05<xmp>\x00"
+        self.upload("animation.gif", content[:start] + xmp + content[start:])
+
+        post = Post.objects.get()
+        with open(post.image.path, "rb") as saved:
+            data = saved.read()
+        self.assertNotIn(b"secret", data)
+        self.assertNotIn(b"XMP", data)
+        self.assertIn(b"NETSCAPE2.0", data)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.n_frames, 2)
+
+    def test_csrf_is_checked(self):
+        """
+        Обработчик загрузок не отключает проверку CSRF.
+        """
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        response = client.post(
+            reverse("posts:post_create"), {"text": "Без токена"}
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Post.objects.exists())
+
+    def test_not_an_image(self):
+        """
+        Не-картинка отклоняется.
+        """
+        response = self.upload("fake.jpg", b"plain text, not a picture")
+        self.assertTrue(response.context["form"].errors["image"])
+        self.assertFalse(Post.objects.exists())
+
+    def test_webp_metadata_chunks_are_dropped(self):
+        """
+        Из WebP уходят чанки EXIF и XMP, размер RIFF и флаги VP8X
+        пересчитываются.
+        """
+
+        def chunk(chunk_type, data):
+            padding = b"\0" * (len(data) % 2)
+            return chunk_type + struct.pack("<I", len(data)) + data + padding
+
+        body = (
+            b"WEBP"
+            + chunk(b"VP8X", bytes([0x08 | 0x04 | 0x10]) + b"\0" * 9)
+            + chunk(b"VP8L", b"pixels!")
+            + chunk(b"EXIF", b"exif data")
+            + chunk(b"XMP ", b"<xmp/>")
+        )
+        source = BytesIO(b"RIFF" + struct.pack("<I", len(body)) + body)
+        target = BytesIO()
+        _strip_webp(source, target)
+
+        result = target.getvalue()
+        self.assertNotIn(b"EXIF", result)
+        self.assertNotIn(b"XMP ", result)
+        self.assertEqual(struct.unpack("<I", result[4:8])[0], len(result) - 8)
+        self.assertEqual(result[20], 0x10)
+        self.assertIn(chunk(b"VP8L", b"pixels!"), result)
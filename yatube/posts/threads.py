@@ -0,0 +1,159 @@
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Comment
+
+STEP = Comment.PATH_STEP
+
+
+def segment(pk):
+    return str(pk).zfill(STEP)
+
+
+def path_of(comment):
+    """
+    Путь комментария; у корней, созданных через bulk_create,
+    он ещё не записан и совпадает с id.
+    """
+    return comment.path or segment(comment.pk)
+
+
+def ancestor_ids(path):
+    """
+    id предков по пути, от корня ветки к родителю.
+    """
+    return [int(path[i:i + STEP]) for i in range(0, len(path) - STEP, STEP)]
+
+
+def _replies(comment, depth=None, include_self=False):
+    """
+    Условие на ответы комментария: пути от его собственного до пути
+    следующего соседа. Все они начинаются с пути комментария, так что
+    это один диапазон по индексу (post, path).
+    """
+    path = path_of(comment)
+    bound = path[:-STEP] + segment(int(path[-STEP:]) + 1)
+    start = "path__gte" if include_self else "path__gt"
+    condition = Q(post_id=comment.post_id, path__lt=bound, **{start: path})
+    if depth is not None:
+        condition &= Q(depth__lte=comment.depth + depth)
+    return condition
+
+
+def reply_parent(parent):
+    """
+    Комментарий, к которому прикрепляется ответ на parent: глубже
+    MAX_DEPTH уровней ветка не растёт, ответ становится соседом.
+    """
+    if parent.depth + 1 < Comment.MAX_DEPTH:
+        return parent
+    return parent.parent
+
+
+def comment_added(comment):
+    """
+    Путь и уровень нового комментария; счётчики ответов всех его
+    предков растут одним UPDATE.
+    """
+    parent = comment.parent if comment.parent_id else None
+    comment.path = (path_of(parent) if parent else "") + segment(comment.pk)
+    comment.depth = parent.depth + 1 if parent else 0
+    Comment.objects.filter(pk=comment.pk).update(
+        path=comment.path, depth=comment.depth
+    )
+    ancestors = ancestor_ids(comment.path)
+    if ancestors:
+        Comment.objects.filter(pk__in=ancestors).update(
+            reply_count=F("reply_count") + 1
+        )
+
+
+def comment_deleted(comment):
+    """
+    Удалённый комментарий уменьшает счётчики ответов предков.
+    Предки, удалённые вместе с ним, просто не найдутся.
+    """
+    ancestors = ancestor_ids(comment.path)
+    if ancestors:
+        Comment.objects.filter(pk__in=ancestors).update(
+            reply_count=Greatest(F("reply_count") - 1, 0)
+        )
+
+
+def with_replies(comments):
+    """
+    Комментарии вместе со всеми ответами на них.
+    """
+    comments = list(comments)
+    if not comments:
+        return Comment.objects.none()
+    return Comment.objects.filter(
+        reduce(or_, (_replies(c, include_self=True) for c in comments))
+    )
+
+
+def replies_removed(paths):
+    """
+    Поправка счётчиков ответов после удаления комментариев
+    с путями paths без сигналов: уцелевшие предки уменьшаются
+    одним UPDATE.
+    """
+    paths = [path for path in paths if path]
+    removed = {int(path[-STEP:]) for path in paths}
+    lost = Counter(
+        pk
+        for path in paths
+        for pk in ancestor_ids(path)
+        if pk not in removed
+    )
+    if not lost:
+        return
+    Comment.objects.filter(pk__in=lost).update(
+        reply_count=F("reply_count")
+        - Case(
+            *(When(pk=pk, then=Value(number)) for pk, number in lost.items()),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def attach_replies(comments, depth=None):
+    """
+    Ответы к порции комментариев одним запросом: диапазоны путей
+    тех, у кого ответы есть, не глубже depth уровней
+    (COMMENT_THREAD_DEPTH). Ответы в порядке обхода ветки
+    кладутся в атрибут thread каждого комментария, level у ответа -
+    его уровень под этим комментарием, начиная с нуля.
+    """
+    if depth is None:
+        depth = settings.COMMENT_THREAD_DEPTH
+    roots = {}
+    for comment in comments:
+        comment.thread = []
+        if comment.reply_count:
+            roots[path_of(comment)] = comment
+    if not roots or depth < 1:
+        return
+    replies = (
+        Comment.objects.filter(
+            reduce(or_, (_replies(root, depth) for root in roots.values()))
+        )
+        .select_related("author")
+        .order_by("path")
+    )
+    for reply in replies:
+        reply.level = reply.depth - 1
+        for end in range(STEP, len(reply.path), STEP):
+            root = roots.get(reply.path[:end])
+            if root is not None:
+                reply.level -= root.depth
+                # Ответы глубже depth открываются отдельной страницей.
+                reply.more = reply.reply_count and reply.level == depth - 1
+                root.thread.append(reply)
+                break
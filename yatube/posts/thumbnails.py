@@ -0,0 +1,377 @@
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import quote
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import (
+    defaults as sorl_defaults,
+    settings as sorl_settings,
+)
+from sorl.thumbnail.images import (
+    DummyImageFile,
+    ImageFile,
+    deserialize_image_file,
+)
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from .storage import image_storage
+
+logger = logging.getLogger(__name__)
+
+# Варианты превью постов: ширины с пропорцией 960x339 в WebP
+# (если Pillow его умеет) и в JPEG для остальных браузеров.
+VARIANT_WIDTHS = (480, 720, 960)
+VARIANT_RATIO = 339 / 960
+VARIANT_FORMATS = ("WEBP", "JPEG") if features.check("webp") else ("JPEG",)
+VARIANT_OPTIONS = {"crop": "center", "upscale": True}
+
+
+def variant_geometry(width):
+    return f"{width}x{round(width * VARIANT_RATIO)}"
+
+
+# Все превью, которые строят шаблоны постов.
+GEOMETRIES = tuple(
+    (variant_geometry(width), {**VARIANT_OPTIONS, "format": image_format})
+    for image_format in VARIANT_FORMATS
+    for width in VARIANT_WIDTHS
+)
+
+_pool = None
+_pending = set()
+_in_worker = False
+
+
+class ThumbnailError(Exception):
+    """
+    Картинку не удалось превратить в превью.
+    """
+
+
+class Placeholder(DummyImageFile):
+    """
+    Заглушка нужного размера, пока превью не готово.
+
+    Встроенный SVG не требует запроса к серверу и держит высоту
+    карточки, поэтому лента не прыгает, когда превью появится.
+    """
+
+    @property
+    def url(self):
+        svg = (
+            "<svg xmlns='http://www.w3.org/2000/svg' "
+            f"width='{self.x}' height='{self.y}'>"
+            "<rect width='100%' height='100%' fill='#e9ecef'/></svg>"
+        )
+        return f"data:image/svg+xml,{quote(svg)}"
+
+
+def _failed_key(name):
+    return f"thumbnail_failed:{hashlib.md5(name.encode()).hexdigest()}"
+
+
+def has_failed(name):
+    return cache.get(_failed_key(name)) is not None
+
+
+def mark_failed(name):
+    """
+    Картинка не читается: до истечения THUMBNAIL_FAILURE_TIMEOUT
+    её не пытаются разобрать снова.
+    """
+    cache.set(_failed_key(name), True, settings.THUMBNAIL_FAILURE_TIMEOUT)
+
+
+def pool_enabled():
+    """
+    Превью строятся в пуле процессов, если он включён и база видна
+    из других процессов: базу в памяти видит только текущий.
+    """
+    in_memory = getattr(connection, "is_in_memory_db", lambda: False)()
+    return settings.THUMBNAIL_WORKERS > 0 and not in_memory
+
+
+def _init_worker():
+    """
+    Запуск процесса пула: при fork ему достаются копии соединений
+    родителя, их нельзя ни использовать, ни закрывать - только забыть.
+    """
+    global _in_worker
+    _in_worker = True
+    if not apps.ready:
+        django.setup()
+    for worker_connection in connections.all():
+        worker_connection.connection = None
+
+
+def _generate(name):
+    """
+    Заглушка постов и все превью картинки; выполняется в процессе
+    пула.
+
+    Ключ превью в sorl зависит от хранилища исходника, поэтому
+    картинка открывается через хранилище поля, как в шаблонах.
+    """
+    from .images import save_preview
+
+    save_preview(name)
+    source = ImageFile(name, image_storage)
+    for geometry, options in GEOMETRIES:
+        thumbnail = default.backend.get_thumbnail(source, geometry, **options)
+        if not thumbnail.exists():
+            raise ThumbnailError(name)
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            settings.THUMBNAIL_WORKERS, initializer=_init_worker
+        )
+    return _pool
+
+
+def _thumbnail_keys(image):
+    """
+    Ключи хранилища sorl для всех превью картинки.
+    """
+    return [
+        add_prefix(
+            default.backend.thumbnail_file(image, geometry, dict(options)).key
+        )
+        for geometry, options in GEOMETRIES
+    ]
+
+
+def _ready(name):
+    """
+    Превью построены в процессе пула: его записи хранилища ключей
+    попали только в базу и в кэш самого процесса пула. Здесь ключи
+    убираются из кэша, а страницы с заглушками поста сбрасываются.
+    """
+    from .models import Post
+    from .signals import posts_changed
+
+    if hasattr(default.kvstore, "cache"):
+        default.kvstore.cache.delete_many(
+            _thumbnail_keys(ImageFile(name, image_storage))
+        )
+    posts_changed(
+        Post.objects.filter(image=name).values_list(
+            "pk", "author_id", "group_id"
+        )
+    )
+
+
+def _done(name, future):
+    error = future.exception()
+    try:
+        if error is not None:
+            logger.warning("Превью для %s не построено: %r", name, error)
+            mark_failed(name)
+        else:
+            _ready(name)
+    except Exception:
+        logger.exception("Превью для %s не обновлены", name)
+    finally:
+        _pending.discard(name)
+
+
+def _submit(name):
+    global _pool
+    try:
+        future = _get_pool().submit(_generate, name)
+    except BrokenProcessPool:
+        _pool = None
+        future = _get_pool().submit(_generate, name)
+    future.add_done_callback(lambda future: _done(name, future))
+
+
+def enqueue(name):
+    """
+    Постановка картинки в очередь на построение всех превью.
+    """
+    if not name or name in _pending or has_failed(name):
+        return
+    if not pool_enabled():
+        try:
+            _generate(name)
+        except Exception as error:
+            logger.warning("Превью для %s не построено: %r", name, error)
+            mark_failed(name)
+        return
+    _pending.add(name)
+    try:
+        _submit(name)
+    except Exception:
+        _pending.discard(name)
+        raise
+
+
+def _get_many_raw(keys):
+    """
+    Записи хранилища ключей sorl одним cache.get_many, а промахи -
+    одним запросом к таблице. В кэш попадают только найденные
+    записи: отсутствие, в отличие от sorl, не кэшируется, иначе
+    превью, построенное в другом процессе, здесь бы не появилось.
+    """
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        fetched = dict(
+            KVStore.objects.filter(key__in=missing).values_list(
+                "key", "value"
+            )
+        )
+        kv_cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {
+        key: value for key, value in values.items() if value != EMPTY_VALUE
+    }
+
+
+def _fetch(wanted):
+    """
+    Записи превью по ключам wanted. Картинки, у которых превью нет,
+    ставятся в очередь; без пула они строятся сразу, и их превью
+    читаются второй пачкой.
+    """
+    found = _get_many_raw(list(wanted))
+    missing = [key for key in wanted if key not in found]
+    names = {image.name for key in missing for image, *_ in wanted[key]}
+    for name in names:
+        enqueue(name)
+    if names and not pool_enabled():
+        found.update(_get_many_raw(missing))
+    return found
+
+
+def prefetch(images):
+    """
+    Превью всех картинок страницы за один проход.
+
+    Вместо отдельного поиска в хранилище ключей на каждое превью
+    ключи всех вариантов и отметки о неудачах читаются пачкой.
+    Результат сохраняется в самих файлах полей, и variants берёт его
+    оттуда. Картинки без превью ставятся в очередь и получают
+    заглушки; без пула превью строятся сразу и читаются второй пачкой.
+    """
+    if not hasattr(default.kvstore, "cache"):
+        # Пачкой умеет читать только хранилище sorl на кэше и базе.
+        return
+    images = [image for image in images if image]
+    if not images:
+        return
+    failed = cache.get_many(_failed_key(image.name) for image in images)
+    wanted = {}
+    for image in images:
+        image._thumbnails = {}
+        if _failed_key(image.name) in failed:
+            for geometry, options in GEOMETRIES:
+                image._thumbnails[geometry, options["format"]] = (
+                    Placeholder(geometry)
+                )
+            continue
+        for geometry, options in GEOMETRIES:
+            thumbnail = default.backend.thumbnail_file(
+                image, geometry, dict(options)
+            )
+            wanted.setdefault(add_prefix(thumbnail.key), []).append(
+                (image, geometry, options["format"])
+            )
+    if not wanted:
+        return
+    found = _fetch(wanted)
+    for key, entries in wanted.items():
+        value = found.get(key)
+        for image, geometry, image_format in entries:
+            image._thumbnails[geometry, image_format] = (
+                deserialize_image_file(value)
+                if value
+                else Placeholder(geometry)
+            )
+
+
+def variants(image):
+    """
+    Готовые варианты превью картинки: {формат: [превью по возрастанию
+    ширины]}. Недостающие варианты ставятся в очередь и пропускаются.
+    """
+    prefetched = getattr(image, "_thumbnails", {})
+    ready = {image_format: [] for image_format in VARIANT_FORMATS}
+    for geometry, options in GEOMETRIES:
+        thumbnail = prefetched.get((geometry, options["format"]))
+        if thumbnail is None:
+            thumbnail = default.backend.get_thumbnail(
+                image, geometry, **options
+            )
+        if not isinstance(thumbnail, Placeholder):
+            ready[options["format"]].append(thumbnail)
+    return ready
+
+
+class QueuedThumbnailBackend(ThumbnailBackend):
+    """
+    Бэкенд sorl-thumbnail, который не строит превью в запросе.
+
+    Готовое превью берётся из хранилища ключей, иначе картинка
+    ставится в очередь пула и шаблон получает заглушку. Сломанные
+    картинки запоминаются и не разбираются на каждой отрисовке.
+    """
+
+    def thumbnail_file(self, file_, geometry_string, options):
+        """
+        Файл превью с теми же именем и опциями, что у sorl.
+        """
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if _in_worker or not file_:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        name = getattr(file_, "name", file_)
+        if has_failed(name):
+            return Placeholder(geometry_string)
+        if not pool_enabled():
+            thumbnail = super().get_thumbnail(
+                file_, geometry_string, **options
+            )
+            if not thumbnail.exists():
+                mark_failed(name)
+                return Placeholder(geometry_string)
+            return thumbnail
+
+        thumbnail = self.thumbnail_file(file_, geometry_string, dict(options))
+        if hasattr(default.kvstore, "cache"):
+            # Промах не должен остаться в кэше: превью строит пул.
+            key = add_prefix(thumbnail.key)
+            cached = _get_many_raw([key]).get(key)
+            if cached:
+                return deserialize_image_file(cached)
+        else:
+            cached = default.kvstore.get(thumbnail)
+            if cached:
+                return cached
+        enqueue(name)
+        return Placeholder(geometry_string)
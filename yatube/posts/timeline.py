@@ -0,0 +1,256 @@
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from . import follows, recent
+from .models import Follow, Post, TimelineEntry
+from .paginator import CursorPaginator, cursor_filter, page_params
+from .recent import RecentPostsMixin
+
+
+def is_heavy(author_id):
+    """
+    У автора столько подписчиков, что его посты не раскладываются
+    по лентам, а подмешиваются при чтении.
+    """
+    return follows.follower_count(author_id) > settings.TIMELINE_FANOUT_LIMIT
+
+
+def heavy_author_ids(user):
+    """
+    ID «тяжёлых» авторов среди подписок пользователя, по графу
+    подписок в кэше.
+    """
+    counts = follows.follower_counts(follows.following_ids(user.pk))
+    return [
+        author_id
+        for author_id, number in counts.items()
+        if number > settings.TIMELINE_FANOUT_LIMIT
+    ]
+
+
+def trim(user_id):
+    """
+    Обрезка ленты пользователя до TIMELINE_SIZE самых новых записей.
+    """
+    boundary = (
+        TimelineEntry.objects.filter(user_id=user_id)
+        .order_by("-pub_date", "-post_id")
+        .values_list("pub_date", "post_id")[settings.TIMELINE_SIZE:]
+        .first()
+    )
+    if boundary is not None:
+        TimelineEntry.objects.filter(user_id=user_id).exclude(
+            cursor_filter(boundary, newer=True, pk_field="post_id")
+        ).delete()
+
+
+def fan_out(post):
+    """
+    Раскладка нового поста по лентам подписчиков автора.
+    """
+    if is_heavy(post.author_id):
+        return
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id).values_list(
+            "user_id", flat=True
+        )
+    )
+    TimelineEntry.objects.bulk_create(
+        TimelineEntry(
+            user_id=user_id,
+            post=post,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers
+    )
+    # Обрезка раз в TIMELINE_TRIM_EVERY постов: её цена делится
+    # на все посты, а лента превышает лимит ненамного.
+    if post.pk % settings.TIMELINE_TRIM_EVERY == 0:
+        for user_id in followers:
+            trim(user_id)
+
+
+def _backfill(user_ids, author_id):
+    """
+    Последние посты автора в ленты пользователей; уже разложенные
+    пропускаются.
+    """
+    posts = list(
+        Post.objects.filter(author_id=author_id).values_list(
+            "pk", "pub_date"
+        )[:settings.TIMELINE_SIZE]
+    )
+    with transaction.atomic():
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id,
+                    post_id=pk,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for user_id in user_ids
+                for pk, pub_date in posts
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        for user_id in user_ids:
+            trim(user_id)
+
+
+def backfill(follow):
+    """
+    Новая подписка: последние посты автора попадают в ленту.
+    """
+    if is_heavy(follow.author_id):
+        return
+    _backfill([follow.user_id], follow.author_id)
+
+
+def unfollowed(pairs):
+    """
+    Подписки (пользователь, автор) удалены. Посты «тяжёлого» автора
+    не раскладывались по лентам, поэтому автор, который из-за
+    отписок перестал быть «тяжёлым», раскладывает свои последние
+    посты по лентам оставшихся подписчиков.
+    """
+    removed = Counter(author_id for _, author_id in pairs)
+    counts = follows.follower_counts(removed)
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    for author_id, number in removed.items():
+        if counts[author_id] <= limit < counts[author_id] + number:
+            _backfill(
+                list(
+                    Follow.objects.filter(author_id=author_id).values_list(
+                        "user_id", flat=True
+                    )
+                ),
+                author_id,
+            )
+
+
+def prune(follow):
+    """
+    Отписка: посты автора уходят из ленты.
+    """
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, author_id=follow.author_id
+    ).delete()
+
+
+def prune_pairs(pairs, batch_size=500):
+    """
+    Массовая отписка: посты авторов уходят из лент пользователей,
+    одним DELETE на пачку пар (пользователь, автор).
+    """
+    pairs = list(pairs)
+    for start in range(0, len(pairs), batch_size):
+        TimelineEntry.objects.filter(
+            reduce(
+                or_,
+                (
+                    Q(user_id=user_id, author_id=author_id)
+                    for user_id, author_id in pairs[start:start + batch_size]
+                ),
+            )
+        ).delete()
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Лента подписок, читаемая из TimelineEntry.
+
+    На страницу сливаются три источника ключей (pub_date, id):
+    материализованная лента, посты «тяжёлых» авторов и, для постов
+    старше самой старой записи ленты, обычный запрос по подпискам.
+    Сами посты достаются одним запросом in_bulk.
+    """
+
+    def __init__(self, user, per_page, **kwargs):
+        super().__init__(
+            Post.objects.select_related("author", "group"), per_page, **kwargs
+        )
+        self.user = user
+
+    def get_author_ids(self):
+        return follows.following_ids(self.user.pk)
+
+    def _rows(self, key, newer, limit):
+        entries = TimelineEntry.objects.filter(user=self.user)
+        horizon = (
+            entries.order_by("pub_date", "post_id")
+            .values_list("pub_date", "post_id")
+            .first()
+        )
+        if key is not None:
+            entries = entries.filter(
+                cursor_filter(key, newer, pk_field="post_id")
+            )
+        order = ("pub_date", "post_id") if newer else ("-pub_date", "-post_id")
+        keys = set(
+            entries.order_by(*order).values_list("pub_date", "post_id")[
+                :limit
+            ]
+        )
+        timeline_full = len(keys) == limit
+
+        heavy = heavy_author_ids(self.user)
+        if heavy:
+            keys.update(self._author_keys(heavy, key, newer, limit))
+
+        below_horizon = horizon is None or (
+            key < horizon if newer else not timeline_full
+        )
+        if below_horizon:
+            light = set(self.get_author_ids()) - set(heavy)
+            if light:
+                keys.update(
+                    self._author_keys(light, key, newer, limit, horizon)
+                )
+
+        keys = sorted(keys, reverse=not newer)[:limit]
+        posts = self.object_list.in_bulk([pk for _, pk in keys])
+        return [posts[pk] for _, pk in keys if pk in posts]
+
+    @staticmethod
+    def _author_keys(author_ids, key, newer, limit, horizon=None):
+        """
+        Ключи постов авторов одним запросом: по limit постов на автора
+        из его диапазона индекса (author, pub_date), слияние - у
+        вызывающего. Граница по pub_date повторяется отдельным
+        условием, чтобы диапазон начинался сразу с курсора.
+        """
+        condition = Q()
+        if horizon is not None:
+            condition &= Q(pub_date__lte=horizon[0]) & cursor_filter(horizon)
+        if key is not None:
+            bound = "pub_date__gte" if newer else "pub_date__lte"
+            condition &= Q(**{bound: key[0]}) & cursor_filter(key, newer)
+        return [
+            (post.pub_date, post.pk)
+            for post in recent.author_slices(
+                author_ids, limit, condition, newer
+            )
+        ]
+
+
+class FollowPaginator(RecentPostsMixin, TimelinePaginator):
+    """
+    Лента подписок: первая страница из буферов последних постов
+    авторов, остальные - из материализованной ленты.
+    """
+
+
+def get_timeline_page(request):
+    """
+    Страница ленты подписок по параметрам after/before/page из запроса.
+    """
+    paginator = FollowPaginator(request.user, settings.PAGINATOR_NUM)
+    return paginator.get_page(**page_params(request))
@@ -0,0 +1,339 @@
+import struct
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+CHUNK_SIZE = 64 * 1024
+ORIENTATION = 0x0112
+
+CONTENT_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "GIF": "image/gif",
+    "WEBP": "image/webp",
+}
+
+# Сегменты JPEG с метаданными: EXIF/XMP и IPTC.
+JPEG_METADATA = {0xE1, 0xED}
+# Чанки PNG с метаданными.
+PNG_METADATA = {b"eXIf", b"tEXt", b"iTXt", b"zTXt", b"tIME"}
+# Чанки WebP с метаданными и их флаги в заголовке VP8X.
+WEBP_METADATA = {b"EXIF": 0x08, b"XMP ": 0x04}
+# Расширения GIF: комментарий и данные приложения (в них пишут XMP).
+GIF_COMMENT = 0xFE
+GIF_APPLICATION = 0xFF
+# Расширения приложений, которые задают повтор анимации.
+GIF_LOOP = {b"NETSCAPE2.0", b"ANIMEXTS1.0"}
+
+
+class UploadRejected(Exception):
+    """
+    Загруженный файл не принят; текст ошибки показывается в форме.
+    """
+
+
+def _copy(source, target, size=None):
+    """
+    Копирование size байт (или до конца файла) кусками.
+    """
+    while size is None or size > 0:
+        chunk = source.read(
+            CHUNK_SIZE if size is None else min(CHUNK_SIZE, size)
+        )
+        if not chunk:
+            if size:
+                raise UploadRejected("Файл изображения обрезан.")
+            return
+        target.write(chunk)
+        if size is not None:
+            size -= len(chunk)
+
+
+def _read(source, size):
+    data = source.read(size)
+    if len(data) != size:
+        raise UploadRejected("Файл изображения обрезан.")
+    return data
+
+
+def inspect(upload):
+    """
+    Формат, размеры и ориентация картинки по заголовку: Pillow
+    не декодирует пиксели, поэтому проверка дешёвая для любого файла.
+    """
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            image_format = image.format
+            width, height = image.size
+            orientation = None
+            if image_format == "JPEG":
+                orientation = image.getexif().get(ORIENTATION)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise UploadRejected(
+            "Загрузите правильное изображение. Файл, который вы "
+            "загрузили, поврежден или не является изображением."
+        )
+    if image_format not in CONTENT_TYPES:
+        raise UploadRejected(
+            "Поддерживаются только JPEG, PNG, GIF и WebP."
+        )
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise UploadRejected(
+            f"Изображение {width}x{height} слишком большое: не больше "
+            f"{settings.IMAGE_UPLOAD_MAX_PIXELS} пикселей."
+        )
+    return image_format, orientation
+
+
+def _orientation_segment(orientation):
+    exif = Image.Exif()
+    exif[ORIENTATION] = orientation
+    data = exif.tobytes()
+    return b"\xff\xe1" + struct.pack(">H", len(data) + 2) + data
+
+
+def _strip_jpeg(source, target, orientation):
+    """
+    Сегменты JPEG копируются как есть, кроме метаданных; от EXIF
+    остаётся только ориентация. Сжатые данные после SOS не трогаются.
+    """
+    target.write(_read(source, 2))
+    orientation_written = not orientation
+    while True:
+        marker = _read(source, 2)
+        while marker[1] == 0xFF:
+            marker = marker[1:] + _read(source, 1)
+        if marker[0] != 0xFF:
+            raise UploadRejected("Файл изображения повреждён.")
+        code = marker[1]
+        if not orientation_written and code != 0xE0:
+            target.write(_orientation_segment(orientation))
+            orientation_written = True
+        if code == 0xD9 or 0xD0 <= code <= 0xD7 or code == 0x01:
+            target.write(marker)
+            if code == 0xD9:
+                return
+            continue
+        raw_length = _read(source, 2)
+        length = struct.unpack(">H", raw_length)[0] - 2
+        if code in JPEG_METADATA:
+            source.seek(length, 1)
+            continue
+        target.write(marker + raw_length)
+        _copy(source, target, length)
+        if code == 0xDA:
+            _copy(source, target)
+            return
+
+
+def _strip_png(source, target):
+    """
+    Чанки PNG копируются кусками, кроме текстовых и EXIF.
+    """
+    target.write(_read(source, 8))
+    while True:
+        header = _read(source, 8)
+        length, chunk_type = struct.unpack(">I", header[:4])[0], header[4:]
+        if chunk_type in PNG_METADATA:
+            source.seek(length + 4, 1)
+            continue
+        target.write(header)
+        _copy(source, target, length + 4)
+        if chunk_type == b"IEND":
+            return
+
+
+def _strip_webp(source, target):
+    """
+    Чанки WebP без EXIF и XMP: сначала по заголовкам считается
+    новый размер контейнера RIFF, затем чанки копируются кусками.
+    """
+    header = _read(source, 12)
+    chunks = []
+    while True:
+        chunk_header = source.read(8)
+        if len(chunk_header) < 8:
+            break
+        size = struct.unpack("<I", chunk_header[4:])[0]
+        chunks.append((chunk_header[:4], source.tell(), size))
+        source.seek(size + size % 2, 1)
+
+    removed = [chunk for chunk in chunks if chunk[0] in WEBP_METADATA]
+    riff_size = struct.unpack("<I", header[4:8])[0] - sum(
+        8 + size + size % 2 for _, _, size in removed
+    )
+    target.write(header[:4] + struct.pack("<I", riff_size) + header[8:])
+    for chunk_type, offset, size in chunks:
+        if chunk_type in WEBP_METADATA:
+            continue
+        source.seek(offset)
+        target.write(chunk_type + struct.pack("<I", size))
+        if chunk_type == b"VP8X":
+            flags = _read(source, 1)[0]
+            for flag in WEBP_METADATA.values():
+                flags &= ~flag
+            target.write(bytes([flags]))
+            _copy(source, target, size + size % 2 - 1)
+        else:
+            _copy(source, target, size + size % 2)
+
+
+def _gif_blocks(source, target=None):
+    """
+    Подблоки данных GIF до пустого: копируются в target
+    или пропускаются, если его нет.
+    """
+    while True:
+        size = _read(source, 1)
+        if target is not None:
+            target.write(size)
+        if not size[0]:
+            return
+        if target is None:
+            source.seek(size[0], 1)
+        else:
+            _copy(source, target, size[0])
+
+
+def _gif_color_table(source, target, flags):
+    if flags & 0x80:
+        _copy(source, target, 3 << ((flags & 0x07) + 1))
+
+
+def _gif_extension(source, target):
+    """
+    Расширение GIF копируется, если это не комментарий и не данные
+    приложения, кроме повтора анимации.
+    """
+    label = _read(source, 1)
+    keep = label[0] != GIF_COMMENT
+    if label[0] == GIF_APPLICATION:
+        identifier = _read(source, 12)
+        if identifier[0] != 11:
+            raise UploadRejected("Файл изображения повреждён.")
+        keep = identifier[1:] in GIF_LOOP
+        label += identifier
+    if keep:
+        target.write(b"\x21" + label)
+    _gif_blocks(source, target if keep else None)
+
+
+def _strip_gif(source, target):
+    """
+    Блоки GIF копируются как есть, кроме комментариев и расширений
+    приложений; сжатые кадры не трогаются.
+    """
+    screen = _read(source, 13)
+    target.write(screen)
+    _gif_color_table(source, target, screen[10])
+    while True:
+        introducer = _read(source, 1)
+        if introducer == b"\x21":
+            _gif_extension(source, target)
+        elif introducer == b"\x2c":
+            descriptor = _read(source, 9)
+            target.write(introducer + descriptor)
+            _gif_color_table(source, target, descriptor[8])
+            # Минимальный размер кода LZW, затем данные кадра.
+            _copy(source, target, 1)
+            _gif_blocks(source, target)
+        elif introducer == b"\x3b":
+            target.write(introducer)
+            return
+        else:
+            raise UploadRejected("Файл изображения повреждён.")
+
+
+def sanitize(upload):
+    """
+    Проверенная копия загруженной картинки без метаданных.
+
+    Копия пишется во временный файл на диске кусками по CHUNK_SIZE,
+    так что память на загрузку не зависит от размера файла.
+    """
+    image_format, orientation = inspect(upload)
+    clean = TemporaryUploadedFile(
+        upload.name,
+        CONTENT_TYPES[image_format],
+        0,
+        upload.charset,
+        upload.content_type_extra,
+    )
+    upload.seek(0)
+    try:
+        if image_format == "JPEG":
+            _strip_jpeg(upload, clean, orientation)
+        elif image_format == "PNG":
+            _strip_png(upload, clean)
+        elif image_format == "WEBP":
+            _strip_webp(upload, clean)
+        else:
+            _strip_gif(upload, clean)
+    except (UploadRejected, struct.error):
+        clean.close()
+        raise UploadRejected("Файл изображения повреждён.")
+    clean.size = clean.tell()
+    clean.seek(0)
+    upload.close()
+    return clean
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Загрузка картинок сразу на диск кусками.
+
+    Файл больше IMAGE_UPLOAD_MAX_BYTES дальше не пишется, готовый
+    файл проверяется по заголовку и очищается от метаданных.
+    Отклонённый файл помечается текстом ошибки в upload_error,
+    форма показывает его вместо стандартной ошибки.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.rejected = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.rejected is not None:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_UPLOAD_MAX_BYTES:
+            limit = filesizeformat(settings.IMAGE_UPLOAD_MAX_BYTES)
+            self.rejected = f"Файл больше {limit}."
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        if self.rejected is None:
+            try:
+                return sanitize(upload)
+            except UploadRejected as error:
+                self.rejected = str(error)
+        upload.upload_error = self.rejected
+        return upload
+
+
+def image_uploads(view):
+    """
+    Загрузки в view проходят через ImageUploadHandler; остальные
+    формы проекта, в том числе админка, получают файлы как обычно.
+
+    Обработчик ставится до чтения тела запроса, поэтому CSRF
+    проверяется уже внутри: иначе middleware прочитал бы тело раньше.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers.insert(0, ImageUploadHandler(request))
+        return protected(request, *args, **kwargs)
+
+    return wrapper
@@ -6,15 +6,60 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('more/', views.index, {'fragment': True}, name='index_more'),
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
+    path(
+        'group/<slug:slug>/more/',
+        views.group_posts,
+        {'fragment': True},
+        name='group_posts_more',
+    ),
+    path('tag/<str:name>/', views.tag_posts, name='tag_posts'),
+    path(
+        'tag/<str:name>/more/',
+        views.tag_posts,
+        {'fragment': True},
+        name='tag_posts_more',
+    ),
+    path('discussions/', views.discussions, name='discussions'),
+    path(
+        'discussions/more/',
+        views.discussions,
+        {'fragment': True},
+        name='discussions_more',
+    ),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path(
+        'profile/<str:username>/more/',
+        views.profile,
+        {'fragment': True},
+        name='profile_more',
+    ),
+    path('search/', views.search_posts, name='search'),
+    path('search/suggest/', views.suggest, name='suggest'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments',
+    ),
+    path(
+        'posts/<int:post_id>/comments/<int:comment_id>/',
+        views.comment_thread,
+        name='comment_thread',
+    ),
     path('create/', views.post_create, name='post_create'),
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
     path(
         'posts/<int:post_id>/comment/', views.add_comment, name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path(
+        'follow/more/',
+        views.follow_index,
+        {'fragment': True},
+        name='follow_index_more',
+    ),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -3,74 +3,214 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 
+from . import (
+    autocomplete,
+    counters,
+    feed_cache,
+    follows,
+    response_cache,
+    search,
+    threads,
+    thumbnails,
+)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
+from .models import Comment, Follow, Group, Post, Tag
+from .paginator import (
+    get_comments_page,
+    get_discussions_page,
+    get_page_obj,
+)
+from .recent import get_profile_page
+from .tags import get_tag_page, normalize as normalize_tag
+from .timeline import get_timeline_page
+from .uploads import image_uploads
 
 User = get_user_model()
 
 
-def index(request):
+def render_feed(
+    request,
+    template,
+    page_obj,
+    more_url,
+    fragment,
+    context=None,
+    personal=False,
+):
+    """
+    Отрисовка ленты: целой страницы или только фрагмента с постами
+    для бесконечной прокрутки. Превью всех постов страницы
+    читаются заранее одной пачкой.
+    """
+    context = context or {}
+    thumbnails.prefetch(post.image for post in page_obj)
+    context.update(
+        {
+            "page_obj": page_obj,
+            "more_url": more_url,
+            "fragment": fragment,
+        }
+    )
+    context.update(feed_cache.context(request, personal))
+    if fragment:
+        template = "includes/feed_page.html"
+    return render(request, template, context)
+
+
+@response_cache.cache_for_anonymous
+def index(request, fragment=False):
     """
     Главная страница.
     """
-    posts = Post.objects.select_related("author", "group").all()
-    paginator = Paginator(posts, settings.PAGINATOR_NUM)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-    context = {
-        "page_obj": page_obj,
-    }
-    return render(request, "posts/index.html", context)
+    response_cache.depends_on(request, "site")
+    posts = Post.objects.select_related("author", "group")
+    page_obj = get_page_obj(
+        request, posts, count=counters.site_posts_count()
+    )
+    return render_feed(
+        request,
+        "posts/index.html",
+        page_obj,
+        reverse("posts:index_more"),
+        fragment,
+        {"index": True},
+    )
 
 
-def group_posts(request, slug):
+@response_cache.cache_for_anonymous
+def group_posts(request, slug, fragment=False):
     """
     Группы.
     """
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.PAGINATOR_NUM)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    response_cache.depends_on(request, "group", group.pk)
+    posts = group.posts.select_related("author", "group")
+    page_obj = get_page_obj(
+        request, posts, count=counters.group_posts_count(group)
+    )
     context = {
-        "page_obj": page_obj,
         "group": group,
     }
-    return render(request, "posts/group_list.html", context)
+    return render_feed(
+        request,
+        "posts/group_list.html",
+        page_obj,
+        reverse("posts:group_posts_more", args=(slug,)),
+        fragment,
+        context,
+    )
+
+
+@response_cache.cache_for_anonymous
+def tag_posts(request, name, fragment=False):
+    """
+    Посты с хэштегом.
+    """
+    response_cache.depends_on(request, "site")
+    tag = get_object_or_404(Tag, name=normalize_tag(name))
+    page_obj = get_tag_page(request, tag)
+    return render_feed(
+        request,
+        "posts/tag_list.html",
+        page_obj,
+        reverse("posts:tag_posts_more", args=(tag.name,)),
+        fragment,
+        {"tag": tag},
+    )
 
 
-def profile(request, username):
+@response_cache.cache_for_anonymous
+def discussions(request, fragment=False):
+    """
+    Активные обсуждения: посты по дате последнего комментария.
+    """
+    response_cache.depends_on(request, "site")
+    response_cache.depends_on(request, "discussions")
+    page_obj = get_discussions_page(
+        request, Post.objects.select_related("author", "group")
+    )
+    return render_feed(
+        request,
+        "posts/discussions.html",
+        page_obj,
+        reverse("posts:discussions_more"),
+        fragment,
+    )
+
+
+@response_cache.cache_for_anonymous
+def profile(request, username, fragment=False):
     """
     Профиль пользователя.
     """
     author = get_object_or_404(User, username=username)
-    post = author.posts.all()
-    number_of_posts = author.posts.count()
-    paginator = Paginator(post, settings.PAGINATOR_NUM)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-    following = Follow.objects.filter(
-        user__username=request.user, author=author
-    )
+    response_cache.depends_on(request, "author", author.pk)
+    number_of_posts = counters.author_posts_count(author)
+    page_obj = get_profile_page(request, author, count=number_of_posts)
     context = {
-        "page_obj": page_obj,
         "author": author,
         "number_of_posts": number_of_posts,
-        "following": following,
+        "following": follows.is_following(request.user, author),
+        "followers_count": follows.follower_count(author.pk),
+        "following_count": follows.following_count(author.pk),
     }
-    return render(request, "posts/profile.html", context)
+    return render_feed(
+        request,
+        "posts/profile.html",
+        page_obj,
+        reverse("posts:profile_more", args=(username,)),
+        fragment,
+        context,
+    )
 
 
+def search_posts(request):
+    """
+    Поиск по текстам постов, самые релевантные сверху.
+    """
+    query = request.GET.get("q", "").strip()
+    page_obj = None
+    if query:
+        posts = search.search(
+            Post.objects.select_related("author", "group"), query
+        )
+        page_obj = Paginator(posts, settings.PAGINATOR_NUM).get_page(
+            request.GET.get("page")
+        )
+    context = {
+        "query": query,
+        "page_obj": page_obj,
+    }
+    return render(request, "posts/search.html", context)
+
+
+def suggest(request):
+    """
+    Подсказки для поиска: пользователи и группы по началу имени.
+    """
+    return JsonResponse(
+        {"results": autocomplete.suggest(request.GET.get("q", ""))}
+    )
+
+
+@response_cache.cache_for_anonymous
 def post_detail(request, post_id):
     """
     Страница с деталями поста.
     """
 
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
-    post_count = post.author.posts.count()
+    response_cache.depends_on(request, "post", post_id)
+    post = get_object_or_404(
+        Post.objects.select_related("author", "group"), pk=post_id
+    )
+    response_cache.depends_on(request, "author", post.author_id)
+    response_cache.depends_on(request, "comments", post_id)
+    comments = get_comments_page(request, post)
+    post_count = counters.author_posts_count(post.author)
     form = CommentForm(request.POST or None)
     context = {
         "post": post,
@@ -81,7 +221,44 @@ def post_detail(request, post_id):
     return render(request, "posts/post_detail.html", context)
 
 
+@response_cache.cache_for_anonymous
+def post_comments(request, post_id):
+    """
+    Порция комментариев поста для кнопки «Показать ещё».
+    """
+    response_cache.depends_on(request, "comments", post_id)
+    post = get_object_or_404(Post.objects.only("pk"), pk=post_id)
+    context = {
+        "post": post,
+        "comments": get_comments_page(request, post),
+        "fragment": True,
+    }
+    return render(request, "includes/comments.html", context)
+
+
+@response_cache.cache_for_anonymous
+def comment_thread(request, post_id, comment_id):
+    """
+    Ветка ответов на комментарий: продолжение того, что не уместилось
+    под ним на странице поста.
+    """
+    response_cache.depends_on(request, "comments", post_id)
+    comment = get_object_or_404(
+        Comment.objects.select_related("author", "post"),
+        pk=comment_id,
+        post_id=post_id,
+    )
+    threads.attach_replies([comment])
+    context = {
+        "post": comment.post,
+        "comment": comment,
+        "form": CommentForm(),
+    }
+    return render(request, "posts/comment_thread.html", context)
+
+
 @login_required
+@image_uploads
 def post_create(request):
     """
     Страница создания поста.
@@ -113,6 +290,7 @@ def post_create(request):
 
 
 @login_required
+@image_uploads
 def post_edit(request, post_id):
     """
     Страница редактирования поста.
@@ -141,7 +319,7 @@ def add_comment(request, post_id):
     Комментарии.
     """
     post = get_object_or_404(Post, pk=post_id)
-    form = CommentForm(request.POST or None)
+    form = CommentForm(request.POST or None, post=post)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
@@ -151,17 +329,21 @@ def add_comment(request, post_id):
 
 
 @login_required
-def follow_index(request):
+def follow_index(request, fragment=False):
     """
     Вью подписки.
     """
 
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, settings.PAGINATOR_NUM)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-    context = {"page_obj": page_obj}
-    return render(request, "posts/follow.html", context)
+    page_obj = get_timeline_page(request)
+    return render_feed(
+        request,
+        "posts/follow.html",
+        page_obj,
+        reverse("posts:follow_index_more"),
+        fragment,
+        {"follow": True},
+        personal=True,
+    )
 
 
 @login_required
@@ -172,7 +354,12 @@ def profile_follow(request, username):
 
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(author=author, user=request.user)
+        # Решает база, а не кэш: он мог отстать от массовых изменений.
+        _, created = Follow.objects.get_or_create(
+            author=author, user=request.user
+        )
+        if not created:
+            follows.changed([(request.user.pk, author.pk)])
     return redirect("posts:profile", request.user)
 
 
@@ -183,7 +370,9 @@ def profile_unfollow(request, username):
     """
 
     author = get_object_or_404(User, username=username)
-    follow_obj = Follow.objects.filter(author=author, user=request.user)
-    if follow_obj.exists:
-        follow_obj.delete()
+    deleted, _ = Follow.objects.filter(
+        author=author, user=request.user
+    ).delete()
+    if not deleted:
+        follows.changed([(request.user.pk, author.pk)])
     return redirect("posts:profile", request.user)
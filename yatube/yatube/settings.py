@@ -57,6 +57,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.QueryProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -143,14 +144,123 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGINATOR_NUM = 10
+# Старые ссылки ?page=N на ленты открываются до этого номера страницы,
+# дальше - 404.
+LEGACY_PAGE_LIMIT = 100
+
+# Сколько комментариев поста отдаётся за одну порцию.
+COMMENTS_PAGE_SIZE = 20
+
+# Сколько уровней ответов показывается под комментарием; глубже
+# ветка открывается отдельной страницей.
+COMMENT_THREAD_DEPTH = 3
+
+# Кэш. Ответы, ленты, буферы постов, граф подписок и журнал подсказок
+# сбрасываются сигналами в процессе, который изменил данные; другие
+# процессы видят сброс, только если кэш общий. В продакшене задайте
+# MEMCACHED_LOCATION (например '127.0.0.1:11211', нужен пакет
+# python-memcached). Без него у каждого процесса свой LocMemCache,
+# и всё, что устаревает по сбросам, живёт не дольше
+# LOCAL_CACHE_TIMEOUT секунд.
+MEMCACHED_LOCATION = None
+SHARED_CACHE = MEMCACHED_LOCATION is not None
+LOCAL_CACHE_TIMEOUT = 60
+
+if SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': MEMCACHED_LOCATION,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+def _cache_timeout(seconds):
+    """
+    Срок хранения того, что устаревает по сбросам из сигналов.
+    """
+    return seconds if SHARED_CACHE else min(seconds, LOCAL_CACHE_TIMEOUT)
+
+
+# Лента подписок: сколько записей хранить на пользователя,
+# начиная с какого числа подписчиков не раскладывать посты автора
+# по лентам и как часто обрезать ленты при раскладке.
+TIMELINE_SIZE = 800
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_TRIM_EVERY = 50
+
+# Буферы последних постов авторов в кэше для первой страницы лент.
+RECENT_POSTS_SIZE = 50
+RECENT_POSTS_TIMEOUT = _cache_timeout(60 * 60 * 24)
+
+# Граф подписок в кэше: подписки пользователей и число подписчиков
+# авторов. Сбрасываются при каждой подписке и отписке.
+FOLLOW_GRAPH_TIMEOUT = _cache_timeout(60 * 60 * 24)
+
+# Время жизни фрагментов лент; устаревают они раньше, по поколению.
+FEED_CACHE_TIMEOUT = _cache_timeout(60 * 60 * 3)
+
+# Время жизни сжатых ответов для анонимных читателей.
+RESPONSE_CACHE_TIMEOUT = _cache_timeout(60 * 60 * 24)
+
+# Профиль SQL каждого запроса (core.middleware.QueryProfileMiddleware)
+# включается вместе с DEBUG или отдельно этим флагом.
+QUERY_PROFILE = DEBUG
+
+# Бюджет SQL на один запрос: число запросов и время в секундах.
+# Ленты из кэша стоят 2-6 запросов, без кэша - до 37, когда превью
+# картинок строятся прямо в запросе (без пула).
+# Одна форма запроса, повторённая QUERY_REPEAT_LIMIT раз, - N+1.
+QUERY_COUNT_BUDGET = 40
+QUERY_TIME_BUDGET = 0.2
+QUERY_REPEAT_LIMIT = 5
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
-}
+# Медиа отдаёт core.views.serve_media. Если перед Django стоит прокси,
+# файлы отдаёт он: 'x-accel-redirect' (nginx, внутренний location
+# MEDIA_ACCEL_PREFIX) или 'x-sendfile' (Apache); None - сам Django.
+# Файлы с именем не по хэшу кэшируются MEDIA_CACHE_MAX_AGE секунд.
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24
+
+# Превью картинок строятся в пуле процессов (0 - прямо в запросе),
+# неудачные картинки не пробуются снова THUMBNAIL_FAILURE_TIMEOUT секунд.
+THUMBNAIL_BACKEND = 'posts.thumbnails.QueuedThumbnailBackend'
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_FAILURE_TIMEOUT = 60 * 60
+
+# Картинки постов пишутся на диск кусками и проверяются по заголовку
+# (posts.uploads.image_uploads); пределы по размеру файла и числу пикселей.
+IMAGE_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 1000 * 1000
+
+# Картинка без ссылок удаляется, только если её не загружали снова
+# последние IMAGE_RELEASE_GRACE секунд.
+IMAGE_RELEASE_GRACE = 60
+
+# Где команда collect_media запоминает место прерванного прохода.
+MEDIA_GC_STATE = os.path.join(BASE_DIR, 'media_gc_state.json')
+
+# Подсказки поиска: сколько выдавать и сколько изменений держит
+# журнал в кэше, по которому процессы обновляют свои индексы. Без
+# общего кэша журнал виден только своему процессу, и индекс
+# собирается заново раз в LOCAL_CACHE_TIMEOUT секунд.
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_LOG_SIZE = 1000
+AUTOCOMPLETE_LOG_TIMEOUT = 60 * 60
+
+# Списки админки: таблицы больше ADMIN_COUNT_LIMIT строк показывают
+# оценку из статистики базы, отфильтрованные списки считаются
+# не дальше этого предела.
+ADMIN_COUNT_LIMIT = 10000